@@ -1,16 +1,24 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import json
 import requests
 import time
 from functools import wraps
 from flask_migrate import Migrate
 
 
-from models import db, User, GameModeStats, MatchRecord, Friend,DetailedAnalysis
+from models import db, User, MatchRecord, Friend,DetailedAnalysis
 from forms import LoginForm, RegisterForm
-from routes.riot_api import fetch_puuid, fetch_rank_info, fetch_match_list, fetch_match_details, get_api_key
+from routes.riot_api import fetch_puuid, fetch_rank_info, fetch_match_list, fetch_match_details, get_api_key, riot_single_flight, invalidate_account, is_invalid_puuid_error, fetch_concurrently
+from routes.response_cache import riot_cache
+from routes.circuit_breaker import riot_breakers
+from routes.user_search import ensure_search_index, search_users
+from routes.analysis_documents import materialize_analysis, load_analysis_document
+from routes.versioned_cache import versioned_responses, data_versions, analysis_scope, friends_scope, profile_scope, RawJSON
+from routes.friends import list_friends, DEFAULT_FRIENDS_PAGE_SIZE, MAX_FRIENDS_PAGE_SIZE
+from routes.analysis_jobs import analysis_jobs
 
 app = Flask(__name__, 
            template_folder='template',
@@ -25,6 +33,54 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Set the Riot API key (if it needs to be retrieved from an environment variable).
 app.config['RIOT_API_KEY'] = os.environ.get('RIOT_API_KEY', '')
+# API key cache: optional local key file, and how long (seconds) a fetched key is reused.
+app.config['RIOT_API_KEY_FILE'] = os.environ.get('RIOT_API_KEY_FILE', '')
+app.config['RIOT_API_KEY_TTL'] = int(os.environ.get('RIOT_API_KEY_TTL', 3600))
+
+# Shared keep-alive HTTP client for Riot API calls: connections kept per host, timeouts in seconds.
+app.config['RIOT_HTTP_POOL_MAXSIZE'] = int(os.environ.get('RIOT_HTTP_POOL_MAXSIZE', 10))
+app.config['RIOT_HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('RIOT_HTTP_CONNECT_TIMEOUT', 3.05))
+app.config['RIOT_HTTP_READ_TIMEOUT'] = float(os.environ.get('RIOT_HTTP_READ_TIMEOUT', 10))
+
+# Riot rate limiting: default app-level limits ("count:seconds,...") until learned from response headers,
+# and the local SQLite file that lets worker processes share the rate budget.
+app.config['RIOT_APP_RATE_LIMIT'] = os.environ.get('RIOT_APP_RATE_LIMIT', '20:1,100:120')
+app.config['RIOT_LOCAL_STORE'] = os.environ.get('RIOT_LOCAL_STORE', '')
+# Maximum number of match detail requests in flight at once during an analysis.
+app.config['RIOT_MAX_IN_FLIGHT'] = int(os.environ.get('RIOT_MAX_IN_FLIGHT', 5))
+
+# Local store of raw match-v5 payloads (finished matches never change): directory and size cap in bytes.
+app.config['MATCH_STORE_DIR'] = os.environ.get('MATCH_STORE_DIR', '')
+app.config['MATCH_STORE_MAX_BYTES'] = int(os.environ.get('MATCH_STORE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Riot response cache: per-endpoint TTLs in seconds (account, league, match_list) and memory cap in bytes.
+app.config['RIOT_CACHE_TTLS'] = {
+    'account': int(os.environ.get('RIOT_CACHE_ACCOUNT_TTL', 24 * 3600)),
+    'league': int(os.environ.get('RIOT_CACHE_LEAGUE_TTL', 300)),
+    'match_list': int(os.environ.get('RIOT_CACHE_MATCH_LIST_TTL', 60)),
+}
+app.config['RIOT_CACHE_MAX_BYTES'] = int(os.environ.get('RIOT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Independent Riot calls made in parallel for one page (e.g. /api/game_profile): worker threads and per-call timeout in seconds.
+app.config['RIOT_FANOUT_WORKERS'] = int(os.environ.get('RIOT_FANOUT_WORKERS', 8))
+app.config['RIOT_FANOUT_TIMEOUT'] = float(os.environ.get('RIOT_FANOUT_TIMEOUT', 5))
+
+# Riot call resilience: retries for 5xx/network errors with jittered exponential backoff (seconds),
+# and a per-host circuit breaker that opens after consecutive failures and probes again after a timeout.
+app.config['RIOT_RETRY_ATTEMPTS'] = int(os.environ.get('RIOT_RETRY_ATTEMPTS', 2))
+app.config['RIOT_RETRY_BASE_DELAY'] = float(os.environ.get('RIOT_RETRY_BASE_DELAY', 0.5))
+app.config['RIOT_RETRY_MAX_DELAY'] = float(os.environ.get('RIOT_RETRY_MAX_DELAY', 8))
+app.config['RIOT_BREAKER_FAILURE_THRESHOLD'] = int(os.environ.get('RIOT_BREAKER_FAILURE_THRESHOLD', 5))
+app.config['RIOT_BREAKER_RESET_TIMEOUT'] = float(os.environ.get('RIOT_BREAKER_RESET_TIMEOUT', 30))
+
+# Background analysis jobs: how many run at once, and how long (seconds) finished jobs stay queryable.
+app.config['ANALYSIS_MAX_WORKERS'] = int(os.environ.get('ANALYSIS_MAX_WORKERS', 2))
+app.config['ANALYSIS_JOB_TTL'] = int(os.environ.get('ANALYSIS_JOB_TTL', 600))
+
+# Versioned response cache for stats/friend summary endpoints (ETag/304): how many rendered responses to keep in memory.
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+# Per-user analysis lock shared by worker processes: lease length in seconds, renewed in the background while a job is queued or running.
+app.config['ANALYSIS_LEASE_TTL'] = int(os.environ.get('ANALYSIS_LEASE_TTL', 120))
 
 # Initialize the database.
 db.init_app(app)
@@ -34,6 +90,7 @@ migrate = Migrate(app, db)
 # Make sure all database tables are created before the app starts.
 with app.app_context():
     db.create_all()
+    ensure_search_index()
     print("Database tables created or confirmed.")
 
 def login_required(f):
@@ -163,6 +220,11 @@ def update_profile():
     riot_id_changed = user.riot_id != riot_id
     tagline_changed = user.tagline != tagline
     
+    # Riot ID变化时丢弃新旧两个账号的缓存，下面重新解析PUUID时一定请求Riot
+    if riot_id_changed or tagline_changed:
+        invalidate_account(user.riot_id, user.tagline)
+        invalidate_account(riot_id, tagline)
+    
     user.riot_id = riot_id
     user.tagline = tagline
     user.region = region
@@ -171,16 +233,17 @@ def update_profile():
     if (riot_id_changed or tagline_changed) and riot_id and tagline:
         api_key = get_api_key()
         if api_key:
-            result = fetch_puuid(riot_id, tagline, api_key)
+            result = fetch_puuid(riot_id, tagline, api_key, region)
             if "puuid" in result:
                 # 更新用户的PUUID字段
-                user.puuid = result["puuid"]
+                remember_account(user, result)
                 flash('Riot account available', 'success')
             elif "error" in result:
                 flash(f'Riot info incorrect: {result["error"]}', 'error')
                 # 
     
     db.session.commit()
+    bump_profile_version(user.id)
     
     flash('Updated!', 'success')
     return redirect(url_for('profile'))
@@ -211,21 +274,53 @@ def api_get_puuid():
         return jsonify({"status": "error", "message": "Cant fetch api key"}), 500
     
     # 调用Riot API获取PUUID
-    result = fetch_puuid(user.riot_id, user.tagline, api_key)
+    result = fetch_puuid(user.riot_id, user.tagline, api_key, user.region)
     
     if "error" in result:
         return jsonify({"status": "error", "message": result["error"]}), 400
     
-    # 如果用户模型有PUUID字段，更新它
-    if hasattr(user, 'puuid'):
-        user.puuid = result.get("puuid")
-        db.session.commit()
+    # 保存PUUID和账号数据
+    remember_account(user, result)
+    db.session.commit()
+    bump_profile_version(user.id)
     
     return jsonify({
         "status": "success", 
         "data": result
     })
 
+def stored_account(user):
+    """保存的PUUID仍对应当前的 riot_id/tagline 时，返回与 fetch_puuid 相同结构的账号数据，否则返回None"""
+    if (user.puuid and user.account_game_name
+            and user.puuid_resolved_for == f"{user.riot_id}#{user.tagline}"):
+        return {
+            "puuid": user.puuid,
+            "gameName": user.account_game_name,
+            "tagLine": user.account_tag_line
+        }
+    return None
+
+def remember_account(user, account):
+    """保存解析得到的PUUID和账号名称，以及解析时使用的Riot ID（调用方负责提交）"""
+    user.puuid = account["puuid"]
+    user.account_game_name = account.get("gameName")
+    user.account_tag_line = account.get("tagLine")
+    user.puuid_resolved_for = f"{user.riot_id}#{user.tagline}"
+
+def resolve_account(user, api_key):
+    """向Riot解析用户的PUUID并保存，返回 fetch_puuid 的结果"""
+    result = fetch_puuid(user.riot_id, user.tagline, api_key, user.region)
+    if "puuid" in result:
+        remember_account(user, result)
+        db.session.commit()
+        bump_profile_version(user.id)
+    return result
+
+def bump_profile_version(user_id):
+    """用户资料或账号数据提交后调用，缓存的仪表盘响应随之失效"""
+    data_versions.configure(app)
+    data_versions.bump(profile_scope(user_id))
+
 # 添加一个API路由用于获取用户游戏数据
 @app.route('/api/game_profile')
 @login_required
@@ -248,43 +343,105 @@ def api_game_profile():
     if not api_key:
         return jsonify({"status": "error", "message": "无法获取API密钥"}), 500
     
-    # 获取PUUID
-    puuid_result = fetch_puuid(user.riot_id, user.tagline, api_key)
-    if "error" in puuid_result:
-        return jsonify({"status": "error", "message": puuid_result["error"]}), 400
-    
-    puuid = puuid_result["puuid"]
-    
-    # 获取段位信息
-    rank_info = fetch_rank_info(puuid, api_key)
-    
-    # 获取最近的比赛列表
-    match_list = fetch_match_list(puuid, 5, api_key)
-    
-    # 返回组合数据
+    # 优先使用保存的PUUID，Riot ID变化过或还没保存账号数据时才重新解析
+    puuid_result = stored_account(user)
+    resolved = puuid_result is None
+    if resolved:
+        puuid_result = resolve_account(user, api_key)
+        if "error" in puuid_result:
+            return jsonify({"status": "error", "message": puuid_result["error"]}), 400
+    
+    # 段位和最近的比赛列表在不同的主机上，并发请求
+    rank_info, match_list = fetch_profile_data(puuid_result["puuid"], api_key, user.region)
+    
+    # 保存的PUUID被Riot拒绝（400/404）时重新解析一次再请求
+    if not resolved and (is_invalid_puuid_error(rank_info) or is_invalid_puuid_error(match_list)):
+        invalidate_account(user.riot_id, user.tagline)
+        puuid_result = resolve_account(user, api_key)
+        if "error" in puuid_result:
+            return jsonify({"status": "error", "message": puuid_result["error"]}), 400
+        rank_info, match_list = fetch_profile_data(puuid_result["puuid"], api_key, user.region)
+    
+    rank_failed = isinstance(rank_info, dict) and "error" in rank_info
+    matches_failed = isinstance(match_list, dict) and "error" in match_list
+    
+    # 返回组合数据；某个请求失败或超时时返回其余部分，并标记 partial
     return jsonify({
         "status": "success",
         "data": {
             "account": puuid_result,
-            "rank": rank_info if not isinstance(rank_info, dict) or "error" not in rank_info else None,
-            "matches": match_list if not isinstance(match_list, dict) or "error" not in match_list else []
+            "rank": rank_info if not rank_failed else None,
+            "matches": match_list if not matches_failed else [],
+            "partial": rank_failed or matches_failed
         }
     })
 
+def fetch_profile_data(puuid, api_key, region=None):
+    """并发获取段位信息和最近5场比赛ID，返回 (rank_info, match_list)"""
+    results = fetch_concurrently({
+        "rank": lambda: fetch_rank_info(puuid, api_key, region),
+        "matches": lambda: fetch_match_list(puuid, 5, api_key, region)
+    })
+    return results["rank"], results["matches"]
+
 @app.route('/api/analyze_game_modes', methods=['POST'])
 @login_required
 def api_analyze_game_modes():
-    """触发分析当前用户最近30场对局的游戏模式"""
-    from routes.algorithm import analyze_game_modes
-    
+    """触发分析当前用户最近30场对局的游戏模式（后台执行，立即返回任务ID）"""
     user_id = session.get('user_id')
     if not user_id:
         print("用户未登录，无法分析游戏模式")
         return jsonify({"status": "error", "message": "用户未登录"}), 401
     
-    # 移除冷却检查代码，直接执行分析
+    # 分析可能需要几分钟，交给后台任务队列，前端轮询任务状态
+    analysis_jobs.configure(app)
+    job = analysis_jobs.submit(user_id, run_analysis)
+    print(f"用户 {user_id} 的游戏模式分析已入队，任务ID: {job.id}")
+    return jsonify({"status": "success", "job_id": job.id, "job": job.to_dict()}), 202
+
+@app.route('/api/analyze_game_modes/<job_id>')
+@login_required
+def api_analyze_job_status(job_id):
+    """查询分析任务的进度；任务结束后附带分析结果"""
+    job = analysis_jobs.get(job_id)
+    if not job or job.user_id != session.get('user_id'):
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+    return jsonify({"status": "success", "job": job.to_dict(include_result=True)})
+
+@app.route('/api/analyze_game_modes/<job_id>/events')
+@login_required
+def api_analyze_job_events(job_id):
+    """
+    用Server-Sent Events推送分析任务的实时进度（每场对局一个progress事件，附带部分模式占比），
+    任务结束时推送done或error事件后关闭。支持 Last-Event-ID 断线续传
+    """
+    job = analysis_jobs.get(job_id)
+    if not job or job.user_id != session.get('user_id'):
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    
+    # 生成器只读取内存中的任务状态：不使用 stream_with_context，
+    # 流式响应期间不保留请求上下文，也就不会一直占用数据库会话
+    def generate():
+        for index, name, data in job.iter_events(start):
+            if index is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {index}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def run_analysis(user_id, on_progress=None):
+    """执行一次完整分析并保存详细分析数据（在后台任务线程中运行）"""
+    from routes.algorithm import analyze_game_modes
+    
     print(f"开始为用户 {user_id} 分析游戏模式")
-    result = analyze_game_modes(user_id)
+    result = analyze_game_modes(user_id, on_progress=on_progress)
     print(f"游戏模式分析完成，状态: {result['status']}")
     
     # 如果分析成功，保存详细分析数据到数据库
@@ -334,204 +491,57 @@ def api_analyze_game_modes():
         
         analysis.last_updated = datetime.utcnow()
         
-        # 保存到数据库
+        # 游戏模式统计、详细分析和读取接口直接输出的分析文档在同一个事务中提交
         db.session.add(analysis)
+        materialize_analysis(user_id, commit=False)
         db.session.commit()
         print(f"已保存用户 {user_id} 的详细分析数据")
-    
-    return jsonify(result)
-
-def build_simplified_analysis(user_id, matches):
-    """
-    基于数据库中已有的比赛记录构建简化版的分析数据
-    这个函数不会调用Riot API，仅使用已保存的数据
-    """
-    # 初始化分析数据结构
-    analysis = {
-        "favorite_champions": {},
-        "favorite_positions": {},
-        "multikill_stats": {
-            "doubles": 0,
-            "triples": 0,
-            "quadras": 0,
-            "pentas": 0,
-            "total": 0,
-            "average": 0
-        },
-        "fun_stats": {
-            "total_gold_earned": 0,
-            "avg_gold_per_match": 0,
-            "total_kills": 0,
-            "total_deaths": 0,
-            "total_assists": 0,
-            "avg_kills_per_match": 0,
-            "avg_deaths_per_match": 0,
-            "avg_assists_per_match": 0,
-            "avg_kda": 0,
-            "total_vision_score": 0,
-            "avg_vision_score": 0,
-            "total_damage_dealt_to_champions": 0,
-            "avg_damage_per_match": 0
-        }
-    }
-    
-    # 尝试查找是否有详细分析数据
-    detailed = DetailedAnalysis.query.filter_by(user_id=user_id).first()
-    if detailed:
-        # 使用数据库中的详细分析数据
-        analysis["favorite_champions"] = detailed.favorite_champions
-        analysis["favorite_positions"] = detailed.favorite_positions
-        analysis["multikill_stats"] = {
-            "doubles": detailed.double_kills,
-            "triples": detailed.triple_kills,
-            "quadras": detailed.quadra_kills,
-            "pentas": detailed.penta_kills,
-            "total": detailed.total_multikills,
-            "average": detailed.avg_multikills_per_match
-        }
-        analysis["fun_stats"] = {
-            "total_gold_earned": detailed.total_gold_earned,
-            "avg_gold_per_match": detailed.avg_gold_per_match,
-            "total_kills": detailed.total_kills,
-            "total_deaths": detailed.total_deaths,
-            "total_assists": detailed.total_assists,
-            "avg_kills_per_match": detailed.avg_kills_per_match,
-            "avg_deaths_per_match": detailed.avg_deaths_per_match,
-            "avg_assists_per_match": detailed.avg_assists_per_match,
-            "avg_kda": detailed.avg_kda,
-            "total_vision_score": detailed.total_vision_score,
-            "avg_vision_score": detailed.avg_vision_score,
-            "total_damage_dealt_to_champions": detailed.total_damage_dealt,
-            "avg_damage_per_match": detailed.avg_damage_per_match,
-        }
         
-        # 如果有敌方和己方英雄数据，也添加进去
-        if hasattr(detailed, 'enemy_champions') and detailed.enemy_champions:
-            analysis["enemy_champions"] = detailed.enemy_champions
-        if hasattr(detailed, 'ally_champions') and detailed.ally_champions:
-            analysis["ally_champions"] = detailed.ally_champions
-            
-        return analysis
-    
-    # 如果数据库中没有详细分析，可以返回示例数据
-    if not matches or len(matches) == 0:
-        # 添加一些示例数据
-        popular_champions = {
-            "未知英雄": 0
-        }
-        positions = {
-            "未知位置": 0
-        }
+        # 全部提交后再更新版本，缓存的统计和好友摘要响应随之失效
+        data_versions.configure(app)
+        data_versions.bump(analysis_scope(user_id))
     else:
-        # 尝试从match记录中提取一些基本信息
-        # 这里只是一个简化版，无法获取详细的游戏数据
-        popular_champions = {"未知英雄": len(matches)}
-        positions = {"未知位置": len(matches)}
+        # 分析失败时丢弃写入会话但未提交的部分结果
+        db.session.rollback()
     
-    analysis["favorite_champions"] = popular_champions
-    analysis["favorite_positions"] = positions
-    
-    return analysis
+    return result
 
 @app.route('/api/game_modes_stats')
 @login_required
 def api_game_modes_stats():
-    """获取当前用户的游戏模式统计数据和详细分析"""
+    """获取当前用户的游戏模式统计数据和详细分析（按分析数据版本缓存，支持ETag/304）"""
     user_id = session.get('user_id')
     if not user_id:
         print("用户未登录，无法获取游戏模式统计")
         return jsonify({"status": "error", "message": "用户未登录"}), 401
     
+    versioned_responses.configure(app)
+    return versioned_responses.respond(("game_modes_stats", user_id), [analysis_scope(user_id)],
+                                       lambda: build_game_modes_stats(user_id))
+
+def build_game_modes_stats(user_id):
+    """生成 /api/game_modes_stats 的响应，返回 (payload, status, expires_at)；数据部分直接使用已序列化的分析文档"""
     print(f"正在查询用户 {user_id} 的游戏模式统计")
-    stats = GameModeStats.query.filter_by(user_id=user_id).first()
-    if not stats:
+    document = load_analysis_document(user_id)
+    if not document:
         print(f"用户 {user_id} 尚未分析游戏模式数据")
-        return jsonify({
+        return {
             "status": "error", 
             "message": "尚未分析游戏模式数据",
             "needsAnalysis": True
-        }), 404
-    
-    # 获取详细分析数据
-    detailed_analysis = DetailedAnalysis.query.filter_by(user_id=user_id).first()
-    
-    # 构建详细分析数据结构
-    detailed_data = None
-    if detailed_analysis:
-        detailed_data = {
-            "favorite_champions": detailed_analysis.favorite_champions,
-            "favorite_positions": detailed_analysis.favorite_positions,
-            "multikill_stats": {
-                "doubles": detailed_analysis.double_kills,
-                "triples": detailed_analysis.triple_kills,
-                "quadras": detailed_analysis.quadra_kills,
-                "pentas": detailed_analysis.penta_kills,
-                "total": detailed_analysis.total_multikills,
-                "average": detailed_analysis.avg_multikills_per_match
-            },
-            "fun_stats": {
-                "total_gold_earned": detailed_analysis.total_gold_earned,
-                "avg_gold_per_match": detailed_analysis.avg_gold_per_match,
-                "total_kills": detailed_analysis.total_kills,
-                "total_deaths": detailed_analysis.total_deaths,
-                "total_assists": detailed_analysis.total_assists,
-                "avg_kills_per_match": detailed_analysis.avg_kills_per_match,
-                "avg_deaths_per_match": detailed_analysis.avg_deaths_per_match,
-                "avg_assists_per_match": detailed_analysis.avg_assists_per_match,
-                "avg_kda": detailed_analysis.avg_kda,
-                "total_vision_score": detailed_analysis.total_vision_score,
-                "avg_vision_score": detailed_analysis.avg_vision_score,
-                "total_damage_dealt_to_champions": detailed_analysis.total_damage_dealt,
-                "avg_damage_per_match": detailed_analysis.avg_damage_per_match,
-                "total_damage_taken": detailed_analysis.total_damage_taken,
-                "total_items_purchased": detailed_analysis.total_items_purchased
-            }
-        }
-        
-        # 如果有敌方和己方英雄数据，也添加进去
-        if detailed_analysis.enemy_champions:
-            detailed_data["enemy_champions"] = detailed_analysis.enemy_champions
-        if detailed_analysis.ally_champions:
-            detailed_data["ally_champions"] = detailed_analysis.ally_champions
-    else:
-        # 如果没有详细分析数据，创建一个简化版的空结构
-        detailed_data = build_simplified_analysis(user_id, [])
+        }, 404, None
+    stats_json, _, stats_updated = document
     
     # 检查数据是否过时
     now = datetime.utcnow()
-    if (now - stats.last_updated).days > 1:  # 如果数据超过1天
-        print(f"用户 {user_id} 的游戏模式数据已过时，最后更新: {stats.last_updated}")
-        return jsonify({
-            "status": "success",
-            "data": {
-                "sr_5v5_percentage": stats.sr_5v5_percentage,
-                "aram_percentage": stats.aram_percentage,
-                "fun_modes_percentage": stats.fun_modes_percentage,
-                "bot_games_percentage": stats.bot_games_percentage,
-                "custom_percentage": stats.custom_percentage,
-                "unknown_percentage": stats.unknown_percentage,
-                "total_matches": stats.total_matches,
-                "last_updated": stats.last_updated.strftime("%Y-%m-%d %H:%M:%S"),
-                "detailed_analysis": detailed_data
-            },
-            "needsUpdate": True
-        })
+    if (now - stats_updated).days > 1:  # 如果数据超过1天
+        print(f"用户 {user_id} 的游戏模式数据已过时，最后更新: {stats_updated}")
+        return {"status": "success", "data": RawJSON(stats_json), "needsUpdate": True}, 200, None
     
-    print(f"成功获取用户 {user_id} 的游戏模式统计，共 {stats.total_matches} 场比赛")
-    return jsonify({
-        "status": "success",
-        "data": {
-            "sr_5v5_percentage": stats.sr_5v5_percentage,
-            "aram_percentage": stats.aram_percentage,
-            "fun_modes_percentage": stats.fun_modes_percentage,
-            "bot_games_percentage": stats.bot_games_percentage,
-            "custom_percentage": stats.custom_percentage,
-            "unknown_percentage": stats.unknown_percentage,
-            "total_matches": stats.total_matches,
-            "last_updated": stats.last_updated.strftime("%Y-%m-%d %H:%M:%S"),
-            "detailed_analysis": detailed_data
-        }
-    })
+    # 数据过时后响应会带上 needsUpdate，缓存到那个时刻为止
+    stale_at = time.time() + (stats_updated + timedelta(days=2) - now).total_seconds()
+    print(f"成功获取用户 {user_id} 的游戏模式统计")
+    return {"status": "success", "data": RawJSON(stats_json)}, 200, stale_at
 
 @app.route('/api/recent_matches')
 @login_required
@@ -543,22 +553,80 @@ def api_recent_matches():
         return jsonify({"status": "error", "message": "用户未登录"}), 401
     
     print(f"正在查询用户 {user_id} 的最近对局记录")
-    # 获取最近30场对局记录
-    matches = MatchRecord.query.filter_by(user_id=user_id).order_by(MatchRecord.game_date.desc()).limit(30).all()
+    match_list = recent_match_list(user_id)
     
-    match_list = [{
+    print(f"成功获取用户 {user_id} 的 {len(match_list)} 场最近对局")
+    return jsonify({
+        "status": "success",
+        "data": match_list
+    })
+
+def recent_match_list(user_id, limit=30):
+    """用户最近的对局记录（默认30场），只查询需要的列"""
+    rows = db.session.query(
+        MatchRecord.match_id, MatchRecord.queue_id, MatchRecord.game_mode,
+        MatchRecord.game_category, MatchRecord.game_date
+    ).filter(MatchRecord.user_id == user_id).order_by(MatchRecord.game_date.desc()).limit(limit).all()
+    
+    return [{
         "match_id": match.match_id,
         "queue_id": match.queue_id,
         "game_mode": match.game_mode,
         "category": match.game_category,
         "date": match.game_date.strftime("%Y-%m-%d %H:%M:%S")
-    } for match in matches]
+    } for match in rows]
+
+@app.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    """
+    仪表盘首屏需要的全部数据：账号资料、游戏模式统计和详细分析、最近对局、能否分析
+    一次请求代替依次调用 /api/puuid、/api/game_modes_stats、/api/can_analyze；
+    按资料和分析数据版本缓存，支持ETag/304
+    """
+    user_id = session.get('user_id')
+    versioned_responses.configure(app)
+    return versioned_responses.respond(("dashboard", user_id), [profile_scope(user_id), analysis_scope(user_id)],
+                                       lambda: build_dashboard(user_id))
+
+def build_dashboard(user_id):
+    """生成 /api/dashboard 的响应，返回 (payload, status, expires_at)；不请求Riot"""
+    user = User.query.get(user_id)
+    if not user:
+        return {"status": "error", "message": "找不到用户信息"}, 404, None
     
-    print(f"成功获取用户 {user_id} 的 {len(match_list)} 场最近对局")
-    return jsonify({
+    # 统计部分与 /api/game_modes_stats 的响应相同（含 status/needsAnalysis/needsUpdate），数据部分是已序列化的分析文档
+    stats_payload, _, expires_at = build_game_modes_stats(user.id)
+    return {
         "status": "success",
-        "data": match_list
-    })
+        "data": {
+            "profile": dashboard_profile(user),
+            "gameModeStats": stats_payload,
+            "recentMatches": recent_match_list(user.id),
+            "analyze": analyze_eligibility(user.id)
+        }
+    }, 200, expires_at
+
+def dashboard_profile(user):
+    """
+    仪表盘的账号资料，只使用保存的账号数据
+    还没有解析过PUUID（或Riot ID变化过）时 needsResolve 为True，前端在首屏之后再调用 /api/puuid
+    """
+    profile = {
+        "username": user.username,
+        "riot_id": user.riot_id,
+        "tagline": user.tagline,
+        "region": user.region,
+        "account": None
+    }
+    if not user.riot_id or not user.tagline:
+        profile["needsUpdate"] = True
+        return profile
+    
+    profile["account"] = stored_account(user)
+    if profile["account"] is None:
+        profile["needsResolve"] = True
+    return profile
 
 @app.route('/api/search_user', methods=['GET'])
 @login_required
@@ -587,11 +655,8 @@ def api_search_user():
             User.username == search_value
         ).limit(10).all()
     else:
-        # 模糊匹配
-        users = User.query.filter(
-            User.id != current_user_id,
-            User.username.like(f'%{search_value}%')
-        ).limit(10).all()
+        # 模糊匹配：用户名或 riot_id#tagline 的子串，走全文索引（见 routes/user_search.py）
+        users = search_users(search_value, exclude_id=current_user_id, limit=10)
     
     user_list = [{
         "id": user.id,
@@ -609,29 +674,22 @@ def api_search_user():
 @app.route('/api/friends')
 @login_required
 def api_get_friends():
-    """获取当前用户的好友列表"""
+    """
+    获取当前用户的好友列表（一次联表查询）
+    查询参数：limit 每页数量，cursor 上一页返回的 next_cursor，summary=1 时附带每个好友的最常用英雄和模式
+    """
     current_user_id = session.get('user_id')
+    limit = request.args.get('limit', DEFAULT_FRIENDS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_FRIENDS_PAGE_SIZE))
+    cursor = request.args.get('cursor', type=int)
+    with_summary = request.args.get('summary', '').lower() in ('1', 'true')
     
-    # 查询好友关系
-    friends = Friend.query.filter_by(user_id=current_user_id).all()
-    
-    friend_list = []
-    for friend_rel in friends:
-        # 获取好友的用户信息
-        friend = User.query.get(friend_rel.friend_id)
-        if friend:
-            friend_list.append({
-                "id": friend.id,
-                "username": friend.username,
-                "riot_id": friend.riot_id,
-                "tagline": friend.tagline,
-                "region": friend.region,
-                "last_login": friend.last_login.isoformat() if friend.last_login else None
-            })
+    friend_list, next_cursor = list_friends(current_user_id, limit, cursor, with_summary)
     
     return jsonify({
         "status": "success",
-        "data": friend_list
+        "data": friend_list,
+        "next_cursor": next_cursor
     })
 
 @app.route('/api/add_friend', methods=['POST'])
@@ -668,6 +726,8 @@ def api_add_friend():
     db.session.add(new_friend_back)
     
     db.session.commit()
+    data_versions.configure(app)
+    data_versions.bump(friends_scope(current_user_id), friends_scope(friend_id))
     
     return jsonify({
         "status": "success",
@@ -711,6 +771,8 @@ def api_remove_friend():
         db.session.delete(friend_rel_back)
     
     db.session.commit()
+    data_versions.configure(app)
+    data_versions.bump(friends_scope(current_user_id), friends_scope(friend_id))
     
     return jsonify({
         "status": "success",
@@ -723,10 +785,28 @@ def api_can_analyze():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"status": "error", "message": "用户未登录"}), 401
+    eligibility = analyze_eligibility(user_id)
+    return jsonify({
+        "status": "success",
+        "canAnalyze": eligibility["canAnalyze"],
+        "message": eligibility["message"]
+    })
+
+def analyze_eligibility(user_id):
+    """用户当前能否发起分析"""
+    return {"canAnalyze": True, "message": "可以进行分析"}
+
+@app.route('/api/riot_status')
+@login_required
+def api_riot_status():
+    """Riot API调用情况：合并的相同请求数、实际发出的请求数、响应缓存的命中情况，以及各主机的熔断状态"""
     return jsonify({
         "status": "success",
-        "canAnalyze": True,
-        "message": "可以进行分析"
+        "data": {
+            "single_flight": riot_single_flight.stats(),
+            "response_cache": riot_cache.stats(),
+            "circuit_breakers": riot_breakers.states()
+        }
     })
 
 @app.route('/api/friend_summary/<int:friend_user_id>')
@@ -734,6 +814,16 @@ def api_can_analyze():
 def get_friend_summary(friend_user_id):
     current_user_id = session.get('user_id')
 
+    # Cached per (viewer, friend); rebuilt only when the friend's analysis or the viewer's friendships change.
+    versioned_responses.configure(app)
+    return versioned_responses.respond(
+        ("friend_summary", current_user_id, friend_user_id),
+        [friends_scope(current_user_id), analysis_scope(friend_user_id)],
+        lambda: build_friend_summary(current_user_id, friend_user_id))
+
+def build_friend_summary(current_user_id, friend_user_id):
+    """Build the /api/friend_summary response as (payload, status, expires_at)."""
+
     # Verify if the requested user is actually a friend of the current user.
     # This is an important security/privacy check.
     # Checking both directions of friendship as per your add_friend logic
@@ -745,77 +835,29 @@ def get_friend_summary(friend_user_id):
     if not is_friend_check:
         # If you want to be more discreet and not reveal friendship status,
         # you could return a generic "data not found" or "permission denied"
-        return jsonify({"status": "error", "message": "Requested user is not a friend or permission denied."}), 403
+        return {"status": "error", "message": "Requested user is not a friend or permission denied."}, 403, None
 
-    friend_user = User.query.get(friend_user_id)
-    if not friend_user:
-        return jsonify({"status": "error", "message": "Friend user not found."}), 404
+    friend_username = db.session.query(User.username).filter(User.id == friend_user_id).scalar()
+    if friend_username is None:
+        return {"status": "error", "message": "Friend user not found."}, 404, None
 
-    detailed_analysis = DetailedAnalysis.query.filter_by(user_id=friend_user_id).first()
-    game_mode_stats = GameModeStats.query.filter_by(user_id=friend_user_id).first()
+    # The summary is a projection stored in the friend's analysis document at analysis time.
+    document = load_analysis_document(friend_user_id)
+    summary_json = document[1] if document else None
 
-    if not detailed_analysis or not game_mode_stats:
-        return jsonify({
+    if not summary_json:
+        return {
             "status": "info",
-            "message": f"Analysis data for {friend_user.username} is not available yet. They might need to perform an analysis on their dashboard.",
+            "message": f"Analysis data for {friend_username} is not available yet. They might need to perform an analysis on their dashboard.",
             "data": {
-                "username": friend_user.username,
+                "username": friend_username,
                 "favorite_champions": [],
                 "total_multikills": 0,
                 "favorite_game_mode": "Not Available"
             }
-        }), 200 # Using 200 with an info message as data structure is still returned
-
-    summary_data = {
-        "username": friend_user.username,
-        "favorite_champions": [],
-        "total_multikills": 0,
-        "favorite_game_mode": "Not Available"
-    }
+        }, 200, None # Using 200 with an info message as data structure is still returned
 
-    # 1. Extract Favorite Champions (e.g., top 3)
-    if detailed_analysis.favorite_champions:
-        # Assuming favorite_champions is a dict like {'ChampionName': play_count}
-        # Sort by play_count and take top 3 champion names
-        try:
-            sorted_champions = sorted(detailed_analysis.favorite_champions.items(), key=lambda item: item[1], reverse=True)
-            summary_data["favorite_champions"] = [champ[0] for champ in sorted_champions[:3]]
-        except Exception as e:
-            print(f"Error processing favorite champions for user {friend_user_id}: {e}")
-            summary_data["favorite_champions"] = ["Error processing"]
-
-
-    # 2. Calculate Total Multikills
-    summary_data["total_multikills"] = (
-        (detailed_analysis.double_kills or 0) +
-        (detailed_analysis.triple_kills or 0) +
-        (detailed_analysis.quadra_kills or 0) +
-        (detailed_analysis.penta_kills or 0)
-    )
-
-    # 3. Determine Favorite Game Mode
-    if game_mode_stats:
-        modes_percentages = {
-            "Summoner's Rift 5v5": game_mode_stats.sr_5v5_percentage or 0,
-            "ARAM": game_mode_stats.aram_percentage or 0,
-            "Fun Modes": game_mode_stats.fun_modes_percentage or 0,
-            "Bot Games": game_mode_stats.bot_games_percentage or 0,
-            "Custom Games": game_mode_stats.custom_percentage or 0,
-        }
-        # Filter out modes with 0% and find the max
-        played_modes = {mode: perc for mode, perc in modes_percentages.items() if perc > 0}
-        if played_modes:
-            summary_data["favorite_game_mode"] = max(played_modes, key=played_modes.get)
-        elif game_mode_stats.total_matches > 0 : # If analyzed but no specific mode preference
-             summary_data["favorite_game_mode"] = "Varied / Other Modes"
-        else: # No matches analyzed or all percentages are 0
-            summary_data["favorite_game_mode"] = "N/A (No games analyzed)"
-
-
-    return jsonify({
-        "status": "success",
-        "data": summary_data
-    })
+    return {"status": "success", "data": RawJSON(summary_json)}, 200, None
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
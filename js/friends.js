@@ -66,11 +66,19 @@ document.addEventListener('DOMContentLoaded', function() {
         // 显示加载中
         friendsList.innerHTML = '<div class="loading-friends">Loading your friends list...</div>';
         
-        // 调用API获取好友列表
-        fetch('/api/friends')
+        loadFriendsPage(null);
+    }
+    
+    // 按页获取好友列表，有 next_cursor 时继续加载下一页
+    function loadFriendsPage(cursor) {
+        const url = cursor ? `/api/friends?cursor=${encodeURIComponent(cursor)}` : '/api/friends';
+        
+        fetch(url)
             .then(response => response.json())
             .then(data => {
-                friendsList.innerHTML = '';
+                if (!cursor) {
+                    friendsList.innerHTML = '';
+                }
                 
                 if (data.status === 'success' && data.data.length > 0) {
                     // 显示好友列表
@@ -78,7 +86,10 @@ document.addEventListener('DOMContentLoaded', function() {
                         const friendElement = createFriendElement(friend);
                         friendsList.appendChild(friendElement);
                     });
-                } else {
+                    if (data.next_cursor) {
+                        loadFriendsPage(data.next_cursor);
+                    }
+                } else if (!cursor) {
                     // 没有好友
                     friendsList.innerHTML = '<div class="no-friends-message">You haven\'t added any friends yet</div>';
                 }
@@ -41,47 +41,65 @@ document.addEventListener('DOMContentLoaded', function() {
     async function fetchAndDisplayFriends() {
         try {
             friendsListContainer.innerHTML = '<p class="loading-message">Loading friends...</p>';
-            const response = await fetch('/api/friends');
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            const result = await response.json();
+            // 好友列表和每个好友的摘要（最常用英雄、最常玩模式）按页返回，有 next_cursor 时继续加载下一页
+            let cursor = null;
+            let friendCount = 0;
+            do {
+                const url = cursor ? `/api/friends?summary=1&cursor=${encodeURIComponent(cursor)}` : '/api/friends?summary=1';
+                const response = await fetch(url);
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const result = await response.json();
+                if (result.status !== 'success' || !result.data) {
+                    throw new Error(result.message || 'Failed to load friends data.');
+                }
 
-            if (result.status === 'success' && result.data) {
-                friendsListContainer.innerHTML = ''; // Clear loading/error message
-                if (result.data.length > 0) {
-                    result.data.forEach(friend => {
-                        const friendElement = document.createElement('div');
-                        friendElement.classList.add('friend-item-share');
-                        friendElement.dataset.friendId = friend.id;
-                        friendElement.dataset.friendUsername = friend.username;
-
-                        const iconPlaceholder = document.createElement('div');
-                        iconPlaceholder.classList.add('friend-icon-placeholder-share');
-                        iconPlaceholder.textContent = friend.username.substring(0, 1).toUpperCase();
-
-                        const usernameSpan = document.createElement('span');
-                        usernameSpan.classList.add('friend-username-share');
-                        usernameSpan.textContent = friend.username;
-                        
-                        friendElement.appendChild(iconPlaceholder);
-                        friendElement.appendChild(usernameSpan);
-
-                        friendElement.addEventListener('click', function() {
-                            if (currentSelectedFriendElement) {
-                                currentSelectedFriendElement.classList.remove('active');
-                            }
-                            this.classList.add('active');
-                            currentSelectedFriendElement = this;
-                            fetchAndDisplayFriendSummary(this.dataset.friendId, this.dataset.friendUsername);
-                        });
-                        friendsListContainer.appendChild(friendElement);
-                    });
-                } else {
-                    friendsListContainer.innerHTML = '<p class="no-friends-message">You have no friends yet. Add some from the Friends page!</p>';
+                if (!cursor) {
+                    friendsListContainer.innerHTML = ''; // Clear loading/error message
                 }
-            } else {
-                throw new Error(result.message || 'Failed to load friends data.');
+                friendCount += result.data.length;
+                result.data.forEach(friend => {
+                    const friendElement = document.createElement('div');
+                    friendElement.classList.add('friend-item-share');
+                    friendElement.dataset.friendId = friend.id;
+                    friendElement.dataset.friendUsername = friend.username;
+
+                    const iconPlaceholder = document.createElement('div');
+                    iconPlaceholder.classList.add('friend-icon-placeholder-share');
+                    iconPlaceholder.textContent = friend.username.substring(0, 1).toUpperCase();
+
+                    const usernameSpan = document.createElement('span');
+                    usernameSpan.classList.add('friend-username-share');
+                    usernameSpan.textContent = friend.username;
+                    
+                    friendElement.appendChild(iconPlaceholder);
+                    friendElement.appendChild(usernameSpan);
+
+                    if (friend.summary && friend.summary.top_champion) {
+                        const summarySpan = document.createElement('span');
+                        summarySpan.classList.add('friend-summary-share');
+                        summarySpan.textContent = friend.summary.favorite_game_mode ?
+                            `${friend.summary.top_champion} · ${friend.summary.favorite_game_mode}` :
+                            friend.summary.top_champion;
+                        friendElement.appendChild(summarySpan);
+                    }
+
+                    friendElement.addEventListener('click', function() {
+                        if (currentSelectedFriendElement) {
+                            currentSelectedFriendElement.classList.remove('active');
+                        }
+                        this.classList.add('active');
+                        currentSelectedFriendElement = this;
+                        fetchAndDisplayFriendSummary(this.dataset.friendId, this.dataset.friendUsername);
+                    });
+                    friendsListContainer.appendChild(friendElement);
+                });
+                cursor = result.next_cursor;
+            } while (cursor);
+
+            if (friendCount === 0) {
+                friendsListContainer.innerHTML = '<p class="no-friends-message">You have no friends yet. Add some from the Friends page!</p>';
             }
         } catch (error) {
             console.error('Error loading friends list:', error);
@@ -1,6 +1,5 @@
 document.addEventListener('DOMContentLoaded', function() {
-    fetchRiotIdInfo();
-    fetchGameModeStats();
+    loadDashboard();
 
     document.getElementById('analyze-button').addEventListener('click', function() {
         analyzeMatches();
@@ -24,56 +23,104 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-function fetchRiotIdInfo() {
+// Analyze eligibility from the dashboard bootstrap; null until it has loaded.
+let analyzeEligibility = null;
+
+// One request paints the whole dashboard: profile, mode stats, detailed analysis and analyze eligibility.
+function loadDashboard() {
+    showStatsLoading();
+
+    fetch('/api/dashboard')
+        .then(res => res.json())
+        .then(data => {
+            if (data.status !== 'success') throw new Error(data.message || 'Dashboard unavailable');
+            displayRiotId(data.data.profile);
+            analyzeEligibility = data.data.analyze;
+            renderGameModeStats(data.data.gameModeStats);
+        })
+        .catch(err => {
+            console.error('Error loading dashboard:', err);
+            showStatsError();
+        });
+}
+
+function displayRiotId(profile) {
+    if (profile.account) {
+        showRiotId(profile.account);
+    } else if (profile.needsResolve) {
+        // The account has not been looked up with Riot yet; do it after the first paint.
+        resolveRiotId();
+    } else {
+        showRiotIdMissing();
+    }
+}
+
+function resolveRiotId() {
     fetch('/api/puuid')
         .then(res => res.json())
         .then(data => {
-            const el = document.getElementById('riot-id');
-            if (data.status === 'success') {
-                el.textContent = `${data.data.gameName}#${data.data.tagLine}`;
-            } else {
-                el.textContent = 'Please set your Riot ID in your profile';
-                el.style.color = '#f87171';
-            }
+            if (data.status === 'success') showRiotId(data.data);
+            else showRiotIdMissing();
         })
         .catch(err => {
             console.error('Error fetching Riot ID:', err);
         });
 }
 
-function fetchGameModeStats() {
+function showRiotId(account) {
+    document.getElementById('riot-id').textContent = `${account.gameName}#${account.tagLine}`;
+}
+
+function showRiotIdMissing() {
+    const el = document.getElementById('riot-id');
+    el.textContent = 'Please set your Riot ID in your profile';
+    el.style.color = '#f87171';
+}
+
+function showStatsLoading() {
     document.getElementById('loading-stats').style.display = 'flex';
     document.getElementById('error-stats').style.display = 'none';
     document.getElementById('main-analysis-container').style.display = 'none';
     document.getElementById('fun-stats-container').style.display = 'none';
     document.getElementById('no-matches').style.display = 'none';
     document.getElementById('analyze-button-container').style.display = 'none';
+}
+
+function showStatsError() {
+    document.getElementById('loading-stats').style.display = 'none';
+    document.getElementById('error-stats').style.display = 'block';
+}
+
+function fetchGameModeStats() {
+    showStatsLoading();
 
     fetch('/api/game_modes_stats')
         .then(res => res.json())
-        .then(data => {
-            document.getElementById('loading-stats').style.display = 'none';
-            if (data.status === 'success' && data.data.total_matches > 0) {
-                displayGameModeStats(data.data);
-                if (data.data.detailed_analysis) displayDetailedAnalysis(data.data.detailed_analysis);
-                document.getElementById('main-analysis-container').style.display = 'block';
-                document.getElementById('fun-stats-container').style.display = 'block';
-                if (data.needsUpdate) document.getElementById('analyze-button-container').style.display = 'flex';
-            } else if (data.status === 'error') {
-                if (data.needsAnalysis) document.getElementById('analyze-button-container').style.display = 'flex';
-                else document.getElementById('error-stats').style.display = 'block';
-            } else {
-                document.getElementById('no-matches').style.display = 'block';
-                document.getElementById('analyze-button-container').style.display = 'flex';
-            }
-        })
+        .then(renderGameModeStats)
         .catch(err => {
             console.error('Error fetching stats:', err);
-            document.getElementById('loading-stats').style.display = 'none';
-            document.getElementById('error-stats').style.display = 'block';
+            showStatsError();
         });
 }
 
+// Renders a /api/game_modes_stats response (also embedded in /api/dashboard).
+function renderGameModeStats(data) {
+    document.getElementById('loading-stats').style.display = 'none';
+    if (data.status === 'success' && data.data.total_matches > 0) {
+        displayGameModeStats(data.data);
+        if (data.data.detailed_analysis) displayDetailedAnalysis(data.data.detailed_analysis);
+        document.getElementById('main-analysis-container').style.display = 'block';
+        document.getElementById('fun-stats-container').style.display = 'block';
+        if (data.needsUpdate) document.getElementById('analyze-button-container').style.display = 'flex';
+    } else if (data.status === 'error') {
+        if (data.needsAnalysis) document.getElementById('analyze-button-container').style.display = 'flex';
+        else document.getElementById('error-stats').style.display = 'block';
+    } else {
+        document.getElementById('no-matches').style.display = 'block';
+        document.getElementById('analyze-button-container').style.display = 'flex';
+    }
+}
+
 function displayGameModeStats(data) {
     document.getElementById('sr-percentage').textContent = `${data.sr_5v5_percentage}%`;
     document.getElementById('sr-bar').style.width = `${data.sr_5v5_percentage}%`;
@@ -144,62 +191,144 @@ function displayDetailedAnalysis(analysis) {
 
 
 function showAnalyzeConfirmModal() {
+    // Eligibility came with the dashboard; only ask the server if it has not loaded.
+    if (analyzeEligibility) {
+        openAnalyzeConfirmModal(analyzeEligibility);
+        return;
+    }
     fetch('/api/can_analyze')
         .then(res => res.json())
-        .then(data => {
-            const modal = document.getElementById('analyze-confirm-modal');
-            const msg = document.getElementById('modal-message');
-            const confirmBtn = document.getElementById('confirm-analyze-button');
-
-            if (data.status === 'success' && data.canAnalyze) {
-                modal.style.display = 'block';
-                msg.textContent = 'Are you sure you want to analyze? We suggest that you analyze after the match is over';
-                confirmBtn.style.display = 'inline-block';
-            } else {
-                modal.style.display = 'block';
-                msg.textContent = data.message || 'Unavailable right now';
-                confirmBtn.style.display = 'none';
-            }
-
-            window.onclick = function(event) {
-                if (event.target == modal) modal.style.display = 'none';
-            };
-        })
+        .then(data => openAnalyzeConfirmModal(data.status === 'success' ? data : { canAnalyze: false, message: data.message }))
         .catch(err => {
             console.error('Error checking analyze status:', err);
             alert('ERROER: Unable to check analyze status');
         });
 }
 
+function openAnalyzeConfirmModal(eligibility) {
+    const modal = document.getElementById('analyze-confirm-modal');
+    const msg = document.getElementById('modal-message');
+    const confirmBtn = document.getElementById('confirm-analyze-button');
+
+    if (eligibility.canAnalyze) {
+        modal.style.display = 'block';
+        msg.textContent = 'Are you sure you want to analyze? We suggest that you analyze after the match is over';
+        confirmBtn.style.display = 'inline-block';
+    } else {
+        modal.style.display = 'block';
+        msg.textContent = eligibility.message || 'Unavailable right now';
+        confirmBtn.style.display = 'none';
+    }
+
+    window.onclick = function(event) {
+        if (event.target == modal) modal.style.display = 'none';
+    };
+}
+
 function analyzeMatches() {
-    document.getElementById('loading-stats').style.display = 'flex';
-    document.getElementById('error-stats').style.display = 'none';
-    document.getElementById('main-analysis-container').style.display = 'none';
-    document.getElementById('fun-stats-container').style.display = 'none';
-    document.getElementById('no-matches').style.display = 'none';
-    document.getElementById('analyze-button-container').style.display = 'none';
+    showStatsLoading();
 
+    // The analysis runs as a background job; the POST only returns its id.
     fetch('/api/analyze_game_modes', { 
         method: 'POST', 
         headers: { 'Content-Type': 'application/json' } 
     })
         .then(res => res.json())
         .then((data) => {  
-            document.getElementById('loading-stats').style.display = 'none';
-            if (data.status === 'success' && data.data.total_matches > 0) {
-                displayGameModeStats(data.data);
-                if (data.data.detailed_analysis) {
-                    displayDetailedAnalysis(data.data.detailed_analysis);
-                }
-                document.getElementById('main-analysis-container').style.display = 'block';
-                document.getElementById('fun-stats-container').style.display = 'block';
+            if (data.status === 'success' && data.job_id) {
+                if (window.EventSource) streamAnalysisJob(data.job_id);
+                else pollAnalysisJob(data.job_id);
             } else {
-                document.getElementById('error-stats').style.display = 'block';
+                showAnalyzeError();
             }
         })
         .catch((err) => { 
             console.error('Error analyzing matches:', err);
-            document.getElementById('loading-stats').style.display = 'none';
-            document.getElementById('error-stats').style.display = 'block';
+            showAnalyzeError();
         });
 }
+
+const ANALYSIS_POLL_INTERVAL = 1500;
+
+// Live progress over Server-Sent Events; mode percentages are drawn as matches come in.
+function streamAnalysisJob(jobId) {
+    const source = new EventSource(`/api/analyze_game_modes/${jobId}/events`);
+    let finished = false;
+
+    source.addEventListener('progress', (e) => {
+        const progress = JSON.parse(e.data);
+        showAnalysisProgress(progress);
+        if (progress.mode_percentages) {
+            displayGameModeStats({
+                sr_5v5_percentage: progress.mode_percentages.SR_5v5,
+                aram_percentage: progress.mode_percentages.ARAM,
+                fun_modes_percentage: progress.mode_percentages.Fun_Modes
+            });
+            document.getElementById('main-analysis-container').style.display = 'block';
+        }
+    });
+
+    source.addEventListener('done', () => {
+        finished = true;
+        source.close();
+        setLoadingMessage('Analyzing your match history...');
+        fetchGameModeStats();
+    });
+
+    source.addEventListener('error', (e) => {
+        source.close();
+        if (finished) return;
+        finished = true;
+        // A named "error" event carries the job result; otherwise the connection dropped, so fall back to polling.
+        if (e.data) showAnalyzeError();
+        else pollAnalysisJob(jobId);
+    });
+}
+
+function pollAnalysisJob(jobId) {
+    fetch(`/api/analyze_game_modes/${jobId}`)
+        .then(res => res.json())
+        .then((data) => {
+            if (data.status !== 'success') {
+                showAnalyzeError();
+                return;
+            }
+            const job = data.job;
+            if (job.state === 'success') {
+                setLoadingMessage('Analyzing your match history...');
+                // The job has saved the results; load them the same way as on page load.
+                fetchGameModeStats();
+            } else if (job.state === 'error') {
+                showAnalyzeError();
+            } else {
+                showAnalysisProgress(job);
+                setTimeout(() => pollAnalysisJob(jobId), ANALYSIS_POLL_INTERVAL);
+            }
+        })
+        .catch((err) => {
+            console.error('Error checking analysis progress:', err);
+            showAnalyzeError();
+        });
+}
+
+function showAnalysisProgress(job) {
+    if (!job.total) {
+        setLoadingMessage('Waiting for analysis to start...');
+        return;
+    }
+    let message = `Analyzing match ${job.processed + job.failed} of ${job.total} (${job.api_calls} API calls)`;
+    if (job.eta_seconds !== null) message += `, about ${Math.ceil(job.eta_seconds)}s left`;
+    setLoadingMessage(message);
+}
+
+function setLoadingMessage(message) {
+    const el = document.querySelector('#loading-stats p');
+    if (el) el.textContent = message;
+}
+
+function showAnalyzeError() {
+    setLoadingMessage('Analyzing your match history...');
+    document.getElementById('loading-stats').style.display = 'none';
+    document.getElementById('main-analysis-container').style.display = 'none';
+    document.getElementById('error-stats').style.display = 'block';
+}
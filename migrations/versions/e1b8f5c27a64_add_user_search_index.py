@@ -0,0 +1,43 @@
+"""add user search index
+
+Revision ID: e1b8f5c27a64
+Revises: c4e7a1d93b58
+Create Date: 2025-05-23 15:07:52.640183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b8f5c27a64'
+down_revision = 'c4e7a1d93b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 trigram 索引只在SQLite上创建，其他数据库的搜索使用LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+               "username, riot_tag, tokenize='trigram')")
+    op.execute("INSERT INTO user_search (rowid, username, riot_tag) "
+               "SELECT id, username, coalesce(riot_id, '') || '#' || coalesce(tagline, '') FROM users")
+    op.execute("CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON users BEGIN "
+               "INSERT INTO user_search (rowid, username, riot_tag) VALUES "
+               "(new.id, new.username, coalesce(new.riot_id, '') || '#' || coalesce(new.tagline, '')); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF username, riot_id, tagline ON users BEGIN "
+               "UPDATE user_search SET username = new.username, "
+               "riot_tag = coalesce(new.riot_id, '') || '#' || coalesce(new.tagline, '') WHERE rowid = new.id; END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON users BEGIN "
+               "DELETE FROM user_search WHERE rowid = old.id; END")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS user_search_ad")
+    op.execute("DROP TRIGGER IF EXISTS user_search_au")
+    op.execute("DROP TRIGGER IF EXISTS user_search_ai")
+    op.execute("DROP TABLE IF EXISTS user_search")
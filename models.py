@@ -15,9 +15,18 @@ class User(db.Model):
     tagline = db.Column(db.String(50), nullable=True)
     region = db.Column(db.String(20), nullable=True)
     puuid = db.Column(db.String(100), nullable=True)  # 添加了 puuid 字段，以支持 API 功能
+    # 解析PUUID时Riot返回的账号名称，以及解析时使用的 riot_id#tagline（变化后需要重新解析）
+    account_game_name = db.Column(db.String(50), nullable=True)
+    account_tag_line = db.Column(db.String(50), nullable=True)
+    puuid_resolved_for = db.Column(db.String(110), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     
+    # 对局同步水位：已导入的最新对局（创建时间为毫秒时间戳），只对记录时的PUUID有效
+    match_sync_puuid = db.Column(db.String(100), nullable=True)
+    match_sync_time = db.Column(db.BigInteger, nullable=True)
+    match_sync_id = db.Column(db.String(50), nullable=True)
+    
     def __repr__(self):
         return f'<User {self.username}>'
     
@@ -36,9 +45,10 @@ class MatchRecord(db.Model):
     # 建立与 User 的关系
     user = db.relationship('User', backref=db.backref('match_records', lazy=True))
 
-    # 建立索引以提高查询性能
+    # 建立索引以提高查询性能；同一用户的同一场对局只保存一条记录
     __table_args__ = (
         db.Index('idx_user_match', user_id, match_id),
+        db.UniqueConstraint('user_id', 'match_id', name='uq_match_record_user_match'),
     )
 
 class GameModeStats(db.Model):
@@ -60,7 +70,7 @@ class Friend(db.Model):
     __tablename__ = 'friends'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -114,4 +124,113 @@ class DetailedAnalysis(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关联关系
-    user = db.relationship('User', backref=db.backref('detailed_analysis', uselist=False))
\ No newline at end of file
+    user = db.relationship('User', backref=db.backref('detailed_analysis', uselist=False))
+
+class Match(db.Model):
+    """对局（每个match ID一行，所有用户共享）"""
+    __tablename__ = 'matches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.String(50), unique=True, nullable=False)
+    queue_id = db.Column(db.Integer, nullable=False)
+    game_mode = db.Column(db.String(50), nullable=False)
+    game_category = db.Column(db.String(50), nullable=False)
+    game_creation = db.Column(db.BigInteger, nullable=False)  # 毫秒时间戳
+    game_date = db.Column(db.DateTime, nullable=False)
+    game_duration = db.Column(db.Integer, default=0)  # 秒
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    participants = db.relationship('Participant', backref='match', lazy=True,
+                                   cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<Match {self.match_id}>'
+
+class Participant(db.Model):
+    """对局中每位玩家的数据（每场对局每个puuid一行）"""
+    __tablename__ = 'participants'
+
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.String(50), db.ForeignKey('matches.match_id'), nullable=False)
+    puuid = db.Column(db.String(100), nullable=False)
+    team_id = db.Column(db.Integer, nullable=False)
+    champion_name = db.Column(db.String(50), nullable=False)
+    position = db.Column(db.String(20))
+    win = db.Column(db.Boolean, default=False)
+
+    kills = db.Column(db.Integer, default=0)
+    deaths = db.Column(db.Integer, default=0)
+    assists = db.Column(db.Integer, default=0)
+    double_kills = db.Column(db.Integer, default=0)
+    triple_kills = db.Column(db.Integer, default=0)
+    quadra_kills = db.Column(db.Integer, default=0)
+    penta_kills = db.Column(db.Integer, default=0)
+
+    gold_earned = db.Column(db.Integer, default=0)
+    vision_score = db.Column(db.Integer, default=0)
+    damage_dealt = db.Column(db.Integer, default=0)  # 对英雄造成的伤害
+    damage_taken = db.Column(db.Integer, default=0)
+    items_purchased = db.Column(db.Integer, default=0)
+
+    # 同一场对局中每个玩家只有一行；按puuid查询用户的对局
+    __table_args__ = (
+        db.UniqueConstraint('match_id', 'puuid', name='uq_participant_match_puuid'),
+        db.Index('idx_participant_puuid', 'puuid', 'match_id'),
+    )
+
+    def __repr__(self):
+        return f'<Participant {self.match_id}-{self.puuid[:8]}>'
+
+class AnalysisTotals(db.Model):
+    """用户分析窗口内各项数据的累计值，新对局加入时累加、离开窗口时减去"""
+    __tablename__ = 'analysis_totals'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    puuid = db.Column(db.String(100), nullable=True)  # 累计值对应的puuid，变化时需要重建
+
+    # 当前窗口内的对局ID（JSON列表）
+    match_ids = db.Column(db.JSON, default=[])
+    match_count = db.Column(db.Integer, default=0)  # 找到用户数据的对局数
+
+    double_kills = db.Column(db.Integer, default=0)
+    triple_kills = db.Column(db.Integer, default=0)
+    quadra_kills = db.Column(db.Integer, default=0)
+    penta_kills = db.Column(db.Integer, default=0)
+    gold_earned = db.Column(db.Integer, default=0)
+    kills = db.Column(db.Integer, default=0)
+    deaths = db.Column(db.Integer, default=0)
+    assists = db.Column(db.Integer, default=0)
+    damage_taken = db.Column(db.Integer, default=0)
+    items_purchased = db.Column(db.Integer, default=0)
+    vision_score = db.Column(db.Integer, default=0)
+    damage_dealt = db.Column(db.Integer, default=0)
+    time_played = db.Column(db.Integer, default=0)
+
+    # 计数（JSON格式 {名称: 次数}）
+    champion_counts = db.Column(db.JSON, default={})
+    position_counts = db.Column(db.JSON, default={})
+    ally_counts = db.Column(db.JSON, default={})
+    enemy_counts = db.Column(db.JSON, default={})
+    mode_counts = db.Column(db.JSON, default={})
+
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('analysis_totals', uselist=False))
+
+class AnalysisDocument(db.Model):
+    """分析时生成的、已序列化的分析文档，读取接口直接输出，不再逐字段转换"""
+    __tablename__ = 'analysis_documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    schema_version = db.Column(db.Integer, nullable=False)
+
+    # /api/game_modes_stats 的 data 部分（JSON文本）
+    stats_json = db.Column(db.Text, nullable=False)
+    # 好友摘要（JSON文本）；还没有详细分析时为空
+    summary_json = db.Column(db.Text, nullable=True)
+    # 游戏模式统计的更新时间，用于判断数据是否过时
+    stats_updated = db.Column(db.DateTime, nullable=False)
+
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,291 @@
+# routes/aggregates.py
+from datetime import datetime
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import aliased, selectinload
+
+from models import db, Match, Participant, MatchRecord, AnalysisTotals
+from routes.algorithm import MODE_CATEGORIES
+
+# 统计敌我英雄时只看召唤师峡谷5v5和极地大乱斗
+TEAM_QUEUES = MODE_CATEGORIES['SR_5v5'] + MODE_CATEGORIES['ARAM']
+
+# 分析窗口：最近的对局数
+ANALYSIS_WINDOW = 30
+
+# 游戏模式类别（与 GameModeStats 的百分比字段对应）
+MODE_KEYS = ['SR_5v5', 'ARAM', 'Fun_Modes', 'Bot_Games', 'Custom', 'Unknown']
+
+# AnalysisTotals 中按对局累加的数值字段 -> Participant 字段
+SUM_FIELDS = {
+    "double_kills": "double_kills",
+    "triple_kills": "triple_kills",
+    "quadra_kills": "quadra_kills",
+    "penta_kills": "penta_kills",
+    "gold_earned": "gold_earned",
+    "kills": "kills",
+    "deaths": "deaths",
+    "assists": "assists",
+    "damage_taken": "damage_taken",
+    "items_purchased": "items_purchased",
+    "vision_score": "vision_score",
+    "damage_dealt": "damage_dealt",
+}
+
+
+def recent_match_ids(user_id, limit=ANALYSIS_WINDOW):
+    """数据库中该用户最近的对局ID（按对局时间倒序）"""
+    rows = db.session.query(MatchRecord.match_id).filter(
+        MatchRecord.user_id == user_id
+    ).order_by(MatchRecord.game_date.desc()).limit(limit).all()
+    return [row.match_id for row in rows]
+
+
+def empty_analysis():
+    """没有任何对局时的详细分析结构"""
+    return {
+        "favorite_champions": {},
+        "favorite_positions": {},
+        "enemy_champions": {},
+        "ally_champions": {},
+        "multikill_stats": {"total": 0, "average": 0, "doubles": 0, "triples": 0, "quadras": 0, "pentas": 0},
+        "fun_stats": {
+            "total_gold_earned": 0,
+            "total_kills": 0,
+            "total_damage_taken": 0,
+            "total_items_purchased": 0,
+            "total_deaths": 0,
+            "total_assists": 0,
+            "total_vision_score": 0,
+            "total_time_played": 0,
+            "total_damage_dealt_to_champions": 0
+        }
+    }
+
+
+def _counts(column, *filters):
+    """按列分组计数，返回按次数从高到低排序的dict"""
+    rows = db.session.query(column, func.count()).filter(*filters).group_by(column).order_by(
+        func.count().desc(), column).all()
+    return {name: count for name, count in rows}
+
+
+def aggregate_analysis(puuid, match_ids):
+    """
+    用SQL聚合已保存的对局参与者数据，返回与 analyze_game_modes 相同结构的详细分析
+    不访问Riot API；没有数据时返回None
+    """
+    if not match_ids:
+        return None
+
+    mine = db.session.query(Participant).filter(
+        Participant.puuid == puuid,
+        Participant.match_id.in_(match_ids)
+    ).subquery()
+
+    totals = db.session.query(
+        func.count(),
+        func.coalesce(func.sum(mine.c.double_kills), 0),
+        func.coalesce(func.sum(mine.c.triple_kills), 0),
+        func.coalesce(func.sum(mine.c.quadra_kills), 0),
+        func.coalesce(func.sum(mine.c.penta_kills), 0),
+        func.coalesce(func.sum(mine.c.gold_earned), 0),
+        func.coalesce(func.sum(mine.c.kills), 0),
+        func.coalesce(func.sum(mine.c.deaths), 0),
+        func.coalesce(func.sum(mine.c.assists), 0),
+        func.coalesce(func.sum(mine.c.damage_taken), 0),
+        func.coalesce(func.sum(mine.c.items_purchased), 0),
+        func.coalesce(func.sum(mine.c.vision_score), 0),
+        func.coalesce(func.sum(mine.c.damage_dealt), 0),
+        func.coalesce(func.sum(Match.game_duration), 0)
+    ).select_from(mine).join(Match, Match.match_id == mine.c.match_id).one()
+
+    (match_count, doubles, triples, quadras, pentas, gold, kills, deaths, assists,
+     damage_taken, items_purchased, vision_score, damage_dealt, time_played) = totals
+    if not match_count:
+        return None
+
+    # 最喜欢的英雄和位置
+    favorite_champions = _counts(mine.c.champion_name)
+    favorite_positions = _counts(mine.c.position, mine.c.position.isnot(None),
+                                 mine.c.position.notin_(['', 'Invalid']))
+
+    # 同场的其他玩家，按是否同队区分队友和对手
+    other = aliased(Participant)
+    is_ally = case((other.team_id == mine.c.team_id, 1), else_=0).label('is_ally')
+    teammates = db.session.query(other.champion_name, is_ally, func.count()).select_from(mine).join(
+        other, (other.match_id == mine.c.match_id) & (other.puuid != puuid)
+    ).join(Match, Match.match_id == mine.c.match_id).filter(
+        Match.queue_id.in_(TEAM_QUEUES)
+    ).group_by(other.champion_name, is_ally).order_by(func.count().desc(), other.champion_name).all()
+
+    ally_champions = {}
+    enemy_champions = {}
+    for champion, ally, count in teammates:
+        (ally_champions if ally else enemy_champions)[champion] = count
+
+    total_multikills = doubles + triples + quadras + pentas
+    return {
+        "favorite_champions": favorite_champions,
+        "favorite_positions": favorite_positions,
+        "enemy_champions": enemy_champions,
+        "ally_champions": ally_champions,
+        "multikill_stats": {
+            "total": total_multikills,
+            "average": round(total_multikills / match_count, 2),
+            "doubles": doubles,
+            "triples": triples,
+            "quadras": quadras,
+            "pentas": pentas
+        },
+        "fun_stats": {
+            "total_gold_earned": gold,
+            "total_kills": kills,
+            "total_damage_taken": damage_taken,
+            "total_items_purchased": items_purchased,
+            "total_deaths": deaths,
+            "total_assists": assists,
+            "total_vision_score": vision_score,
+            "total_time_played": time_played,
+            "total_damage_dealt_to_champions": damage_dealt,
+            "avg_gold_per_match": round(gold / match_count),
+            "avg_kills_per_match": round(kills / match_count, 1),
+            "avg_deaths_per_match": round(deaths / match_count, 1),
+            "avg_assists_per_match": round(assists / match_count, 1),
+            "avg_kda": round((kills + assists) / max(deaths, 1), 2),
+            "avg_vision_score": round(vision_score / match_count, 1),
+            "avg_damage_per_match": round(damage_dealt / match_count)
+        }
+    }
+
+
+def _sorted_counts(counts):
+    """按次数从高到低（次数相同按名称）排序，与SQL聚合的顺序一致"""
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+def _add_counts(counts, key, delta):
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def _apply_match(totals, counts, puuid, match, sign):
+    """把一场对局对累计值的贡献加上（sign=1）或减去（sign=-1）"""
+    _add_counts(counts["mode_counts"], match.game_category, sign)
+
+    me = next((p for p in match.participants if p.puuid == puuid), None)
+    if not me:
+        return
+
+    totals.match_count += sign
+    for field, attr in SUM_FIELDS.items():
+        setattr(totals, field, getattr(totals, field) + sign * (getattr(me, attr) or 0))
+    totals.time_played += sign * (match.game_duration or 0)
+
+    _add_counts(counts["champion_counts"], me.champion_name, sign)
+    if me.position and me.position != 'Invalid':
+        _add_counts(counts["position_counts"], me.position, sign)
+
+    if match.queue_id in TEAM_QUEUES:
+        for participant in match.participants:
+            if participant.puuid == puuid:
+                continue
+            key = "ally_counts" if participant.team_id == me.team_id else "enemy_counts"
+            _add_counts(counts[key], participant.champion_name, sign)
+
+
+def update_analysis_totals(user, window_ids):
+    """
+    增量更新用户的累计数据：窗口中新出现的对局累加，离开窗口的对局减去
+    只读取变化的对局，成本与新对局数成正比而不是窗口大小
+    """
+    totals = AnalysisTotals.query.filter_by(user_id=user.id).first()
+    if not totals or totals.puuid != user.puuid:
+        # 第一次分析或更换了Riot账号，从零开始累计
+        if totals:
+            db.session.delete(totals)
+            db.session.flush()
+        totals = AnalysisTotals(user_id=user.id, puuid=user.puuid, match_ids=[], match_count=0, time_played=0,
+                                **{field: 0 for field in SUM_FIELDS})
+        db.session.add(totals)
+
+    old_ids = set(totals.match_ids or [])
+    new_ids = set(window_ids)
+    added = new_ids - old_ids
+    removed = old_ids - new_ids
+
+    # JSON列不会追踪原地修改，复制后整体赋值
+    counts = {key: dict(getattr(totals, key) or {})
+              for key in ("champion_counts", "position_counts", "ally_counts", "enemy_counts", "mode_counts")}
+
+    if added or removed:
+        matches = Match.query.options(selectinload(Match.participants)).filter(
+            Match.match_id.in_(added | removed)).all()
+        for match in matches:
+            _apply_match(totals, counts, user.puuid, match, 1 if match.match_id in added else -1)
+        print(f"累计数据增量更新：新增 {len(added)} 场，移出 {len(removed)} 场")
+
+    for key, value in counts.items():
+        setattr(totals, key, value)
+    totals.match_ids = list(window_ids)
+    totals.last_updated = datetime.utcnow()
+    return totals
+
+
+def derive_analysis(totals):
+    """从累计数据推导详细分析（平均值、排序后的英雄/位置计数）"""
+    match_count = totals.match_count
+    if not match_count:
+        return empty_analysis()
+
+    total_multikills = totals.double_kills + totals.triple_kills + totals.quadra_kills + totals.penta_kills
+    return {
+        "favorite_champions": _sorted_counts(totals.champion_counts or {}),
+        "favorite_positions": _sorted_counts(totals.position_counts or {}),
+        "enemy_champions": _sorted_counts(totals.enemy_counts or {}),
+        "ally_champions": _sorted_counts(totals.ally_counts or {}),
+        "multikill_stats": {
+            "total": total_multikills,
+            "average": round(total_multikills / match_count, 2),
+            "doubles": totals.double_kills,
+            "triples": totals.triple_kills,
+            "quadras": totals.quadra_kills,
+            "pentas": totals.penta_kills
+        },
+        "fun_stats": {
+            "total_gold_earned": totals.gold_earned,
+            "total_kills": totals.kills,
+            "total_damage_taken": totals.damage_taken,
+            "total_items_purchased": totals.items_purchased,
+            "total_deaths": totals.deaths,
+            "total_assists": totals.assists,
+            "total_vision_score": totals.vision_score,
+            "total_time_played": totals.time_played,
+            "total_damage_dealt_to_champions": totals.damage_dealt,
+            "avg_gold_per_match": round(totals.gold_earned / match_count),
+            "avg_kills_per_match": round(totals.kills / match_count, 1),
+            "avg_deaths_per_match": round(totals.deaths / match_count, 1),
+            "avg_assists_per_match": round(totals.assists / match_count, 1),
+            "avg_kda": round((totals.kills + totals.assists) / max(totals.deaths, 1), 2),
+            "avg_vision_score": round(totals.vision_score / match_count, 1),
+            "avg_damage_per_match": round(totals.damage_dealt / match_count)
+        }
+    }
+
+
+def mode_percentages(mode_counts):
+    """各模式占比（百分比，保留两位小数）"""
+    total_matches = sum(mode_counts.values())
+    return {
+        key: round((count / total_matches) * 100, 2) if total_matches > 0 else 0
+        for key, count in mode_counts.items()
+    }
+
+
+def derive_mode_stats(totals):
+    """从累计的模式计数推导 (mode_counts, mode_percentages, total_matches)"""
+    mode_counts = {key: (totals.mode_counts or {}).get(key, 0) for key in MODE_KEYS}
+    return mode_counts, mode_percentages(mode_counts), sum(mode_counts.values())
@@ -1,9 +1,13 @@
 import requests
-import time
-import os
 from flask import jsonify, current_app
 from datetime import datetime
-from models import db, User, GameModeStats, MatchRecord  # 假设你已经有User模型
+from sqlalchemy.exc import IntegrityError
+from models import db, User, GameModeStats, MatchRecord, Match, Participant  # 假设你已经有User模型
+from routes.riot_api import riot_get, invalidate_player
+from routes.match_fetcher import iter_match_details
+from routes.routing import regional_for
+from routes.circuit_breaker import CircuitOpenError
+from routes.versioned_cache import data_versions, analysis_scope
 
 # 游戏模式映射
 GAME_MODE_MAPPING = {
@@ -48,55 +52,187 @@ for category, queue_ids in MODE_CATEGORIES.items():
     for queue_id in queue_ids:
         QUEUE_TO_CATEGORY[queue_id] = category
 
-# API 区域映射
-REGION_ROUTING = {
-    'na': 'americas',
-    'kr': 'asia',
-    'jp': 'asia',
-    'euw': 'europe',
-    'eune': 'europe',
-    'tr': 'europe',
-    'ru': 'europe',
-    'br': 'americas',
-    'lan': 'americas',
-    'las': 'americas',
-    'oce': 'sea',
-    'ph': 'sea',
-    'sg': 'sea',
-    'th': 'sea',
-    'tw': 'asia',
-    'vn': 'sea'
-}
+# 分析的最近对局数，以及对局ID列表每页请求的数量（match-v5 上限100）
+MATCH_HISTORY_SIZE = 30
+MATCH_ID_PAGE_SIZE = 100
 
 def get_api_key():
-    """从环境变量或Flask配置获取Riot API密钥"""
+    """获取Riot API密钥（环境变量 > Flask配置 > 本地文件 > 远程，进程内TTL缓存）"""
     from routes.riot_api import get_api_key as riot_get_api_key
     
-    # 尝试使用riot_api.py中的方法获取
     api_key = riot_get_api_key()
     
-    # 如果上面的方法失败，尝试从环境变量或配置获取
-    if not api_key:
-        api_key = os.environ.get('RIOT_API_KEY')
-        
-        if not api_key and current_app:
-            api_key = current_app.config.get('RIOT_API_KEY')
-    
     # 如果仍未获取到有效密钥，记录详细日志
     if not api_key:
         print("警告：无法获取有效的Riot API密钥")
-    else:
-        print(f"成功获取API密钥: {api_key[:5]}...")
     
     return api_key
 
+def invalidate_on_unauthorized(error, api_key):
+    """请求返回401时使缓存的API密钥失效"""
+    from routes.riot_api import invalidate_api_key
+    
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code == 401:
+        print("API密钥已被拒绝(401)，清除缓存的密钥")
+        invalidate_api_key(api_key)
+
 def get_routing_value(region):
-    """根据用户的区域确定API路由值"""
-    region = region.lower()
-    return REGION_ROUTING.get(region, 'sea')  # 默认使用sea
+    """根据用户的区域确定match-v5的区域路由值（见 routes/routing.py）"""
+    return regional_for(region)
+
+def ingest_match(match_id, match_data):
+    """把match-v5对局详情导入共享的 Match/Participant 表；已导入过的直接返回"""
+    existing = Match.query.filter_by(match_id=match_id).first()
+    if existing:
+        return existing
+    
+    info = match_data.get('info', {})
+    queue_id = info.get('queueId', 0)
+    game_creation = info.get('gameCreation', 0)
+    match = Match(
+        match_id=match_id,
+        queue_id=queue_id,
+        game_mode=GAME_MODE_MAPPING.get(queue_id, "Unknown"),
+        game_category=QUEUE_TO_CATEGORY.get(queue_id, "Unknown"),
+        game_creation=game_creation,
+        game_date=datetime.fromtimestamp(game_creation / 1000),
+        game_duration=int(info.get('gameDuration', 0))
+    )
+    
+    seen_puuids = set()
+    for index, participant in enumerate(info.get('participants', [])):
+        # 人机对局中的电脑玩家puuid都是"BOT"，加上序号保证唯一
+        puuid = participant.get('puuid') or 'BOT'
+        if puuid in seen_puuids:
+            puuid = f"{puuid}#{participant.get('participantId', index)}"
+        seen_puuids.add(puuid)
+        
+        match.participants.append(Participant(
+            puuid=puuid,
+            team_id=participant.get('teamId', 0),
+            champion_name=participant.get('championName', 'Unknown'),
+            position=participant.get('individualPosition', ''),
+            win=bool(participant.get('win', False)),
+            kills=int(participant.get('kills', 0)),
+            deaths=int(participant.get('deaths', 0)),
+            assists=int(participant.get('assists', 0)),
+            double_kills=int(participant.get('doubleKills', 0)),
+            triple_kills=int(participant.get('tripleKills', 0)),
+            quadra_kills=int(participant.get('quadraKills', 0)),
+            penta_kills=int(participant.get('pentaKills', 0)),
+            gold_earned=int(participant.get('goldEarned', 0)),
+            vision_score=int(participant.get('visionScore', 0)),
+            damage_dealt=int(participant.get('totalDamageDealtToChampions', 0)),
+            damage_taken=int(participant.get('totalDamageTaken', 0)),
+            items_purchased=int(participant.get('itemsPurchased', 0))
+        ))
+    
+    try:
+        with db.session.begin_nested():
+            db.session.add(match)
+    except IntegrityError:
+        # 另一个请求同时导入了同一场对局
+        match = Match.query.filter_by(match_id=match_id).first()
+    return match
+
+def iter_shared_matches(match_ids, routing_value, api_key):
+    """
+    按match ID获取共享的 Match 记录，产出 (match_id, match, error)
+    已导入的对局一次查询读出，其余的并发下载后导入
+    """
+    if not match_ids:
+        return
+    
+    shared = {m.match_id: m for m in Match.query.filter(Match.match_id.in_(match_ids)).all()}
+    fetch_ids = [match_id for match_id in match_ids if match_id not in shared]
+    print(f"{len(shared)} 场对局已在共享对局表中，需要获取 {len(fetch_ids)} 场对局详情")
+    
+    for match_id in match_ids:
+        if match_id in shared:
+            yield match_id, shared[match_id], None
+    
+    for match_id, match_data, error in iter_match_details(fetch_ids, routing_value, api_key):
+        if error:
+            yield match_id, None, error
+        else:
+            yield match_id, ingest_match(match_id, match_data), None
 
-def fetch_match_history(user_id):
-    """获取用户最近30场对局的历史并分析游戏模式分布"""
+def fetch_new_match_ids(user, routing_value, api_key, limit=MATCH_HISTORY_SIZE):
+    """
+    获取同步水位之后的新对局ID（新的在前）
+    有水位时用 startTime 只请求水位之后开始的对局，分页获取，遇到水位对局就停止；
+    没有水位（首次同步或更换了Riot账号）时请求最近 limit 场
+    请求失败时抛出 requests.exceptions.RequestException
+    """
+    params = {}
+    watermark_id = None
+    if user.match_sync_time and user.match_sync_puuid == user.puuid:
+        params["startTime"] = user.match_sync_time // 1000
+        watermark_id = user.match_sync_id
+    
+    url = f"https://{routing_value}.api.riotgames.com/lol/match/v5/matches/by-puuid/{user.puuid}/ids"
+    page_size = min(limit, MATCH_ID_PAGE_SIZE)
+    new_ids = []
+    start = 0
+    while len(new_ids) < limit:
+        response = riot_get(url, api_key, params={**params, "start": start, "count": page_size})
+        response.raise_for_status()
+        page = response.json()
+        for match_id in page:
+            if match_id == watermark_id:
+                return new_ids
+            new_ids.append(match_id)
+        if len(page) < page_size:
+            break
+        start += page_size
+    return new_ids[:limit]
+
+def insert_or_ignore(model, rows, conflict_columns):
+    """一条语句批量插入多行，与唯一约束冲突的行直接忽略"""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model.__table__).on_conflict_do_nothing(index_elements=conflict_columns)
+    db.session.execute(stmt, rows)
+
+def advance_sync_watermark(user, match_ids, succeeded_ids):
+    """
+    把同步水位推进到最新的、比所有失败对局都早的成功对局，
+    失败的对局在下次同步时仍在 startTime 之后，会被重新获取
+    """
+    candidate = None
+    for match_id in match_ids:
+        if match_id not in succeeded_ids:
+            candidate = None
+        elif candidate is None:
+            candidate = match_id
+    if not candidate:
+        return
+    
+    match = Match.query.filter_by(match_id=candidate).first()
+    if not match:
+        return
+    same_account = user.match_sync_puuid == user.puuid
+    if same_account and user.match_sync_time and match.game_creation <= user.match_sync_time:
+        return
+    user.match_sync_puuid = user.puuid
+    user.match_sync_time = match.game_creation
+    user.match_sync_id = candidate
+
+def fetch_match_history(user_id, on_match=None, save_stats=True, on_progress=None):
+    """
+    获取用户最近30场对局的历史并分析游戏模式分布
+    on_match: 可选回调 (match_id, match)，match 为共享的 Match 记录。
+    提供时本用户已有记录的对局也会交给回调；任何用户已经导入过的对局都不会再下载
+    save_stats: 为False时不写入 GameModeStats（由调用方从累计数据推导）
+    on_progress: 可选回调 (event)，每处理完一场对局调用一次，
+    event 包含 match_id、processed、failed、total 和当前的 mode_counts
+    """
     # 获取用户信息
     user = User.query.get(user_id)
     if not user or not user.puuid:
@@ -113,19 +249,28 @@ def fetch_match_history(user_id):
     routing_value = get_routing_value(user.region)
     print(f"用户 {user.username} (ID: {user_id}) 开始获取最近30场对局，区域: {user.region}, 路由: {routing_value}")
     
-    # 获取最近30场对局IDs
-    match_list_url = f"https://{routing_value}.api.riotgames.com/lol/match/v5/matches/by-puuid/{user.puuid}/ids?start=0&count=30"
-    headers = {"X-Riot-Token": api_key}
-    
+    # 只获取同步水位之后的新对局ID，较早的对局从数据库中的记录补齐到30场
     try:
-        response = requests.get(match_list_url, headers=headers)
-        response.raise_for_status()
-        match_ids = response.json()
-        print(f"成功获取 {len(match_ids)} 场对局ID: {match_ids[:3]}... (仅显示前3个)")
+        new_ids = fetch_new_match_ids(user, routing_value, api_key)
+        print(f"成功获取 {len(new_ids)} 场新对局ID: {new_ids[:3]}... (仅显示前3个)")
+        # 有新对局时段位和缓存的对局列表可能已经变化
+        if new_ids:
+            invalidate_player(user.puuid)
+    except CircuitOpenError as e:
+        # 区域主机熔断中：不等待，直接用数据库中已有的对局分析
+        print(f"跳过新对局同步: {str(e)}")
+        new_ids = []
     except requests.exceptions.RequestException as e:
+        invalidate_on_unauthorized(e, api_key)
         print(f"获取对局ID列表失败: {str(e)}")
         return {"status": "error", "message": f"获取对局ID列表失败: {str(e)}"}
     
+    from routes.aggregates import recent_match_ids
+    match_ids = list(new_ids)
+    if len(match_ids) < MATCH_HISTORY_SIZE:
+        known_ids = [match_id for match_id in recent_match_ids(user_id, MATCH_HISTORY_SIZE) if match_id not in new_ids]
+        match_ids.extend(known_ids[:MATCH_HISTORY_SIZE - len(match_ids)])
+    
     # 初始化游戏模式计数
     mode_counts = {
         'SR_5v5': 0,
@@ -141,10 +286,32 @@ def fetch_match_history(user_id):
     success_count = 0
     db_count = 0
     api_count = 0
+    progress = {"processed": 0, "failed": 0}
+    
+    def report_progress(match_id, failed=False):
+        progress["failed" if failed else "processed"] += 1
+        if on_progress:
+            on_progress({
+                "match_id": match_id,
+                "processed": progress["processed"],
+                "failed": progress["failed"],
+                "total": len(match_ids),
+                "mode_counts": dict(mode_counts)
+            })
     
+    # 先用一次IN查询读取本用户已有的对局记录
+    existing_records = {
+        record.match_id: record
+        for record in MatchRecord.query.filter(
+            MatchRecord.user_id == user_id,
+            MatchRecord.match_id.in_(match_ids)
+        ).all()
+    } if match_ids else {}
+    
+    missing_ids = []
+    new_records = []
     for index, match_id in enumerate(match_ids):
-        # 检查数据库中是否已存在此对局记录
-        existing_match = MatchRecord.query.filter_by(match_id=match_id, user_id=user_id).first()
+        existing_match = existing_records.get(match_id)
         
         if existing_match:
             # 如果已存在，直接使用数据库中的信息
@@ -160,60 +327,76 @@ def fetch_match_history(user_id):
             db_count += 1
             success_count += 1
             print(f"[{index+1}/30] 对局 {match_id} 已从数据库获取")
+            if not on_match:
+                report_progress(match_id)
         else:
-            # 获取对局详情
-            match_detail_url = f"https://{routing_value}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-            
-            try:
-                print(f"[{index+1}/30] 正在从Riot API获取对局 {match_id} 详情...")
-                match_response = requests.get(match_detail_url, headers=headers)
-                match_response.raise_for_status()
-                match_data = match_response.json()
-                
-                # 提取游戏模式信息
-                queue_id = match_data.get('info', {}).get('queueId', 0)
-                game_mode = GAME_MODE_MAPPING.get(queue_id, "Unknown")
-                category = QUEUE_TO_CATEGORY.get(queue_id, "Unknown")
-                game_creation = match_data.get('info', {}).get('gameCreation', 0)
-                game_date = datetime.fromtimestamp(game_creation / 1000)
-                
-                # 增加计数
-                mode_counts[category] += 1
-                
-                # 存储对局信息到数据库
-                new_match = MatchRecord(
-                    match_id=match_id,
-                    user_id=user_id,
-                    queue_id=queue_id,
-                    game_mode=game_mode,
-                    game_category=category,
-                    game_date=game_date
-                )
-                db.session.add(new_match)
-                
-                processed_matches.append({
-                    "match_id": match_id,
-                    "queue_id": queue_id,
-                    "game_mode": game_mode,
-                    "category": category,
-                    "date": game_date.strftime("%Y-%m-%d %H:%M:%S")
-                })
-                
-                api_count += 1
-                success_count += 1
-                print(f"[{index+1}/30] 对局 {match_id} 已成功从API获取并创建记录，游戏模式: {game_mode}")
-                
-                # 避免API速率限制
-                time.sleep(1.2)  # Riot API 限制是每分钟 100 请求，保守估计
-                
-            except requests.exceptions.RequestException as e:
-                # 记录错误但继续处理其他对局
-                print(f"[{index+1}/30] 获取对局 {match_id} 详情失败: {str(e)}")
-                continue
-    
-    # 提交所有数据库更改
-    db.session.commit()
-    print(f"已提交所有数据库更改，成功处理 {success_count}/30 场对局（{db_count}场从数据库获取，{api_count}场从API获取）")
+            missing_ids.append(match_id)
+    
+    # 需要详细统计时所有对局都要交给回调，否则只处理本用户缺失的
+    needed_ids = match_ids if on_match else missing_ids
+    
+    # 共享对局表中已有的直接使用，其余的并发下载并导入，按完成顺序处理
+    for match_id, match, error in iter_shared_matches(needed_ids, routing_value, api_key):
+        index = match_ids.index(match_id)
+        if error:
+            # 记录错误但继续处理其他对局（401时 iter_match_details 已使API密钥失效）
+            print(f"[{index+1}/30] 获取对局 {match_id} 详情失败: {str(error)}")
+            report_progress(match_id, failed=True)
+            continue
+        
+        if on_match:
+            on_match(match_id, match)
+        
+        # 数据库中已有记录的对局已经计入模式统计
+        if match_id not in missing_ids:
+            report_progress(match_id)
+            continue
+        
+        # 游戏模式信息在导入时已经分类
+        queue_id = match.queue_id
+        game_mode = match.game_mode
+        category = match.game_category
+        game_date = match.game_date
+        
+        # 增加计数
+        mode_counts[category] += 1
+        
+        # 新记录最后一次性批量写入
+        new_records.append({
+            "match_id": match_id,
+            "user_id": user_id,
+            "queue_id": queue_id,
+            "game_mode": game_mode,
+            "game_category": category,
+            "game_date": game_date
+        })
+        
+        processed_matches.append({
+            "match_id": match_id,
+            "queue_id": queue_id,
+            "game_mode": game_mode,
+            "category": category,
+            "date": game_date.strftime("%Y-%m-%d %H:%M:%S")
+        })
+        
+        api_count += 1
+        success_count += 1
+        print(f"[{index+1}/30] 对局 {match_id} 已成功获取并创建记录，游戏模式: {game_mode}")
+        report_progress(match_id)
+    
+    # 并发获取的结果按完成顺序到达，恢复为对局列表的顺序
+    processed_matches.sort(key=lambda m: match_ids.index(m["match_id"]))
+    
+    advance_sync_watermark(user, match_ids, {m["match_id"] for m in processed_matches})
+    
+    # 批量写入新记录；并发刷新已经写入的记录由唯一约束忽略
+    insert_or_ignore(MatchRecord, new_records, ['user_id', 'match_id'])
+    
+    # 新对局记录和同步水位只写入会话，与分析结果一起提交并更新数据版本
+    # （save_stats 时由 save_game_mode_stats 提交，否则由调用方提交，见 app.run_analysis）；
+    # 分析失败时一起回滚，水位不会越过没有计入分析的对局
+    db.session.flush()
+    print(f"成功处理 {success_count}/30 场对局（{db_count}场从数据库获取，{api_count}场从API获取）")
     
     # 计算百分比
     total_matches = len(processed_matches)
@@ -225,7 +408,24 @@ def fetch_match_history(user_id):
             percentage = 0
         mode_percentages[mode] = percentage
     
-    # 更新或创建用户的游戏模式统计
+    if save_stats:
+        save_game_mode_stats(user_id, mode_percentages, total_matches)
+    
+    return {
+        "status": "success",
+        "data": {
+            "mode_counts": mode_counts,
+            "mode_percentages": mode_percentages,
+            "total_matches": total_matches,
+            "matches": processed_matches
+        }
+    }
+
+def save_game_mode_stats(user_id, mode_percentages, total_matches, commit=True):
+    """
+    更新或创建用户的游戏模式统计
+    commit为False时只写入会话，由调用方与详细分析一起提交并更新数据版本（见 app.run_analysis）
+    """
     stats = GameModeStats.query.filter_by(user_id=user_id).first()
     if not stats:
         stats = GameModeStats(user_id=user_id)
@@ -241,224 +441,61 @@ def fetch_match_history(user_id):
     stats.custom_percentage = mode_percentages['Custom']
     stats.unknown_percentage = mode_percentages['Unknown']
     stats.total_matches = total_matches
-    stats.last_updated = datetime.now()
+    stats.last_updated = datetime.utcnow()
     
     db.session.add(stats)
-    db.session.commit()
+    if commit:
+        # 旧的分析文档已过时，下次读取时重新生成
+        from routes.analysis_documents import discard_analysis_document
+        discard_analysis_document(user_id)
+        db.session.commit()
+        data_versions.configure(current_app)
+        data_versions.bump(analysis_scope(user_id))
     print(f"已更新游戏模式统计：常规5v5 {mode_percentages['SR_5v5']}%, ARAM {mode_percentages['ARAM']}%, 娱乐模式 {mode_percentages['Fun_Modes']}%")
-    
-    return {
-        "status": "success",
-        "data": {
-            "mode_counts": mode_counts,
-            "mode_percentages": mode_percentages,
-            "total_matches": total_matches,
-            "matches": processed_matches
-        }
-    }
 
-def analyze_game_modes(user_id):
-    """分析用户最近30场对局的游戏模式分布和详细统计数据"""
-    print(f"开始为用户 {user_id} 分析游戏模式和详细统计...")
-    # 基本的游戏模式分析
-    result = fetch_match_history(user_id)
+def analyze_game_modes(user_id, on_progress=None):
+    """
+    分析用户最近30场对局的游戏模式分布和详细统计数据
+    详细统计和模式分布由累计数据推导：只有新进入或离开窗口的对局需要计算（见 routes/aggregates.py）
+    累计数据和游戏模式统计只写入会话不提交，调用方与详细分析一起提交
+    on_progress: 可选的进度回调，见 fetch_match_history
+    """
+    from routes.aggregates import update_analysis_totals, derive_analysis, derive_mode_stats
     
-    if result["status"] == "error":
-        print(f"分析失败，错误信息: {result['message']}")
-        return result
+    print(f"开始为用户 {user_id} 分析游戏模式和详细统计...")
     
     # 获取用户PUUID用于识别用户在对局中的数据
     user = User.query.get(user_id)
     if not user or not user.puuid:
-        print(f"无法获取用户 {user_id} 的PUUID")
-        return {"status": "error", "message": "无法获取用户PUUID"}
+        print(f"用户ID {user_id} 未找到或未设置PUUID")
+        return {"status": "error", "message": "用户未找到或未设置PUUID"}
     
     user_puuid = user.puuid
     print(f"获取到用户 {user.username} 的PUUID: {user_puuid[:8]}...")
     
-    # 获取API密钥
-    api_key = get_api_key()
-    if not api_key:
-        print("无法获取API密钥，终止详细分析")
-        return {"status": "error", "message": "无法获取API密钥"}
-    
-    # 获取路由值
-    routing_value = get_routing_value(user.region)
-    print(f"使用区域路由: {routing_value}")
-    
-    # 分析结果初始化
-    analysis_result = {
-        "favorite_champions": {},  # 最喜欢的英雄
-        "favorite_positions": {},  # 最喜欢的位置
-        "enemy_champions": {},     # 敌方出现最多的英雄
-        "ally_champions": {},      # 我方出现最多的英雄
-        "multikill_stats": {       # 多杀统计
-            "total": 0,
-            "average": 0,
-            "doubles": 0,
-            "triples": 0,
-            "quadras": 0,
-            "pentas": 0
-        },
-        "fun_stats": {             # 趣味数据
-            "total_gold_earned": 0,
-            "total_kills": 0,
-            "total_damage_taken": 0,
-            "total_items_purchased": 0,
-            "total_deaths": 0,
-            "total_assists": 0,
-            "total_vision_score": 0,
-            "total_time_played": 0,
-            "total_damage_dealt_to_champions": 0
-        }
-    }
-    
-    # 获取对局ID列表
-    processed_matches = result["data"]["matches"]
-    print(f"准备分析 {len(processed_matches)} 场比赛的详细数据...")
-    
-    # 计数变量
-    match_count = 0
-    sr_match_count = 0  # 召唤师峡谷对局计数(5v5)
-    
-    # 遍历每个对局进行详细分析
-    for match_data in processed_matches:
-        match_id = match_data["match_id"]
-        
-        # 获取对局详情（如果不是从API直接获取的）
-        try:
-            # 需要从API获取完整对局详情
-            match_detail_url = f"https://{routing_value}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-            headers = {"X-Riot-Token": api_key}
-            
-            print(f"正在获取对局 {match_id} 的详细信息以进行分析...")
-            match_response = requests.get(match_detail_url, headers=headers)
-            match_response.raise_for_status()
-            match_detail_data = match_response.json()
-            
-            # 找到用户在这场对局中的数据
-            user_data = None
-            team_id = None
-            for participant in match_detail_data.get('info', {}).get('participants', []):
-                if participant.get('puuid') == user_puuid:
-                    user_data = participant
-                    team_id = participant.get('teamId')
-                    break
-            
-            if not user_data:
-                print(f"未找到用户在对局 {match_id} 中的数据，跳过")
-                continue
-            
-            # 增加计数
-            match_count += 1
-            
-            # 1. 收集最喜欢的英雄数据
-            champion_name = user_data.get('championName', 'Unknown')
-            analysis_result["favorite_champions"][champion_name] = analysis_result["favorite_champions"].get(champion_name, 0) + 1
-            print(f"添加英雄数据: {champion_name}")
-            
-            # 2. 收集最喜欢的位置数据
-            position = user_data.get('individualPosition', '')
-            if position and position != 'Invalid':
-                analysis_result["favorite_positions"][position] = analysis_result["favorite_positions"].get(position, 0) + 1
-                print(f"添加位置数据: {position}")
-            
-            # 3. 收集多杀统计
-            doubles = user_data.get('doubleKills', 0)
-            triples = user_data.get('tripleKills', 0)
-            quadras = user_data.get('quadraKills', 0)
-            pentas = user_data.get('pentaKills', 0)
-            
-            analysis_result["multikill_stats"]["doubles"] += doubles
-            analysis_result["multikill_stats"]["triples"] += triples 
-            analysis_result["multikill_stats"]["quadras"] += quadras
-            analysis_result["multikill_stats"]["pentas"] += pentas
-            
-            multikills_this_match = doubles + triples + quadras + pentas
-            analysis_result["multikill_stats"]["total"] += multikills_this_match
-            print(f"添加多杀数据: 双杀 {doubles}, 三杀 {triples}, 四杀 {quadras}, 五杀 {pentas}")
-            
-            # 4. 收集趣味数据
-            gold_earned = user_data.get('goldEarned', 0)
-            kills = user_data.get('kills', 0)
-            deaths = user_data.get('deaths', 0)
-            assists = user_data.get('assists', 0)
-            damage_taken = user_data.get('totalDamageTaken', 0)
-            items_purchased = user_data.get('itemsPurchased', 0)
-            vision_score = user_data.get('visionScore', 0)  
-            damage_dealt = user_data.get('totalDamageDealtToChampions', 0)  
-            time_played = match_detail_data.get('info', {}).get('gameDuration', 0)  
-
-            print(f"收集数据: 视野得分 {vision_score}, gameDuration {time_played}, damage {damage_dealt}")
-            print(f"收集数据: 承受伤害 {damage_taken}, 购买装备数 {items_purchased}")
-
-            # 确保所有数值都为整数类型
-            analysis_result["fun_stats"]["total_gold_earned"] += int(gold_earned)
-            analysis_result["fun_stats"]["total_kills"] += int(kills)
-            analysis_result["fun_stats"]["total_deaths"] += int(deaths)
-            analysis_result["fun_stats"]["total_assists"] += int(assists)
-            analysis_result["fun_stats"]["total_damage_taken"] += int(damage_taken)
-            analysis_result["fun_stats"]["total_items_purchased"] += int(items_purchased)
-            analysis_result["fun_stats"]["total_vision_score"] += int(vision_score)  
-            analysis_result["fun_stats"]["total_time_played"] += int(time_played)  
-            analysis_result["fun_stats"]["total_damage_dealt_to_champions"] += int(damage_dealt)  #
-
-            print(f"Adding fun stats: gold {gold_earned}, KDA {kills}/{deaths}/{assists}")
-            
-
-            queue_id = match_detail_data.get('info', {}).get('queueId', 0)
-            if queue_id in MODE_CATEGORIES['SR_5v5'] or queue_id in MODE_CATEGORIES['ARAM']:  # 
-                if queue_id in MODE_CATEGORIES['SR_5v5']:
-                    sr_match_count += 1  
-
-
-                for participant in match_detail_data.get('info', {}).get('participants', []):
-                    participant_team_id = participant.get('teamId')
-                    participant_champion = participant.get('championName', 'Unknown')
-
-
-                    if participant.get('puuid') != user_puuid:
-                        if participant_team_id == team_id:  # 队友
-                            analysis_result["ally_champions"][participant_champion] = analysis_result["ally_champions"].get(participant_champion, 0) + 1
-                        else:  
-                            analysis_result["enemy_champions"][participant_champion] = analysis_result["enemy_champions"].get(participant_champion, 0) + 1
-            
-
-            time.sleep(1.2)
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Get match {match_id} failed: {str(e)}")
-            continue
-    
-
-    if match_count > 0:
-        analysis_result["multikill_stats"]["average"] = round(analysis_result["multikill_stats"]["total"] / match_count, 2)
-    
-    print(f"整理分析数据，处理了 {match_count} 场比赛...")
-    
-
-    analysis_result["favorite_champions"] = dict(sorted(analysis_result["favorite_champions"].items(), key=lambda x: x[1], reverse=True))
-    analysis_result["favorite_positions"] = dict(sorted(analysis_result["favorite_positions"].items(), key=lambda x: x[1], reverse=True))
+    # 获取对局历史，并确保每场对局都已导入共享对局表
+    analyzed_ids = []
+    result = fetch_match_history(user_id, on_match=lambda match_id, match: analyzed_ids.append(match_id),
+                                 save_stats=False, on_progress=on_progress)
     
-    if sr_match_count > 0:
-        analysis_result["enemy_champions"] = dict(sorted(analysis_result["enemy_champions"].items(), key=lambda x: x[1], reverse=True))
-        analysis_result["ally_champions"] = dict(sorted(analysis_result["ally_champions"].items(), key=lambda x: x[1], reverse=True))
+    if result["status"] == "error":
+        print(f"分析失败，错误信息: {result['message']}")
+        return result
     
-
-    if match_count > 0:
-        analysis_result["fun_stats"]["avg_gold_per_match"] = round(analysis_result["fun_stats"]["total_gold_earned"] / match_count)
-        analysis_result["fun_stats"]["avg_kills_per_match"] = round(analysis_result["fun_stats"]["total_kills"] / match_count, 1)
-        analysis_result["fun_stats"]["avg_deaths_per_match"] = round(analysis_result["fun_stats"]["total_deaths"] / match_count, 1)
-        analysis_result["fun_stats"]["avg_assists_per_match"] = round(analysis_result["fun_stats"]["total_assists"] / match_count, 1)
-        analysis_result["fun_stats"]["avg_kda"] = round((analysis_result["fun_stats"]["total_kills"] + analysis_result["fun_stats"]["total_assists"]) / 
-                                                      max(analysis_result["fun_stats"]["total_deaths"], 1), 2)
-        analysis_result["fun_stats"]["avg_vision_score"] = round(analysis_result["fun_stats"]["total_vision_score"] / match_count, 1)
-        analysis_result["fun_stats"]["avg_damage_per_match"] = round(analysis_result["fun_stats"]["total_damage_dealt_to_champions"] / match_count)
+    # 增量更新累计数据，再推导详细分析和游戏模式统计
+    totals = update_analysis_totals(user, analyzed_ids)
+    mode_counts, mode_percentages, total_matches = derive_mode_stats(totals)
+    save_game_mode_stats(user_id, mode_percentages, total_matches, commit=False)
     
-
-    result["data"]["detailed_analysis"] = analysis_result
+    analysis_result = derive_analysis(totals)
+    result["data"].update({
+        "mode_counts": mode_counts,
+        "mode_percentages": mode_percentages,
+        "total_matches": total_matches,
+        "detailed_analysis": analysis_result
+    })
     
-    print(f"Done，Analyzed {match_count} matches")
+    print(f"Done，Analyzed {len(analyzed_ids)} matches")
     print(f"result: {analysis_result}")
     
-    return result
\ No newline at end of file
+    return result
@@ -0,0 +1,187 @@
+# routes/analysis_documents.py
+from datetime import datetime
+
+from models import db, User, GameModeStats, DetailedAnalysis, AnalysisDocument
+from routes.aggregates import aggregate_analysis, recent_match_ids
+from routes.friends import favorite_game_mode
+from routes.versioned_cache import dumps
+
+# 文档结构版本：序列化格式变化时加1，旧版本的文档在下次读取时重新生成
+ANALYSIS_DOCUMENT_SCHEMA_VERSION = 1
+
+
+def detailed_analysis_dict(detailed):
+    """DetailedAnalysis -> 接口返回的详细分析结构（唯一的转换实现）"""
+    data = {
+        "favorite_champions": detailed.favorite_champions,
+        "favorite_positions": detailed.favorite_positions,
+        "multikill_stats": {
+            "doubles": detailed.double_kills,
+            "triples": detailed.triple_kills,
+            "quadras": detailed.quadra_kills,
+            "pentas": detailed.penta_kills,
+            "total": detailed.total_multikills,
+            "average": detailed.avg_multikills_per_match
+        },
+        "fun_stats": {
+            "total_gold_earned": detailed.total_gold_earned,
+            "avg_gold_per_match": detailed.avg_gold_per_match,
+            "total_kills": detailed.total_kills,
+            "total_deaths": detailed.total_deaths,
+            "total_assists": detailed.total_assists,
+            "avg_kills_per_match": detailed.avg_kills_per_match,
+            "avg_deaths_per_match": detailed.avg_deaths_per_match,
+            "avg_assists_per_match": detailed.avg_assists_per_match,
+            "avg_kda": detailed.avg_kda,
+            "total_vision_score": detailed.total_vision_score,
+            "avg_vision_score": detailed.avg_vision_score,
+            "total_damage_dealt_to_champions": detailed.total_damage_dealt,
+            "avg_damage_per_match": detailed.avg_damage_per_match,
+            "total_damage_taken": detailed.total_damage_taken,
+            "total_items_purchased": detailed.total_items_purchased
+        }
+    }
+
+    # 如果有敌方和己方英雄数据，也添加进去
+    if detailed.enemy_champions:
+        data["enemy_champions"] = detailed.enemy_champions
+    if detailed.ally_champions:
+        data["ally_champions"] = detailed.ally_champions
+    return data
+
+
+def build_simplified_analysis(user_id, matches):
+    """
+    基于数据库中已有的比赛记录构建简化版的分析数据
+    这个函数不会调用Riot API，仅使用已保存的数据（没有详细分析时用SQL聚合对局参与者数据）
+    """
+    # 尝试查找是否有详细分析数据
+    detailed = DetailedAnalysis.query.filter_by(user_id=user_id).first()
+    if detailed:
+        return detailed_analysis_dict(detailed)
+
+    # 如果数据库中没有详细分析，用已保存的对局参与者数据直接聚合（不调用Riot API）
+    user = User.query.get(user_id)
+    if user and user.puuid:
+        match_ids = [match.match_id for match in matches] if matches else recent_match_ids(user_id)
+        aggregated = aggregate_analysis(user.puuid, match_ids)
+        if aggregated:
+            return aggregated
+
+    # 没有任何已保存的对局数据时，返回示例数据
+    if not matches:
+        popular_champions = {"未知英雄": 0}
+        positions = {"未知位置": 0}
+    else:
+        # 只有对局记录，无法获取详细的游戏数据
+        popular_champions = {"未知英雄": len(matches)}
+        positions = {"未知位置": len(matches)}
+
+    return {
+        "favorite_champions": popular_champions,
+        "favorite_positions": positions,
+        "multikill_stats": {
+            "doubles": 0,
+            "triples": 0,
+            "quadras": 0,
+            "pentas": 0,
+            "total": 0,
+            "average": 0
+        },
+        "fun_stats": {
+            "total_gold_earned": 0,
+            "avg_gold_per_match": 0,
+            "total_kills": 0,
+            "total_deaths": 0,
+            "total_assists": 0,
+            "avg_kills_per_match": 0,
+            "avg_deaths_per_match": 0,
+            "avg_assists_per_match": 0,
+            "avg_kda": 0,
+            "total_vision_score": 0,
+            "avg_vision_score": 0,
+            "total_damage_dealt_to_champions": 0,
+            "avg_damage_per_match": 0
+        }
+    }
+
+
+def friend_summary_dict(username, detailed, stats):
+    """好友摘要：最常用的3个英雄、多杀总数和最常玩的模式"""
+    sorted_champions = sorted((detailed.favorite_champions or {}).items(), key=lambda item: item[1], reverse=True)
+    return {
+        "username": username,
+        "favorite_champions": [champ[0] for champ in sorted_champions[:3]],
+        "total_multikills": (
+            (detailed.double_kills or 0) +
+            (detailed.triple_kills or 0) +
+            (detailed.quadra_kills or 0) +
+            (detailed.penta_kills or 0)
+        ),
+        "favorite_game_mode": favorite_game_mode(stats)
+    }
+
+
+def materialize_analysis(user_id, commit=True):
+    """
+    从 GameModeStats / DetailedAnalysis 生成并保存用户的分析文档，返回 AnalysisDocument
+    还没有游戏模式统计时返回None
+    """
+    stats = GameModeStats.query.filter_by(user_id=user_id).first()
+    if not stats:
+        return None
+    detailed = DetailedAnalysis.query.filter_by(user_id=user_id).first()
+
+    stats_data = {
+        "sr_5v5_percentage": stats.sr_5v5_percentage,
+        "aram_percentage": stats.aram_percentage,
+        "fun_modes_percentage": stats.fun_modes_percentage,
+        "bot_games_percentage": stats.bot_games_percentage,
+        "custom_percentage": stats.custom_percentage,
+        "unknown_percentage": stats.unknown_percentage,
+        "total_matches": stats.total_matches,
+        "last_updated": stats.last_updated.strftime("%Y-%m-%d %H:%M:%S"),
+        "detailed_analysis": detailed_analysis_dict(detailed) if detailed else build_simplified_analysis(user_id, [])
+    }
+    summary = None
+    if detailed:
+        username = db.session.query(User.username).filter(User.id == user_id).scalar()
+        summary = friend_summary_dict(username, detailed, stats)
+
+    document = AnalysisDocument.query.filter_by(user_id=user_id).first()
+    if not document:
+        document = AnalysisDocument(user_id=user_id)
+        db.session.add(document)
+    document.schema_version = ANALYSIS_DOCUMENT_SCHEMA_VERSION
+    document.stats_json = dumps(stats_data)
+    document.summary_json = dumps(summary) if summary is not None else None
+    document.stats_updated = stats.last_updated
+    document.last_updated = datetime.utcnow()
+    if commit:
+        db.session.commit()
+    return document
+
+
+def discard_analysis_document(user_id):
+    """分析数据变化但还不能生成完整文档时删除旧文档，下次读取时重新生成（调用方负责提交）"""
+    AnalysisDocument.query.filter_by(user_id=user_id).delete()
+
+
+def load_analysis_document(user_id):
+    """
+    读取用户的分析文档，返回 (stats_json, summary_json, stats_updated)
+    只查询这几列，不加载ORM对象；没有文档或结构版本过旧时先重新生成。没有统计数据时返回None
+    """
+    row = db.session.query(
+        AnalysisDocument.schema_version,
+        AnalysisDocument.stats_json,
+        AnalysisDocument.summary_json,
+        AnalysisDocument.stats_updated
+    ).filter(AnalysisDocument.user_id == user_id).first()
+
+    if row is None or row.schema_version != ANALYSIS_DOCUMENT_SCHEMA_VERSION:
+        document = materialize_analysis(user_id)
+        if document is None:
+            return None
+        return document.stats_json, document.summary_json, document.stats_updated
+    return row.stats_json, row.summary_json, row.stats_updated
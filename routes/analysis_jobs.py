@@ -0,0 +1,402 @@
+# routes/analysis_jobs.py
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from routes.riot_api import count_requests
+from routes.aggregates import mode_percentages
+from routes.local_store import local_store
+
+logger = logging.getLogger(__name__)
+
+# 同时执行的分析任务数，以及结束的任务保留多久（秒）供前端查询
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_JOB_TTL = 600
+# 事件流没有新事件时发送心跳的间隔（秒），避免代理断开空闲连接
+DEFAULT_HEARTBEAT = 15
+# 用户分析锁的租约时长（秒）：排队和执行中的任务由后台线程定期续期，进程崩溃后租约自然过期
+DEFAULT_LEASE_TTL = 120
+# 每个租约时长内续期的次数
+LEASE_RENEWALS_PER_TTL = 3
+# 读取其他进程任务的共享状态的间隔（秒）
+REMOTE_POLL_INTERVAL = 0.5
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_ERROR = "error"
+
+# 跨进程共享的用户分析锁和任务状态快照（保存在本地存储中）
+ANALYSIS_JOB_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS analysis_leases (
+        user_id INTEGER PRIMARY KEY,
+        job_id TEXT NOT NULL,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS analysis_job_status (
+        job_id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        snapshot TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+)
+
+
+class AnalysisJob:
+    """一次后台分析任务的状态"""
+
+    def __init__(self, user_id, publish=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.state = JOB_QUEUED
+        self.processed = 0
+        self.failed = 0
+        self.total = None
+        self.message = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self._requests = None
+        self._publish = publish
+        self._changed = threading.Condition(threading.RLock())
+
+    @property
+    def finished(self):
+        return self.state in (JOB_SUCCESS, JOB_ERROR)
+
+    @property
+    def api_calls(self):
+        return self._requests.count if self._requests else 0
+
+    def eta_seconds(self):
+        """按已处理对局的平均耗时估计剩余时间；还没有进度时返回None"""
+        if self.state != JOB_RUNNING or not self.total:
+            return None
+        done = self.processed + self.failed
+        if not done:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / done * (self.total - done), 1)
+
+    def update(self, event):
+        """进度回调：更新计数，并记录带部分统计结果的进度事件"""
+        self.processed = event["processed"]
+        self.failed = event["failed"]
+        self.total = event["total"]
+        data = {
+            "match_id": event.get("match_id"),
+            "processed": self.processed,
+            "failed": self.failed,
+            "total": self.total,
+            "api_calls": self.api_calls,
+            "eta_seconds": self.eta_seconds()
+        }
+        if "mode_counts" in event:
+            data["mode_counts"] = event["mode_counts"]
+            data["mode_percentages"] = mode_percentages(event["mode_counts"])
+        self._emit("progress", data)
+
+    def finish(self, state):
+        # 状态和结束事件一起更新，事件流不会在收到结束事件前就停止；
+        # 先记录结束时间再改状态，清理过期任务时不会看到没有结束时间的已完成任务
+        with self._changed:
+            self.finished_at = time.time()
+            self.state = state
+            self._emit("done" if state == JOB_SUCCESS else "error", self.to_dict(include_result=True))
+
+    def _emit(self, name, data):
+        with self._changed:
+            self.events.append((name, data))
+            self._changed.notify_all()
+        if self._publish:
+            self._publish(self)
+
+    def iter_events(self, start=0, heartbeat=DEFAULT_HEARTBEAT):
+        """
+        从第 start 个事件开始依次产出 (index, name, data)，任务结束后停止
+        没有新事件时每 heartbeat 秒产出一次 (None, None, None) 作为心跳
+        只读取内存中的任务状态，不访问数据库
+        """
+        index = start
+        while True:
+            with self._changed:
+                if index >= len(self.events) and not self.finished:
+                    self._changed.wait(heartbeat)
+                pending = self.events[index:]
+                finished = self.finished
+            if not pending and not finished:
+                yield None, None, None
+            for name, data in pending:
+                yield index, name, data
+                index += 1
+            if finished and index >= len(self.events):
+                return
+
+    def snapshot(self):
+        """写入共享存储的状态：当前状态和最后一个事件"""
+        with self._changed:
+            return {
+                "user_id": self.user_id,
+                "status": self.to_dict(include_result=True),
+                "event_index": len(self.events) - 1,
+                "event": self.events[-1] if self.events else None
+            }
+
+    def to_dict(self, include_result=False):
+        data = {
+            "job_id": self.id,
+            "state": self.state,
+            "processed": self.processed,
+            "failed": self.failed,
+            "total": self.total,
+            "api_calls": self.api_calls,
+            "eta_seconds": self.eta_seconds(),
+            "message": self.message
+        }
+        if include_result and self.finished:
+            data["result"] = self.result
+        return data
+
+
+class RemoteAnalysisJob:
+    """
+    由其他worker进程执行的任务，从共享存储中的状态快照读取
+    提供与 AnalysisJob 相同的查询接口
+    """
+
+    def __init__(self, queue, job_id, snapshot):
+        self._queue = queue
+        self.id = job_id
+        self.user_id = snapshot["user_id"]
+        self._snapshot = snapshot
+
+    @property
+    def finished(self):
+        return self._snapshot["status"]["state"] in (JOB_SUCCESS, JOB_ERROR)
+
+    def to_dict(self, include_result=False):
+        data = dict(self._snapshot["status"])
+        if not include_result:
+            data.pop("result", None)
+        return data
+
+    def iter_events(self, start=0, heartbeat=DEFAULT_HEARTBEAT):
+        """轮询共享状态并产出新事件；两次读取之间的进度事件只保留最新的一个"""
+        index = start
+        idle_since = time.time()
+        while True:
+            self._snapshot = self._queue.load_snapshot(self.id) or self._snapshot
+            event_index = self._snapshot["event_index"]
+            if self._snapshot["event"] and event_index >= index:
+                name, data = self._snapshot["event"]
+                yield event_index, name, data
+                index = event_index + 1
+                idle_since = time.time()
+            if self.finished and index > event_index:
+                return
+            if time.time() - idle_since >= heartbeat:
+                yield None, None, None
+                idle_since = time.time()
+            time.sleep(REMOTE_POLL_INTERVAL)
+
+
+class AnalysisJobQueue:
+    """
+    后台分析任务队列
+    POST请求只负责入队并立即返回任务ID，线程池以有限并发执行分析，
+    前端轮询任务状态（已处理对局数、API请求数、预计剩余时间）。
+
+    每个用户同一时刻只有一个分析在执行（single-flight）：同一进程内看内存中的任务表，
+    跨worker进程看本地存储中的租约锁。已有分析在执行时，新的请求附加到那个任务，
+    得到同一个任务ID和结果。任务状态快照也写入本地存储，任何进程都能查询
+    """
+
+    def __init__(self, store=local_store, max_workers=DEFAULT_MAX_WORKERS, job_ttl=DEFAULT_JOB_TTL,
+                 lease_ttl=DEFAULT_LEASE_TTL):
+        self.store = store
+        self.store.register_schema(*ANALYSIS_JOB_SCHEMA)
+        self.max_workers = max_workers
+        self.job_ttl = job_ttl
+        self.lease_ttl = lease_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._app = None
+        self._jobs = {}
+        self._pool = None
+        self._renewer = None
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self._app = app
+        self.store.configure(app)
+        self.max_workers = app.config.get('ANALYSIS_MAX_WORKERS', self.max_workers)
+        self.job_ttl = app.config.get('ANALYSIS_JOB_TTL', self.job_ttl)
+        self.lease_ttl = app.config.get('ANALYSIS_LEASE_TTL', self.lease_ttl)
+
+    def submit(self, user_id, target):
+        """
+        为用户入队一次分析，返回任务（AnalysisJob，或其他进程正在执行时的 RemoteAnalysisJob）
+        target(user_id, on_progress) 在工作线程的应用上下文中执行，返回分析结果dict
+        """
+        with self._lock:
+            self._prune()
+            for job in self._jobs.values():
+                if job.user_id == user_id and not job.finished:
+                    return job
+
+            job = AnalysisJob(user_id, publish=self._publish)
+            holder = self._acquire_lease(job)
+            if holder:
+                holder_id, snapshot = holder
+                logger.info("用户 %s 的分析已在其他进程执行，附加到任务 %s", user_id, holder_id)
+                return RemoteAnalysisJob(self, holder_id, snapshot)
+
+            self._jobs[job.id] = job
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis-job")
+            if self._renewer is None:
+                # 任务可能排队等待空闲线程或等待Riot请求很久都没有进度事件，租约由单独的线程续期
+                self._renewer = threading.Thread(target=self._renew_leases_forever, name="analysis-lease", daemon=True)
+                self._renewer.start()
+            self._pool.submit(self._run, self._app, job, target)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return job
+        snapshot = self.load_snapshot(job_id)
+        return RemoteAnalysisJob(self, job_id, snapshot) if snapshot else None
+
+    def _run(self, app, job, target):
+        job.state = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            with app.app_context(), count_requests() as counter:
+                job._requests = counter
+                result = target(job.user_id, job.update)
+            job.result = result
+            job.message = result.get("message")
+            state = JOB_SUCCESS if result.get("status") == "success" else JOB_ERROR
+        except Exception as e:
+            logger.exception("用户 %s 的分析任务 %s 失败", job.user_id, job.id)
+            job.message = str(e)
+            state = JOB_ERROR
+        job.finish(state)
+        self._release_lease(job)
+
+    def _acquire_lease(self, job):
+        """
+        尝试获取用户的分析租约，成功时同时写入任务的初始状态，返回None
+        租约被其他仍在执行的任务持有时返回 (任务ID, 状态快照)；
+        持有者的快照已过期、从未写入或任务已经结束时视为没有持有者，直接接管租约
+        """
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM analysis_leases WHERE user_id = ? AND expires_at > ?", (job.user_id, now)
+            ).fetchone()
+            if row:
+                snapshot = self._read_snapshot(conn, row[0])
+                if snapshot and snapshot["status"]["state"] not in (JOB_SUCCESS, JOB_ERROR):
+                    return row[0], snapshot
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_leases (user_id, job_id, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (job.user_id, job.id, self.owner, now + self.lease_ttl)
+            )
+            self._write_snapshot(conn, job, now)
+        return None
+
+    def _publish(self, job):
+        """任务有新事件时更新共享状态并续租"""
+        now = time.time()
+        try:
+            with self.store.transaction() as conn:
+                self._write_snapshot(conn, job, now)
+                conn.execute(
+                    "UPDATE analysis_leases SET expires_at = ? WHERE user_id = ? AND job_id = ?",
+                    (now + self.lease_ttl, job.user_id, job.id)
+                )
+        except Exception as e:
+            # 共享状态只影响其他进程的查询，不影响分析本身
+            logger.warning("更新任务 %s 的共享状态失败: %s", job.id, e)
+
+    def _renew_leases_forever(self):
+        while True:
+            time.sleep(self.lease_ttl / LEASE_RENEWALS_PER_TTL)
+            self.renew_leases()
+
+    def renew_leases(self):
+        """为本进程所有排队和执行中的任务续租，并刷新状态快照的更新时间（其他进程据此判断任务仍然存活）"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if not job.finished]
+        if not jobs:
+            return
+        now = time.time()
+        try:
+            with self.store.transaction() as conn:
+                conn.executemany(
+                    "UPDATE analysis_leases SET expires_at = ? WHERE user_id = ? AND job_id = ?",
+                    [(now + self.lease_ttl, job.user_id, job.id) for job in jobs]
+                )
+                conn.executemany(
+                    "UPDATE analysis_job_status SET updated_at = ? WHERE job_id = ?",
+                    [(now, job.id) for job in jobs]
+                )
+        except Exception as e:
+            logger.warning("续期分析租约失败: %s", e)
+
+    def _release_lease(self, job):
+        try:
+            with self.store.transaction() as conn:
+                conn.execute("DELETE FROM analysis_leases WHERE user_id = ? AND job_id = ?", (job.user_id, job.id))
+                conn.execute("DELETE FROM analysis_job_status WHERE updated_at < ?", (time.time() - self.job_ttl,))
+        except Exception as e:
+            logger.warning("释放用户 %s 的分析租约失败: %s", job.user_id, e)
+
+    @staticmethod
+    def _write_snapshot(conn, job, now):
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_job_status (job_id, user_id, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+            (job.id, job.user_id, json.dumps(job.snapshot()), now)
+        )
+
+    def load_snapshot(self, job_id):
+        """读取共享存储中的任务状态；执行它的进程停止更新超过租约时长时视为失败"""
+        return self._read_snapshot(self.store.connection(), job_id)
+
+    def _read_snapshot(self, conn, job_id):
+        row = conn.execute(
+            "SELECT snapshot, updated_at FROM analysis_job_status WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        snapshot = json.loads(row[0])
+        age = time.time() - row[1]
+        status = snapshot["status"]
+        if status["state"] in (JOB_SUCCESS, JOB_ERROR):
+            return snapshot if age <= self.job_ttl else None
+        if age > self.lease_ttl:
+            status.update(state=JOB_ERROR, eta_seconds=None, message="分析任务所在的进程已停止")
+            snapshot["event_index"] += 1
+            snapshot["event"] = ("error", dict(status))
+        return snapshot
+
+    def _prune(self):
+        # 调用方持有锁
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.job_ttl]:
+            del self._jobs[job_id]
+
+
+# 进程内共享的分析任务队列
+analysis_jobs = AnalysisJobQueue()
@@ -0,0 +1,127 @@
+# routes/api_key.py
+import os
+import threading
+import time
+import logging
+
+import requests
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# 远程API KEY来源（GitHub Gist）
+REMOTE_KEY_URL = "https://gist.githubusercontent.com/Choukaretsu/1e1676e2b1ac3acfad4553686f5db66c/raw"
+
+# 默认缓存时间（秒）以及提前后台刷新的时间窗口
+DEFAULT_KEY_TTL = 3600
+DEFAULT_REFRESH_MARGIN = 300
+DEFAULT_KEY_FILE = "riot_api_key.txt"
+
+
+class ApiKeyProvider:
+    """
+    带TTL缓存的Riot API密钥提供者
+    获取顺序: 环境变量 RIOT_API_KEY > app.config['RIOT_API_KEY'] > 本地密钥文件 > 远程Gist
+    密钥在进程内缓存，临近过期时在后台线程刷新，收到401时调用 invalidate() 失效
+    """
+
+    def __init__(self, ttl=DEFAULT_KEY_TTL, refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 remote_url=REMOTE_KEY_URL, key_file=None):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.remote_url = remote_url
+        self.key_file = key_file
+        self._config_key = None
+        self._key = None
+        self._source = None
+        self._expires_at = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        """从Flask配置读取设置（后台线程没有应用上下文，所以在请求内快照）"""
+        self._config_key = app.config.get('RIOT_API_KEY') or None
+        self.ttl = app.config.get('RIOT_API_KEY_TTL', self.ttl)
+        self.refresh_margin = app.config.get('RIOT_API_KEY_REFRESH_MARGIN', self.refresh_margin)
+        self.remote_url = app.config.get('RIOT_API_KEY_URL', self.remote_url)
+        self.key_file = app.config.get('RIOT_API_KEY_FILE') or os.path.join(app.instance_path, DEFAULT_KEY_FILE)
+
+    def get(self):
+        """返回缓存的密钥，过期时同步重新加载，临近过期时触发后台刷新"""
+        if has_app_context():
+            self.configure(current_app)
+
+        now = time.time()
+        with self._lock:
+            if self._key and now < self._expires_at:
+                if now >= self._expires_at - self.refresh_margin and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+                return self._key
+
+        key, source = self._load()
+        with self._lock:
+            self._store(key, source)
+            return self._key
+
+    def invalidate(self, key=None):
+        """使缓存的密钥失效；传入key时只有当它仍是当前密钥才失效"""
+        with self._lock:
+            if key is None or key == self._key:
+                logger.warning("API KEY已失效（来源: %s），下次请求将重新获取", self._source)
+                self._key = None
+                self._source = None
+                self._expires_at = 0
+
+    @property
+    def source(self):
+        return self._source
+
+    def _store(self, key, source):
+        self._key = key
+        self._source = source
+        # 获取失败时不缓存，下次请求重试
+        self._expires_at = time.time() + self.ttl if key else 0
+
+    def _background_refresh(self):
+        try:
+            key, source = self._load()
+            if key:
+                with self._lock:
+                    self._store(key, source)
+        finally:
+            self._refreshing = False
+
+    def _load(self):
+        """按优先级依次尝试各个来源"""
+        api_key = os.environ.get('RIOT_API_KEY', '').strip()
+        if api_key:
+            return api_key, 'env'
+
+        if self._config_key:
+            return self._config_key.strip(), 'config'
+
+        if self.key_file and os.path.isfile(self.key_file):
+            try:
+                with open(self.key_file, encoding='utf-8') as f:
+                    api_key = f.read().strip()
+                if api_key:
+                    return api_key, 'file'
+            except OSError as e:
+                logger.error("读取API KEY文件出错: %s", e)
+
+        if self.remote_url:
+            try:
+                # 从GitHub Gist获取API KEY
+                response = requests.get(self.remote_url, timeout=10)
+                if response.status_code == 200:
+                    return response.text.strip(), 'remote'
+                logger.error("无法获取API KEY，状态码: %s", response.status_code)
+            except Exception as e:
+                logger.error("获取API KEY出错: %s", str(e))
+
+        return None, None
+
+
+# 进程内共享的密钥提供者
+api_key_provider = ApiKeyProvider()
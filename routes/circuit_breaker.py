@@ -0,0 +1,140 @@
+# routes/circuit_breaker.py
+import math
+import time
+import threading
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 连续失败多少次后断开，断开多少秒后放行一次探测请求
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """主机的熔断器处于断开状态，请求没有发出（按连接失败处理）"""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} 暂时不可用，{math.ceil(retry_in)} 秒后重试")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器
+    closed：正常放行，连续失败达到阈值后转为 open；
+    open：直接拒绝，reset_timeout 秒后转为 half_open；
+    half_open：只放行一个探测请求，成功则恢复 closed，失败则重新 open
+    """
+
+    def __init__(self, host, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _current_state(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        elif self.state == HALF_OPEN and self._probing and now - self._probe_started >= self.reset_timeout:
+            # 探测请求没有报告结果（例如抛出了其他异常），允许下一次探测
+            self._probing = False
+        return self.state
+
+    def allow(self):
+        """请求前调用：不允许发出时抛出 CircuitOpenError"""
+        with self._lock:
+            now = time.time()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - now) if state == OPEN else 0.0
+            raise CircuitOpenError(self.host, retry_in)
+
+    def available(self):
+        """不改变状态地判断现在是否可能放行请求"""
+        with self._lock:
+            state = self._current_state(time.time())
+            return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("%s 已恢复，熔断器关闭", self.host)
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("%s 连续失败 %s 次，熔断 %s 秒", self.host, self.failures, self.reset_timeout)
+                self.state = OPEN
+                self.opened_at = time.time()
+                self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "failures": self.failures,
+                "retry_in": round(max(0.0, self.opened_at + self.reset_timeout - now), 1) if state == OPEN else 0
+            }
+
+
+class HostCircuitBreakers:
+    """按路由主机（如 sea.api.riotgames.com）分别维护的熔断器"""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.failure_threshold = app.config.get('RIOT_BREAKER_FAILURE_THRESHOLD', self.failure_threshold)
+        self.reset_timeout = app.config.get('RIOT_BREAKER_RESET_TIMEOUT', self.reset_timeout)
+
+    def get(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            else:
+                breaker.failure_threshold = self.failure_threshold
+                breaker.reset_timeout = self.reset_timeout
+            return breaker
+
+    def available(self, host):
+        """主机当前是否可以请求；断开时调用方可以直接使用缓存数据"""
+        return self.get(host).available()
+
+    def states(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.host: breaker.snapshot() for breaker in breakers}
+
+
+# 进程内共享的Riot主机熔断器
+riot_breakers = HostCircuitBreakers()
@@ -1,23 +1,20 @@
 # routes/friends.py
 from flask import jsonify, request, session
-from datetime import datetime
-from models import db, User
+from models import db, User, Friend, DetailedAnalysis, GameModeStats
+from routes.user_search import search_users
 
-# 新增一个Friend模型
-class Friend(db.Model):
-    __tablename__ = 'friends'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # 建立与User的关系
-    user = db.relationship('User', foreign_keys=[user_id], backref=db.backref('friends_added', lazy=True))
-    friend = db.relationship('User', foreign_keys=[friend_id], backref=db.backref('friends_of', lazy=True))
-    
-    def __repr__(self):
-        return f'<Friend {self.user_id}-{self.friend_id}>'
+# 好友列表每页的默认数量和上限
+DEFAULT_FRIENDS_PAGE_SIZE = 100
+MAX_FRIENDS_PAGE_SIZE = 200
+
+# GameModeStats 的百分比字段 -> 展示用的模式名称
+MODE_LABELS = [
+    ("sr_5v5_percentage", "Summoner's Rift 5v5"),
+    ("aram_percentage", "ARAM"),
+    ("fun_modes_percentage", "Fun Modes"),
+    ("bot_games_percentage", "Bot Games"),
+    ("custom_percentage", "Custom Games"),
+]
 
 # 添加用户最后登录时间字段
 # 需要在User模型中添加last_login字段
@@ -41,11 +38,8 @@ def search_user(username, exact=False):
             User.username == username
         ).all()
     else:
-        # 模糊匹配
-        users = User.query.filter(
-            User.id != current_user_id,
-            User.username.like(f'%{username}%')
-        ).all()
+        # 模糊匹配（全文索引）
+        users = search_users(username, exclude_id=current_user_id)
     
     user_list = []
     for user in users:
@@ -59,29 +53,63 @@ def search_user(username, exact=False):
     
     return user_list
 
-# 获取好友列表
-def get_friends():
-    """获取当前用户的好友列表"""
-    current_user_id = session.get('user_id')
-    
-    # 查询好友关系
-    friends = Friend.query.filter_by(user_id=current_user_id).all()
+def favorite_game_mode(stats):
+    """根据模式占比（GameModeStats 或带相同字段的行）返回最常玩的模式名称"""
+    played_modes = {label: getattr(stats, field) or 0 for field, label in MODE_LABELS}
+    played_modes = {mode: perc for mode, perc in played_modes.items() if perc > 0}
+    if played_modes:
+        return max(played_modes, key=played_modes.get)
+    if stats.total_matches:
+        return "Varied / Other Modes"
+    return "N/A (No games analyzed)"
+
+def list_friends(user_id, limit=DEFAULT_FRIENDS_PAGE_SIZE, cursor=None, with_summary=False):
+    """
+    一次联表查询获取好友列表，返回 (friend_list, next_cursor)
+    按好友关系ID排序，cursor 为上一页返回的 next_cursor，没有下一页时 next_cursor 为None
+    with_summary: 同一查询中带出最常用英雄（DetailedAnalysis）和最常玩模式（GameModeStats）
+    """
+    query = db.session.query(
+        Friend.id.label("relation_id"),
+        User.id, User.username, User.riot_id, User.tagline, User.region, User.last_login
+    ).join(User, User.id == Friend.friend_id).filter(Friend.user_id == user_id)
+    
+    if with_summary:
+        query = query.add_columns(
+            DetailedAnalysis.favorite_champions,
+            GameModeStats.total_matches,
+            *[getattr(GameModeStats, field) for field, _ in MODE_LABELS]
+        ).outerjoin(DetailedAnalysis, DetailedAnalysis.user_id == User.id
+        ).outerjoin(GameModeStats, GameModeStats.user_id == User.id)
+    
+    if cursor:
+        query = query.filter(Friend.id > cursor)
+    
+    # 多取一条判断是否还有下一页
+    rows = query.order_by(Friend.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     friend_list = []
-    for friend_rel in friends:
-        # 获取好友的用户信息
-        friend = User.query.get(friend_rel.friend_id)
-        if friend:
-            friend_list.append({
-                "id": friend.id,
-                "username": friend.username,
-                "riot_id": friend.riot_id,
-                "tagline": friend.tagline,
-                "region": friend.region,
-                "last_login": friend.last_login.isoformat() if friend.last_login else None
-            })
-    
-    return friend_list
+    for row in rows:
+        friend = {
+            "id": row.id,
+            "username": row.username,
+            "riot_id": row.riot_id,
+            "tagline": row.tagline,
+            "region": row.region,
+            "last_login": row.last_login.isoformat() if row.last_login else None
+        }
+        if with_summary:
+            champions = row.favorite_champions or {}
+            friend["summary"] = {
+                "top_champion": max(champions, key=champions.get) if champions else None,
+                "favorite_game_mode": favorite_game_mode(row) if row.total_matches is not None else None
+            }
+        friend_list.append(friend)
+    
+    next_cursor = rows[-1].relation_id if has_more else None
+    return friend_list, next_cursor
 
 # 添加好友
 def add_friend(friend_id):
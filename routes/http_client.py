@@ -0,0 +1,65 @@
+# routes/http_client.py
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 默认连接池和超时设置
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+
+
+class RiotHttpClient:
+    """
+    所有Riot API请求共用的HTTP客户端
+    每个主机（如 sea.api.riotgames.com）挂载独立的连接池，连接保持keep-alive，
+    同一次分析中的请求复用少量TLS连接，而不是每次请求都重新握手
+    """
+
+    def __init__(self, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = requests.Session()
+        self._hosts = set()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        """从Flask配置读取连接池大小和超时"""
+        self.pool_maxsize = app.config.get('RIOT_HTTP_POOL_MAXSIZE', self.pool_maxsize)
+        self.connect_timeout = app.config.get('RIOT_HTTP_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('RIOT_HTTP_READ_TIMEOUT', self.read_timeout)
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _ensure_pool(self, host):
+        """为主机挂载独立的连接池（只在第一次访问时创建）"""
+        if host in self._hosts:
+            return
+        with self._lock:
+            if host in self._hosts:
+                return
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                  pool_block=True, max_retries=0)
+            self._session.mount(f"https://{host}/", adapter)
+            self._hosts.add(host)
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self._ensure_pool(urlsplit(url).netloc)
+        return self._session.get(url, headers=headers, params=params,
+                                 timeout=timeout or self.timeout)
+
+    def close(self):
+        with self._lock:
+            self._session.close()
+            self._session = requests.Session()
+            self._hosts.clear()
+
+
+# 进程内共享的Riot HTTP客户端
+riot_http = RiotHttpClient()
@@ -0,0 +1,69 @@
+# routes/local_store.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_STORE_FILE = "riot_local.db"
+
+
+class LocalStore:
+    """
+    同一台机器上多个进程共享的本地SQLite存储
+    用于保存限流计数等需要跨线程、跨worker进程协调的小状态，不放在主数据库里
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._schemas = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        path = app.config.get('RIOT_LOCAL_STORE') or os.path.join(app.instance_path, DEFAULT_STORE_FILE)
+        if path != self.path:
+            self.path = path
+
+    def register_schema(self, *statements):
+        """注册建表语句，每个连接第一次打开时执行"""
+        with self._lock:
+            self._schemas.extend(statements)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.path == self.path:
+            return conn
+        if conn is not None:
+            conn.close()
+
+        path = self.path or DEFAULT_STORE_FILE
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 自动提交模式，事务由 transaction() 显式开启
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in list(self._schemas):
+            conn.execute(statement)
+        self._local.conn = conn
+        self._local.path = self.path
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务：BEGIN IMMEDIATE 保证同一时刻只有一个进程在修改"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+
+# 进程内共享的本地存储
+local_store = LocalStore()
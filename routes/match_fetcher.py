@@ -0,0 +1,71 @@
+# routes/match_fetcher.py
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import current_app
+
+from routes.riot_api import riot_get, invalidate_api_key
+from routes.match_store import match_store
+
+# 同时在途的对局详情请求数上限
+DEFAULT_MAX_IN_FLIGHT = 5
+
+
+def iter_match_details(match_ids, routing_value, api_key, max_in_flight=None):
+    """
+    并发获取多场对局详情（match-v5），按完成顺序逐个产出 (match_id, match_data, error)
+    单场对局失败时 error 为异常对象，返回401时已使缓存的API密钥失效
+    本地对局存储中已有的对局直接读取，只有缺失的才请求Riot API
+    请求数受 max_in_flight 限制，速率仍由共享限流器控制；
+    调用方可以在后续请求还在网络上时就开始解析已经返回的对局
+    """
+    app = current_app._get_current_object()
+    if max_in_flight is None:
+        max_in_flight = app.config.get('RIOT_MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT)
+
+    # 本地对局存储中已有的不占用请求额度，缺失的交给线程池
+    match_store.configure(app)
+    cached = []
+    missing_ids = []
+    for match_id in match_ids:
+        match_data = match_store.get(match_id)
+        if match_data is not None:
+            cached.append((match_id, match_data))
+        else:
+            missing_ids.append(match_id)
+
+    def fetch(match_id):
+        # 工作线程没有应用上下文，riot_get 需要读取配置
+        with app.app_context():
+            url = f"https://{routing_value}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+            response = riot_get(url, api_key)
+            # 与 fetch_match_details 相同：401 时使缓存的API密钥失效
+            if response.status_code == 401:
+                invalidate_api_key(api_key)
+            response.raise_for_status()
+            match_data = response.json()
+            match_store.put(match_id, match_data)
+            return match_data
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(missing_ids) or 1)),
+                              thread_name_prefix="match-fetch")
+    try:
+        # 先提交网络请求，再产出本地已有的对局，让解析和网络I/O重叠
+        # 每个任务带上调用方的上下文副本（请求计数等）
+        futures = {pool.submit(contextvars.copy_context().run, fetch, match_id): match_id
+                   for match_id in missing_ids}
+        for match_id, match_data in cached:
+            yield match_id, match_data, None
+        for future in as_completed(futures):
+            match_id = futures[future]
+            try:
+                match_data = future.result()
+            except Exception as e:
+                # 任何错误（网络、状态码、无效的JSON）只影响这一场对局，不中断其余请求
+                app.logger.error(f"获取比赛详情出错: {match_id}: {str(e)}")
+                yield match_id, None, e
+                continue
+            yield match_id, match_data, None
+    finally:
+        # 调用方提前停止迭代时，取消还没开始的请求
+        pool.shutdown(wait=False, cancel_futures=True)
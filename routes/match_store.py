@@ -0,0 +1,140 @@
+# routes/match_store.py
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 默认存储目录名和容量上限（字节）
+DEFAULT_STORE_DIR = "match_store"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 超出上限时清理到上限的这个比例，避免每次写入都触发清理
+EVICT_TARGET_RATIO = 0.9
+STORE_FORMAT_VERSION = 1
+
+
+class MatchStore:
+    """
+    本地对局详情存储（match-v5 原始数据）
+    对局结束后数据不会再变化，所以按match ID永久缓存：
+    每场对局一个gzip压缩的JSON文件，文件头记录SHA-256校验值，读取时校验；
+    总大小超过上限时按最近访问时间淘汰最旧的文件
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        root = app.config.get('MATCH_STORE_DIR') or os.path.join(app.instance_path, DEFAULT_STORE_DIR)
+        if root != self.root:
+            self.root = root
+            self._total_bytes = None
+        self.max_bytes = app.config.get('MATCH_STORE_MAX_BYTES', self.max_bytes)
+
+    def _path(self, match_id):
+        digest = hashlib.sha1(match_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.root or DEFAULT_STORE_DIR, digest[:2], f"{digest}.json.gz")
+
+    def get(self, match_id):
+        """读取对局详情；不存在或校验失败时返回None"""
+        path = self._path(match_id)
+        try:
+            with gzip.open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            logger.warning("对局 %s 的缓存文件损坏，已删除: %s", match_id, e)
+            self._remove(path)
+            return None
+
+        if header.get('match_id') != match_id or header.get('sha256') != hashlib.sha256(payload).hexdigest():
+            logger.warning("对局 %s 的缓存文件校验失败，已删除", match_id)
+            self._remove(path)
+            return None
+
+        # 更新访问时间，供淘汰时判断
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return json.loads(payload)
+
+    def put(self, match_id, match_data):
+        """写入对局详情（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        payload = json.dumps(match_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        header = json.dumps({
+            "v": STORE_FORMAT_VERSION,
+            "match_id": match_id,
+            "sha256": hashlib.sha256(payload).hexdigest()
+        }).encode('utf-8')
+
+        path = self._path(match_id)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(header + b"\n" + payload)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("写入对局 %s 缓存失败: %s", match_id, e)
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += os.path.getsize(path) - previous
+        self._maybe_evict()
+
+    def _files(self):
+        root = self.root or DEFAULT_STORE_DIR
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.endswith('.json.gz'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _maybe_evict(self):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._files())
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            # 其他进程也可能写入，清理前重新扫描一次
+            files = sorted(self._files(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            target = self.max_bytes * EVICT_TARGET_RATIO
+            for path, size, _ in files:
+                if total <= target:
+                    break
+                if self._remove(path):
+                    total -= size
+            self._total_bytes = total
+            logger.info("对局缓存已清理，当前大小 %s 字节", total)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+# 进程内共享的对局详情存储
+match_store = MatchStore()
@@ -0,0 +1,151 @@
+# routes/rate_limit.py
+import re
+import time
+import threading
+import logging
+from urllib.parse import urlsplit
+
+from routes.local_store import local_store
+
+logger = logging.getLogger(__name__)
+
+# 开发者密钥的默认应用级限制：每秒20次、每两分钟100次
+DEFAULT_APP_RATE_LIMIT = "20:1,100:120"
+
+# 按接口路径前缀区分方法级限流桶
+METHOD_PATTERNS = [
+    ("/lol/match/v5/matches/by-puuid/", "match-v5.ids-by-puuid"),
+    ("/lol/match/v5/matches/", "match-v5.match-by-id"),
+    ("/lol/league/v4/entries/by-puuid/", "league-v4.entries-by-puuid"),
+    ("/riot/account/v1/accounts/by-riot-id/", "account-v1.by-riot-id"),
+    ("/riot/account/v1/accounts/by-puuid/", "account-v1.by-puuid"),
+]
+
+# 限流状态表（保存在本地共享存储中）
+RATE_LIMIT_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rate_limits (bucket TEXT, window REAL, max_count INTEGER, "
+    "PRIMARY KEY (bucket, window))",
+    "CREATE TABLE IF NOT EXISTS rate_events (bucket TEXT, ts REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_rate_events_bucket_ts ON rate_events (bucket, ts)",
+    "CREATE TABLE IF NOT EXISTS rate_blocks (bucket TEXT PRIMARY KEY, until REAL)",
+)
+
+
+def parse_rate_limit_header(value):
+    """解析 "20:1,100:120" 形式的限流头，返回 [(次数, 窗口秒数), ...]"""
+    limits = []
+    for part in (value or "").split(","):
+        match = re.match(r"^\s*(\d+):(\d+)\s*$", part)
+        if match:
+            limits.append((int(match.group(1)), float(match.group(2))))
+    return limits
+
+
+def method_key(url):
+    """把请求URL归类为Riot的方法级限流桶"""
+    path = urlsplit(url).path
+    for prefix, name in METHOD_PATTERNS:
+        if path.startswith(prefix):
+            return name
+    return "/".join(path.split("/")[:5])
+
+
+class RiotRateLimiter:
+    """
+    Riot API限流调度器
+    每个路由主机有一个应用级桶，每个(主机, 接口)有一个方法级桶；
+    限制值从 X-App-Rate-Limit / X-Method-Rate-Limit 响应头学习，
+    429时按 Retry-After 暂停对应的桶。状态保存在本地共享存储中，多个线程和进程共同遵守。
+    """
+
+    def __init__(self, store=local_store, app_rate_limit=DEFAULT_APP_RATE_LIMIT):
+        self.store = store
+        self.store.register_schema(*RATE_LIMIT_SCHEMA)
+        self.default_app_limits = parse_rate_limit_header(app_rate_limit)
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.store.configure(app)
+        self.default_app_limits = parse_rate_limit_header(
+            app.config.get('RIOT_APP_RATE_LIMIT', DEFAULT_APP_RATE_LIMIT))
+
+    @staticmethod
+    def buckets(url):
+        host = urlsplit(url).netloc
+        return f"app:{host}", f"method:{host}:{method_key(url)}"
+
+    def _limits(self, conn, bucket, defaults):
+        rows = conn.execute("SELECT max_count, window FROM rate_limits WHERE bucket = ?", (bucket,)).fetchall()
+        return rows or defaults
+
+    def try_acquire(self, url):
+        """尝试占用一次请求额度；成功返回0，否则返回需要等待的秒数"""
+        app_bucket, method_bucket = self.buckets(url)
+        with self._lock, self.store.transaction() as conn:
+            now = time.time()
+            wait = 0.0
+            for bucket, defaults in ((app_bucket, self.default_app_limits), (method_bucket, [])):
+                row = conn.execute("SELECT until FROM rate_blocks WHERE bucket = ?", (bucket,)).fetchone()
+                if row and row[0] > now:
+                    wait = max(wait, row[0] - now)
+
+                for max_count, window in self._limits(conn, bucket, defaults):
+                    # 窗口内已有 max_count 次请求时，要等到最早那一次滑出窗口
+                    row = conn.execute(
+                        "SELECT ts FROM rate_events WHERE bucket = ? AND ts > ? "
+                        "ORDER BY ts DESC LIMIT 1 OFFSET ?",
+                        (bucket, now - window, max_count - 1)).fetchone()
+                    if row:
+                        wait = max(wait, row[0] + window - now)
+
+            if wait > 0:
+                return wait
+
+            conn.executemany("INSERT INTO rate_events (bucket, ts) VALUES (?, ?)",
+                             [(app_bucket, now), (method_bucket, now)])
+            return 0.0
+
+    def acquire(self, url, max_wait=None):
+        """阻塞直到额度可用；返回实际等待的总秒数"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(url)
+            if wait <= 0:
+                return waited
+            if max_wait is not None and waited + wait > max_wait:
+                raise TimeoutError(f"等待Riot API限流超时（还需 {wait:.1f} 秒）")
+            time.sleep(wait)
+            waited += wait
+
+    def observe(self, url, response):
+        """根据响应头更新学习到的限制，429时暂停对应的桶"""
+        app_bucket, method_bucket = self.buckets(url)
+        headers = response.headers
+        learned = [(app_bucket, parse_rate_limit_header(headers.get('X-App-Rate-Limit'))),
+                   (method_bucket, parse_rate_limit_header(headers.get('X-Method-Rate-Limit')))]
+
+        with self._lock, self.store.transaction() as conn:
+            now = time.time()
+            for bucket, limits in learned:
+                if not limits:
+                    continue
+                conn.execute("DELETE FROM rate_limits WHERE bucket = ?", (bucket,))
+                conn.executemany("INSERT INTO rate_limits (bucket, window, max_count) VALUES (?, ?, ?)",
+                                 [(bucket, window, max_count) for max_count, window in limits])
+
+            if response.status_code == 429:
+                retry_after = float(headers.get('Retry-After') or 1)
+                limit_type = headers.get('X-Rate-Limit-Type', 'application')
+                bucket = app_bucket if limit_type == 'application' else method_bucket
+                logger.warning("Riot API返回429（%s），暂停 %s 秒", bucket, retry_after)
+                conn.execute("INSERT OR REPLACE INTO rate_blocks (bucket, until) VALUES (?, ?)",
+                             (bucket, now + retry_after))
+
+            # 清理已经滑出所有窗口的旧记录
+            longest = conn.execute("SELECT MAX(window) FROM rate_limits").fetchone()[0] or 0
+            longest = max([longest] + [w for _, w in self.default_app_limits])
+            conn.execute("DELETE FROM rate_events WHERE ts < ?", (now - longest,))
+
+
+# 进程内共享的限流器（跨进程状态在本地存储中）
+rate_limiter = RiotRateLimiter()
@@ -0,0 +1,142 @@
+# routes/response_cache.py
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 各类接口的缓存时间（秒）：账号/PUUID几乎不变，段位几分钟，对局ID列表很短
+DEFAULT_ENDPOINT_TTLS = {
+    "account": 24 * 3600,
+    "league": 300,
+    "match_list": 60,
+}
+# 超过TTL的这个比例后仍返回缓存，同时在后台刷新
+SOFT_EXPIRY_RATIO = 0.8
+# 缓存占用内存上限（按JSON序列化后的字节数估算）
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class CacheEntry:
+    def __init__(self, value, ttl, size):
+        now = time.time()
+        self.value = value
+        self.size = size
+        self.soft_expires_at = now + ttl * SOFT_EXPIRY_RATIO
+        self.expires_at = now + ttl
+        self.refreshing = False
+
+
+class ResponseCache:
+    """
+    Riot API响应的读穿透缓存，每类接口有自己的TTL
+    过了软过期时间的条目照常返回，同时启动一次后台刷新；超过TTL才同步重新请求。
+    按最近使用淘汰（LRU），总大小不超过 max_bytes。
+    错误结果（带 "error" 的dict）不缓存
+    """
+
+    def __init__(self, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttls = dict(DEFAULT_ENDPOINT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._app = None
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        """读取配置，并保存app供后台刷新线程建立应用上下文"""
+        self._app = app
+        self.ttls.update(app.config.get('RIOT_CACHE_TTLS', {}))
+        self.max_bytes = app.config.get('RIOT_CACHE_MAX_BYTES', self.max_bytes)
+
+    def get_or_load(self, endpoint, key, loader):
+        """返回 (endpoint, key) 的缓存值，没有或已过期时调用 loader() 获取"""
+        cache_key = (endpoint, key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and now < entry.expires_at:
+                self._entries.move_to_end(cache_key)
+                if now >= entry.soft_expires_at and not entry.refreshing and self._app is not None:
+                    entry.refreshing = True
+                    self.stale_hits += 1
+                    threading.Thread(target=self._refresh, args=(endpoint, key, loader, entry),
+                                     daemon=True).start()
+                else:
+                    self.hits += 1
+                return entry.value
+            self.misses += 1
+
+        value = loader()
+        self.put(endpoint, key, value)
+        return value
+
+    def peek(self, endpoint, key):
+        """返回缓存值（即使已经过期），不触发加载；没有时返回None"""
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+            return entry.value if entry else None
+
+    def put(self, endpoint, key, value):
+        if isinstance(value, dict) and "error" in value:
+            return
+        try:
+            size = len(json.dumps(value, separators=(',', ':')))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes:
+            return
+
+        cache_key = (endpoint, key)
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old:
+                self._total_bytes -= old.size
+            self._entries[cache_key] = CacheEntry(value, self.ttls.get(endpoint, 0), size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+
+    def invalidate(self, endpoint=None, key=None):
+        """使缓存失效：不带参数清空全部，只带endpoint清空这一类，都带时只删除一个条目"""
+        with self._lock:
+            for cache_key in [k for k in self._entries
+                              if (endpoint is None or k[0] == endpoint) and (key is None or k[1] == key)]:
+                self._total_bytes -= self._entries.pop(cache_key).size
+
+    def invalidate_matching(self, endpoint, predicate):
+        """删除这一类接口中 predicate(key) 为真的条目"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == endpoint and predicate(k[1])]:
+                self._total_bytes -= self._entries.pop(cache_key).size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses
+            }
+
+    def _refresh(self, endpoint, key, loader, entry):
+        try:
+            with self._app.app_context():
+                self.put(endpoint, key, loader())
+        except Exception as e:
+            logger.warning("后台刷新缓存 %s %s 失败: %s", endpoint, key, e)
+        finally:
+            # 刷新失败时允许下一次请求再触发
+            entry.refreshing = False
+
+
+# 进程内共享的Riot API响应缓存
+riot_cache = ResponseCache()
@@ -1,22 +1,34 @@
 import requests
 import os
-from flask import current_app
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, has_app_context
 import urllib.parse
+from urllib.parse import urlsplit
 
-# 获取API KEY
+from routes.api_key import api_key_provider
+from routes.http_client import riot_http
+from routes.rate_limit import rate_limiter
+from routes.match_store import match_store
+from routes.response_cache import riot_cache
+from routes.circuit_breaker import riot_breakers
+from routes.routing import platform_for, regional_for, platform_host, regional_host, account_host
+
+# 获取API KEY（带TTL缓存，见 routes/api_key.py）
 def get_api_key():
-    try:
-        # 从GitHub Gist获取API KEY
-        response = requests.get("https://gist.githubusercontent.com/Choukaretsu/1e1676e2b1ac3acfad4553686f5db66c/raw")
-        if response.status_code == 200:
-            api_key = response.text.strip()
-            return api_key
-        else:
-            current_app.logger.error(f"无法获取API KEY，状态码: {response.status_code}")
-            return None
-    except Exception as e:
-        current_app.logger.error(f"获取API KEY出错: {str(e)}")
-        return None
+    api_key = api_key_provider.get()
+    if not api_key:
+        current_app.logger.error("无法获取API KEY")
+    return api_key
+
+# 密钥被Riot拒绝(401)时使缓存失效，下一次请求会重新获取
+def invalidate_api_key(api_key=None):
+    api_key_provider.invalidate(api_key)
 
 # 获取Riot API请求头
 def get_riot_headers(api_key):
@@ -28,8 +40,247 @@ def get_riot_headers(api_key):
         "X-Riot-Token": api_key
     }
 
-# 获取玩家PUUID
-def fetch_puuid(game_name, tag_line, api_key=None):
+class RequestCounter:
+    """统计一段工作中实际发出的Riot API请求数（线程安全）"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+# 当前上下文的请求计数器；线程池任务用 contextvars.copy_context() 提交时同样生效
+_request_counter = ContextVar('riot_request_counter', default=None)
+
+@contextmanager
+def count_requests():
+    """在 with 块内统计 riot_get 发出的请求数"""
+    counter = RequestCounter()
+    token = _request_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _request_counter.reset(token)
+
+class SharedResponse:
+    """
+    合并请求共享的响应：状态码、响应头等来自上游响应，JSON只解析一次
+    所有等待者拿到的是同一个解析结果，调用方不应修改它
+    """
+
+    _UNPARSED = object()
+
+    def __init__(self, response):
+        self._response = response
+        self._parsed = self._UNPARSED
+        self._lock = threading.Lock()
+
+    def json(self):
+        with self._lock:
+            if self._parsed is self._UNPARSED:
+                self._parsed = self._response.json()
+            return self._parsed
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+class SingleFlight:
+    """
+    相同key的并发调用只执行一次：第一个调用者发出请求，
+    其他调用者等待它完成并共享结果（或异常）。hits 是被合并省下的调用数
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["result"]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "in_flight": len(self._calls),
+                "hit_rate": round(self.hits / total, 3) if total else 0
+            }
+
+# 进程内共享：相同的Riot GET请求（URL和参数相同）同时只发出一次
+riot_single_flight = SingleFlight()
+
+# 429时最多重试的次数（等待时间由限流器按 Retry-After 控制）
+MAX_RATE_LIMIT_RETRIES = 3
+
+# 5xx或网络错误时的重试次数，以及指数退避的基础和最大等待时间（秒）
+DEFAULT_RETRY_ATTEMPTS = 2
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 8.0
+RETRYABLE_STATUS = (500, 502, 503, 504)
+
+def backoff_delay(retry, base=DEFAULT_RETRY_BASE_DELAY, cap=DEFAULT_RETRY_MAX_DELAY):
+    """第 retry 次重试（从0开始）前的等待时间：在 [0, min(cap, base*2^retry)] 内随机，避免大家同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** retry)))
+
+# 所有Riot API的GET请求都通过共享的连接池客户端发出，并遵守共享限流；
+# 同时进行的相同请求合并为一次上游请求，调用者共享响应和解析后的JSON
+def riot_get(url, api_key, params=None):
+    if has_app_context():
+        riot_http.configure(current_app)
+        rate_limiter.configure(current_app)
+        riot_breakers.configure(current_app)
+
+    key = (url, tuple(sorted((params or {}).items())))
+    return riot_single_flight.do(key, lambda: SharedResponse(_riot_get_upstream(url, api_key, params)))
+
+# GET是幂等的：5xx和网络错误按带抖动的指数退避重试，429按限流器的 Retry-After 重试；
+# 主机的熔断器断开时直接抛出 CircuitOpenError（requests 的 ConnectionError），不发出请求
+def _riot_get_upstream(url, api_key, params=None):
+    config = current_app.config if has_app_context() else {}
+    max_retries = config.get('RIOT_RETRY_ATTEMPTS', DEFAULT_RETRY_ATTEMPTS)
+    base_delay = config.get('RIOT_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY)
+    max_delay = config.get('RIOT_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)
+    breaker = riot_breakers.get(urlsplit(url).netloc)
+    
+    retries = 0
+    rate_limited = 0
+    while True:
+        breaker.allow()
+        rate_limiter.acquire(url)
+        try:
+            response = riot_http.get(url, headers=get_riot_headers(api_key), params=params)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            breaker.record_failure()
+            if retries >= max_retries:
+                raise
+            time.sleep(backoff_delay(retries, base_delay, max_delay))
+            retries += 1
+            continue
+        
+        counter = _request_counter.get()
+        if counter is not None:
+            counter.increment()
+        rate_limiter.observe(url, response)
+        
+        if response.status_code in RETRYABLE_STATUS:
+            breaker.record_failure()
+            if retries >= max_retries:
+                return response
+            time.sleep(backoff_delay(retries, base_delay, max_delay))
+            retries += 1
+            continue
+        
+        # 其他状态码（包括429和4xx）说明主机正常响应
+        breaker.record_success()
+        if response.status_code == 429 and rate_limited < MAX_RATE_LIMIT_RETRIES:
+            rate_limited += 1
+            continue
+        return response
+
+# 并发请求多个互不依赖的Riot接口时使用的共享线程池和默认超时（秒）
+DEFAULT_FANOUT_WORKERS = 8
+DEFAULT_FANOUT_TIMEOUT = 5.0
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+def _fanout_executor(max_workers):
+    global _fanout_pool
+    with _fanout_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="riot-fanout")
+        return _fanout_pool
+
+def fetch_concurrently(calls, timeout=None):
+    """
+    并发执行多个互不依赖的请求，calls 为 {名称: 无参函数}，返回 {名称: 结果}
+    总耗时约等于最慢的一个请求；超过 timeout 秒或抛出异常的请求结果为 {"error": ...}，
+    其余结果照常返回。超时的请求在后台继续完成（结果仍会进入缓存）
+    """
+    app = current_app._get_current_object()
+    if timeout is None:
+        timeout = app.config.get('RIOT_FANOUT_TIMEOUT', DEFAULT_FANOUT_TIMEOUT)
+    pool = _fanout_executor(app.config.get('RIOT_FANOUT_WORKERS', DEFAULT_FANOUT_WORKERS))
+
+    def run(fn):
+        # 工作线程没有应用上下文，fetch_* 需要读取配置和日志
+        with app.app_context():
+            return fn()
+
+    futures = {name: pool.submit(contextvars.copy_context().run, run, fn) for name, fn in calls.items()}
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            app.logger.warning(f"请求 {name} 超过 {timeout} 秒未完成，返回部分结果")
+            results[name] = {"error": f"请求超时（{timeout}秒）"}
+        elif future.exception() is not None:
+            app.logger.error(f"请求 {name} 出错: {future.exception()}")
+            results[name] = {"error": str(future.exception())}
+        else:
+            results[name] = future.result()
+    return results
+
+# 账号、段位和对局ID列表经过按接口分类的TTL缓存（见 routes/response_cache.py）
+# 主机熔断时有缓存（即使已过期）就直接返回，不等待请求失败
+def _cached(endpoint, key, loader, host=None):
+    if has_app_context():
+        # 缓存保存app供后台刷新使用，需要真正的app对象而不是代理
+        riot_cache.configure(current_app._get_current_object())
+    if host and not riot_breakers.available(host):
+        stale = riot_cache.peek(endpoint, key)
+        if stale is not None:
+            return stale
+    return riot_cache.get_or_load(endpoint, key, loader)
+
+def _account_key(game_name, tag_line):
+    # Riot ID不区分大小写
+    return (game_name.lower(), tag_line.lower())
+
+# 缓存失效：用户修改Riot ID时失效旧账号，玩家有新对局时失效段位和对局列表
+def invalidate_account(game_name, tag_line):
+    if game_name and tag_line:
+        riot_cache.invalidate("account", _account_key(game_name, tag_line))
+
+def invalidate_player(puuid):
+    riot_cache.invalidate_matching("league", lambda key: key[0] == puuid)
+    riot_cache.invalidate_matching("match_list", lambda key: key[0] == puuid)
+
+# 获取玩家PUUID（账号是全球的，按用户区域选最近的 account-v1 集群）
+def fetch_puuid(game_name, tag_line, api_key=None, region=None):
+    return _cached("account", _account_key(game_name, tag_line),
+                   lambda: _fetch_puuid(game_name, tag_line, api_key, region), account_host(region))
+
+def _fetch_puuid(game_name, tag_line, api_key=None, region=None):
     if not api_key:
         api_key = get_api_key()
         if not api_key:
@@ -39,10 +290,10 @@ def fetch_puuid(game_name, tag_line, api_key=None):
     encoded_game_name = urllib.parse.quote(game_name)
     encoded_tag_line = urllib.parse.quote(tag_line)
     
-    url = f"https://asia.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{encoded_game_name}/{encoded_tag_line}"
+    url = f"https://{account_host(region)}/riot/account/v1/accounts/by-riot-id/{encoded_game_name}/{encoded_tag_line}"
     
     try:
-        response = requests.get(url, headers=get_riot_headers(api_key))
+        response = riot_get(url, api_key)
         if response.status_code == 200:
             account_data = response.json()
             current_app.logger.info(f"成功获取PUUID: {account_data['puuid']}，用户: {game_name}#{tag_line}")
@@ -57,6 +308,7 @@ def fetch_puuid(game_name, tag_line, api_key=None):
                 error_msg = f"找不到玩家 {game_name}#{tag_line}"
             elif response.status_code == 401:
                 error_msg = "API密钥无效或已过期"
+                invalidate_api_key(api_key)
             
             current_app.logger.error(error_msg)
             return {"error": error_msg}
@@ -64,59 +316,86 @@ def fetch_puuid(game_name, tag_line, api_key=None):
         current_app.logger.error(f"获取PUUID出错: {str(e)}")
         return {"error": f"获取PUUID出错: {str(e)}"}
 
-# 获取段位信息
-def fetch_rank_info(puuid, api_key=None):
+# PUUID失效（账号迁移等）时下游接口返回的状态码
+INVALID_PUUID_STATUS = (400, 404)
+
+def is_invalid_puuid_error(result):
+    return isinstance(result, dict) and result.get("status_code") in INVALID_PUUID_STATUS
+
+# 获取段位信息（段位按服务器区分，使用平台路由）
+def fetch_rank_info(puuid, api_key=None, region=None):
+    return _cached("league", (puuid, platform_for(region)),
+                   lambda: _fetch_rank_info(puuid, api_key, region), platform_host(region))
+
+def _fetch_rank_info(puuid, api_key=None, region=None):
     if not api_key:
         api_key = get_api_key()
         if not api_key:
             return {"error": "无法获取API密钥"}
     
-    url = f"https://oc1.api.riotgames.com/lol/league/v4/entries/by-puuid/{puuid}"
+    url = f"https://{platform_host(region)}/lol/league/v4/entries/by-puuid/{puuid}"
     try:
-        response = requests.get(url, headers=get_riot_headers(api_key))
+        response = riot_get(url, api_key)
         if response.status_code == 200:
             return response.json()
         else:
+            if response.status_code == 401:
+                invalidate_api_key(api_key)
             current_app.logger.error(f"段位请求失败，状态码: {response.status_code}")
-            return {"error": f"段位请求失败，状态码: {response.status_code}"}
+            return {"error": f"段位请求失败，状态码: {response.status_code}", "status_code": response.status_code}
     except Exception as e:
         current_app.logger.error(f"获取段位信息出错: {str(e)}")
         return {"error": f"获取段位信息出错: {str(e)}"}
 
-# 获取比赛ID列表
-def fetch_match_list(puuid, count=20, api_key=None):
+# 获取比赛ID列表（match-v5 使用区域路由）
+def fetch_match_list(puuid, count=20, api_key=None, region=None):
+    return _cached("match_list", (puuid, count, regional_for(region)),
+                   lambda: _fetch_match_list(puuid, count, api_key, region), regional_host(region))
+
+def _fetch_match_list(puuid, count=20, api_key=None, region=None):
     if not api_key:
         api_key = get_api_key()
         if not api_key:
             return {"error": "无法获取API密钥"}
     
-    url = f"https://sea.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}"
+    url = f"https://{regional_host(region)}/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}"
     try:
-        response = requests.get(url, headers=get_riot_headers(api_key))
+        response = riot_get(url, api_key)
         if response.status_code == 200:
             return response.json()
         else:
+            if response.status_code == 401:
+                invalidate_api_key(api_key)
             current_app.logger.error(f"比赛ID请求失败，状态码: {response.status_code}")
-            return {"error": f"比赛ID请求失败，状态码: {response.status_code}"}
+            return {"error": f"比赛ID请求失败，状态码: {response.status_code}", "status_code": response.status_code}
     except Exception as e:
         current_app.logger.error(f"获取比赛ID列表出错: {str(e)}")
         return {"error": f"获取比赛ID列表出错: {str(e)}"}
 
-# 获取比赛详情
-def fetch_match_details(match_id, api_key=None):
+# 获取比赛详情（优先读取本地对局存储，已结束的对局不会变化）
+def fetch_match_details(match_id, api_key=None, region=None):
+    match_store.configure(current_app)
+    cached = match_store.get(match_id)
+    if cached is not None:
+        return cached
+    
     if not api_key:
         api_key = get_api_key()
         if not api_key:
             return {"error": "无法获取API密钥"}
     
-    url = f"https://sea.api.riotgames.com/lol/match/v5/matches/{match_id}"
+    url = f"https://{regional_host(region)}/lol/match/v5/matches/{match_id}"
     try:
-        response = requests.get(url, headers=get_riot_headers(api_key))
+        response = riot_get(url, api_key)
         if response.status_code == 200:
-            return response.json()
+            match_data = response.json()
+            match_store.put(match_id, match_data)
+            return match_data
         else:
+            if response.status_code == 401:
+                invalidate_api_key(api_key)
             current_app.logger.error(f"比赛详情请求失败，状态码: {response.status_code}")
             return {"error": f"比赛详情请求失败，状态码: {response.status_code}"}
     except Exception as e:
         current_app.logger.error(f"获取比赛详情出错: {str(e)}")
-        return {"error": f"获取比赛详情出错: {str(e)}"}
\ No newline at end of file
+        return {"error": f"获取比赛详情出错: {str(e)}"}
@@ -0,0 +1,87 @@
+# routes/routing.py
+
+# 平台路由（summoner/league 等按服务器的接口）对应的区域路由（match-v5 等按大区的接口）
+PLATFORM_REGIONAL = {
+    'na1': 'americas',
+    'br1': 'americas',
+    'la1': 'americas',
+    'la2': 'americas',
+    'kr': 'asia',
+    'jp1': 'asia',
+    'euw1': 'europe',
+    'eun1': 'europe',
+    'tr1': 'europe',
+    'ru': 'europe',
+    'me1': 'europe',
+    'oc1': 'sea',
+    'sg2': 'sea',
+    'tw2': 'sea',
+    'vn2': 'sea',
+}
+
+# account-v1 只部署在 americas/asia/europe，sea 的账号请求发到 asia
+ACCOUNT_REGIONAL = {
+    'americas': 'americas',
+    'asia': 'asia',
+    'europe': 'europe',
+    'sea': 'asia',
+}
+
+# User.region 的取值 -> 平台路由
+# 注册/个人资料表单的选项（asia/europe/america/oceania），以及常见的服务器简称
+REGION_PLATFORM = {
+    'asia': 'kr',
+    'europe': 'euw1',
+    'america': 'na1',
+    'oceania': 'oc1',
+    'na': 'na1',
+    'br': 'br1',
+    'lan': 'la1',
+    'las': 'la2',
+    'kr': 'kr',
+    'jp': 'jp1',
+    'euw': 'euw1',
+    'eune': 'eun1',
+    'tr': 'tr1',
+    'ru': 'ru',
+    'me': 'me1',
+    'oce': 'oc1',
+    'ph': 'sg2',
+    'sg': 'sg2',
+    'th': 'sg2',
+    'tw': 'tw2',
+    'vn': 'vn2',
+}
+
+# 没有设置区域或无法识别时使用的平台
+DEFAULT_PLATFORM = 'oc1'
+
+
+def platform_for(region):
+    """用户区域对应的平台路由值（如 oc1）；也接受平台路由值本身"""
+    region = (region or '').strip().lower()
+    if region in PLATFORM_REGIONAL:
+        return region
+    return REGION_PLATFORM.get(region, DEFAULT_PLATFORM)
+
+
+def regional_for(region):
+    """用户区域对应的区域路由值（如 sea），用于 match-v5"""
+    return PLATFORM_REGIONAL[platform_for(region)]
+
+
+def account_regional_for(region):
+    """用户区域对应的 account-v1 区域路由值"""
+    return ACCOUNT_REGIONAL[regional_for(region)]
+
+
+def platform_host(region):
+    return f"{platform_for(region)}.api.riotgames.com"
+
+
+def regional_host(region):
+    return f"{regional_for(region)}.api.riotgames.com"
+
+
+def account_host(region):
+    return f"{account_regional_for(region)}.api.riotgames.com"
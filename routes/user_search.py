@@ -0,0 +1,155 @@
+# routes/user_search.py
+import logging
+
+from sqlalchemy import event, or_, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+# 搜索结果默认数量，以及参与排序的全文索引候选数上限（保证大表上延迟稳定）
+DEFAULT_SEARCH_LIMIT = 10
+MAX_CANDIDATES = 200
+# trigram 分词至少需要3个字符，更短的输入用 LIKE 子串匹配
+MIN_TRIGRAM_LENGTH = 3
+
+# 用户搜索索引：FTS5 trigram 表，rowid 为用户ID，内容由 users 表上的触发器同步
+SEARCH_INDEX_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "username, riot_tag, tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO user_search (rowid, username, riot_tag) VALUES "
+    "(new.id, new.username, coalesce(new.riot_id, '') || '#' || coalesce(new.tagline, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF username, riot_id, tagline ON users BEGIN "
+    "UPDATE user_search SET username = new.username, "
+    "riot_tag = coalesce(new.riot_id, '') || '#' || coalesce(new.tagline, '') WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON users BEGIN "
+    "DELETE FROM user_search WHERE rowid = old.id; END",
+    # 用户名前缀匹配走这个表达式索引的范围查询
+    "CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username))",
+)
+# 重建索引：清空后从 users 表重新填充（索引不是模型，create_all/drop_all 之外的变化都靠重建修正）
+SEARCH_INDEX_REBUILD = (
+    "DELETE FROM user_search",
+    "INSERT INTO user_search (rowid, username, riot_tag) "
+    "SELECT id, username, coalesce(riot_id, '') || '#' || coalesce(tagline, '') FROM users",
+)
+
+# 候选来自两部分，各取最多 MAX_CANDIDATES 个（不对全部匹配计算相关度，常见片段也不会变慢）：
+# 用户名前缀匹配用 lower(username) 索引按范围读取（完全匹配最短，排在索引最前面），
+# 其余子串匹配来自全文索引；再在候选中排序：
+# 用户名前缀匹配在前，其次用户名匹配，最后按用户名长度（越短越接近）
+SEARCH_QUERY = text(
+    "SELECT users.id FROM ("
+    "  SELECT id AS rowid FROM ("
+    "    SELECT id FROM users WHERE lower(username) >= :prefix AND lower(username) < :prefix_end "
+    "    ORDER BY lower(username) LIMIT :candidates"
+    "  ) UNION "
+    "  SELECT rowid FROM ("
+    "    SELECT rowid FROM user_search WHERE user_search MATCH :match LIMIT :candidates"
+    "  )"
+    ") AS hits JOIN users ON users.id = hits.rowid "
+    "WHERE users.id != :exclude_id "
+    "ORDER BY substr(lower(users.username), 1, length(:term)) = lower(:term) DESC, "
+    "instr(lower(users.username), lower(:term)) > 0 DESC, length(users.username), users.id "
+    "LIMIT :limit"
+)
+
+_index_available = {}
+
+
+def _build_index(conn):
+    """在 conn 上创建索引表和同步触发器（已存在时跳过），并从 users 表重建索引内容"""
+    for statement in SEARCH_INDEX_SCHEMA + SEARCH_INDEX_REBUILD:
+        conn.execute(text(statement))
+
+
+def ensure_search_index():
+    """
+    启动时调用：创建搜索索引和同步触发器，并从 users 表重建索引，
+    修正触发器缺失期间（如 users 表被重建）留下的过时或缺少的条目
+    数据库不是SQLite或不支持FTS5时返回False，搜索退回 LIKE 查询
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        _index_available[str(engine.url)] = False
+        return False
+    try:
+        with engine.begin() as conn:
+            _build_index(conn)
+    except OperationalError as e:
+        logger.warning("无法创建用户搜索索引（FTS5 trigram 不可用），使用LIKE搜索: %s", e)
+        _index_available[str(engine.url)] = False
+        return False
+    _index_available[str(engine.url)] = True
+    return True
+
+
+@event.listens_for(User.__table__, 'after_create')
+def _create_index_with_users(target, connection, **kw):
+    # users 表新建时（create_all）同时建立索引和触发器
+    if connection.dialect.name != 'sqlite':
+        return
+    try:
+        _build_index(connection)
+    except OperationalError as e:
+        logger.warning("无法创建用户搜索索引（FTS5 trigram 不可用），使用LIKE搜索: %s", e)
+        _index_available[str(connection.engine.url)] = False
+        return
+    _index_available[str(connection.engine.url)] = True
+
+
+@event.listens_for(User.__table__, 'after_drop')
+def _drop_index_with_users(target, connection, **kw):
+    # 触发器随 users 表一起删除，索引表也要删除，避免留下过时的 rowid
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS user_search"))
+
+
+def _fts_phrase(term):
+    # 作为一个短语匹配，避免用户输入被解析成FTS语法
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_users(term, exclude_id=None, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    按用户名或 riot_id#tagline 搜索用户（子串匹配），用户名前缀匹配的排在前面
+    返回 User 列表；exclude_id 通常是当前用户
+    """
+    term = term.strip()
+    if not term:
+        return []
+    exclude_id = exclude_id or 0
+
+    if len(term) < MIN_TRIGRAM_LENGTH or not _index_available.get(str(db.engine.url), False):
+        # trigram 无法匹配的短输入，或没有全文索引时，用 LIKE 子串匹配
+        return _like_search(term, exclude_id, limit)
+
+    ids = [row.id for row in db.session.execute(SEARCH_QUERY, {
+        "match": _fts_phrase(term),
+        "prefix": term.lower(),
+        "prefix_end": term.lower() + '\U0010ffff',
+        "candidates": MAX_CANDIDATES,
+        "exclude_id": exclude_id,
+        "term": term,
+        "limit": limit
+    })]
+    users = {user.id: user for user in User.query.filter(User.id.in_(ids)).all()} if ids else {}
+    return [users[user_id] for user_id in ids if user_id in users]
+
+
+def _like_search(term, exclude_id, limit):
+    """LIKE 子串匹配用户名和 riot_id#tagline（不区分大小写），排序规则与全文索引搜索相同"""
+    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    riot_tag = db.func.coalesce(User.riot_id, '') + '#' + db.func.coalesce(User.tagline, '')
+    lowered = db.func.lower(User.username)
+    return User.query.filter(
+        User.id != exclude_id,
+        or_(User.username.ilike(pattern, escape='\\'), riot_tag.ilike(pattern, escape='\\'))
+    ).order_by(
+        (db.func.substr(lowered, 1, len(term)) == term.lower()).desc(),
+        (db.func.instr(lowered, term.lower()) > 0).desc(),
+        db.func.length(User.username),
+        User.id
+    ).limit(limit).all()
@@ -0,0 +1,172 @@
+# routes/versioned_cache.py
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from routes.local_store import local_store
+
+# 内存中保存的响应条数上限
+DEFAULT_MAX_ENTRIES = 1024
+
+# 数据版本表（保存在本地共享存储中，多个进程看到同一个版本）
+DATA_VERSION_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS data_versions (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+)
+
+
+class RawJSON(str):
+    """已序列化的JSON片段（如保存的分析文档），由 dumps 原样嵌入，不重新解析和序列化"""
+
+
+def dumps(value):
+    """
+    与 jsonify 相同的紧凑、按键排序的序列化；value 中的 RawJSON 原样嵌入
+    做法：先把 RawJSON 换成唯一的占位字符串序列化，再把占位字符串（含引号）替换成原文
+    """
+    raw = {}
+    nonce = uuid.uuid4().hex
+
+    def replace(item):
+        if isinstance(item, RawJSON):
+            placeholder = f"raw-json:{nonce}:{len(raw)}"
+            raw[json.dumps(placeholder)] = str(item)
+            return placeholder
+        if isinstance(item, dict):
+            return {key: replace(val) for key, val in item.items()}
+        if isinstance(item, (list, tuple)):
+            return [replace(val) for val in item]
+        return item
+
+    text = json.dumps(replace(value), sort_keys=True, separators=(',', ':'))
+    for placeholder, fragment in raw.items():
+        text = text.replace(placeholder, fragment, 1)
+    return text
+
+
+def profile_scope(user_id):
+    """用户的资料和Riot账号（riot_id/tagline/PUUID）"""
+    return f"profile:{user_id}"
+
+
+def analysis_scope(user_id):
+    """用户的分析数据（GameModeStats / DetailedAnalysis）"""
+    return f"analysis:{user_id}"
+
+
+def friends_scope(user_id):
+    """用户的好友关系"""
+    return f"friends:{user_id}"
+
+
+class DataVersions:
+    """
+    按数据范围（如 analysis:<用户ID>）递增的版本号
+    数据写入并提交后调用 bump，缓存的响应以版本号作为失效依据
+    """
+
+    def __init__(self, store=local_store):
+        self.store = store
+        self.store.register_schema(*DATA_VERSION_SCHEMA)
+
+    def configure(self, app):
+        self.store.configure(app)
+
+    def get(self, *scopes):
+        """返回各范围的版本号元组，没有记录的范围为0"""
+        conn = self.store.connection()
+        rows = dict(conn.execute(
+            f"SELECT scope, version FROM data_versions WHERE scope IN ({','.join('?' * len(scopes))})",
+            scopes).fetchall())
+        return tuple(rows.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes):
+        with self.store.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO data_versions (scope, version) VALUES (?, 1) "
+                "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+                [(scope,) for scope in scopes])
+
+
+class CachedResponse:
+    def __init__(self, version, body, status, etag, expires_at):
+        self.version = version
+        self.body = body
+        self.status = status
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class VersionedResponseCache:
+    """
+    按 (接口, 参数) 缓存序列化后的JSON响应，条目带生成时的数据版本
+    版本没变时直接返回缓存的响应体，请求带匹配的 If-None-Match 时返回304；
+    这两种情况都不访问主数据库。ETag 是响应体的哈希（强ETag），
+    不同进程从相同数据生成的响应得到相同的ETag
+    """
+
+    def __init__(self, versions, max_entries=DEFAULT_MAX_ENTRIES):
+        self.versions = versions
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.versions.configure(app)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+
+    def respond(self, key, scopes, build):
+        """
+        返回 key 对应的响应
+        scopes: 响应依赖的数据范围；build(): 生成 (payload, status, expires_at)，
+        payload 用 dumps 序列化，其中的 RawJSON 原样嵌入，
+        expires_at 为响应因时间而变化的时刻（time.time() 秒），不会变化时为None
+        """
+        version = self.versions.get(*scopes)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.version == version and (entry.expires_at is None or now < entry.expires_at):
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is None:
+            payload, status, expires_at = build()
+            body = (dumps(payload) + "\n").encode()
+            entry = CachedResponse(version, body, status, hashlib.sha1(body).hexdigest(), expires_at)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        response = current_app.response_class(entry.body, status=entry.status, mimetype='application/json')
+        # 浏览器每次都要重新验证；只有成功的响应带ETag，可以得到304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if entry.status != 200:
+            return response
+        response.set_etag(entry.etag)
+        return response.make_conditional(request)
+
+    def invalidate(self):
+        """清空全部缓存的响应（例如数据版本的存储被替换时）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 进程内共享：数据版本和按版本缓存的响应
+data_versions = DataVersions()
+versioned_responses = VersionedResponseCache(data_versions)
@@ -1,10 +1,58 @@
 # tests/test_app.py
 
+import contextlib
+import os
+import tempfile
+import threading
+import time
 import unittest
 import json
+import requests
+from datetime import datetime
+from unittest import mock
+from flask import Flask
 from werkzeug.security import generate_password_hash # For creating test user passwords
-from app import app, db  # Assuming your main Flask app instance is 'app' and db instance is 'db'
-from models import User, Friend, DetailedAnalysis, GameModeStats # Import your models
+from app import app, db, run_analysis  # Assuming your main Flask app instance is 'app' and db instance is 'db'
+from models import User, Friend, DetailedAnalysis, GameModeStats, Match, Participant, MatchRecord # Import your models
+from routes.analysis_jobs import AnalysisJob, AnalysisJobQueue
+from routes.api_key import ApiKeyProvider
+from routes.local_store import LocalStore
+from routes.match_store import MatchStore, match_store
+from routes.match_fetcher import iter_match_details
+from routes.http_client import RiotHttpClient, riot_http
+from routes.rate_limit import RiotRateLimiter, parse_rate_limit_header
+from routes.response_cache import ResponseCache
+from routes.riot_api import SingleFlight, riot_get, count_requests
+from routes import routing
+from routes.circuit_breaker import CircuitBreaker, CircuitOpenError
+from routes.friends import list_friends
+from routes.user_search import ensure_search_index, search_users
+from routes.versioned_cache import DataVersions, VersionedResponseCache, versioned_responses, data_versions, analysis_scope, profile_scope, RawJSON
+from routes.algorithm import save_game_mode_stats, ingest_match, fetch_new_match_ids, fetch_match_history, insert_or_ignore
+from routes.aggregates import empty_analysis, aggregate_analysis, update_analysis_totals, derive_analysis, derive_mode_stats
+from routes.analysis_documents import load_analysis_document, materialize_analysis
+from models import AnalysisDocument
+
+PUUID = 'PUUID-me'
+CHAMPIONS = ['Ashe', 'Lux', 'Garen', 'Yasuo', 'Ahri', 'Zed', 'Jinx', 'Thresh', 'Lee Sin', 'Darius', 'Annie']
+
+
+def make_match_payload(match_id, index, queue_id=420, created=None):
+    """A match-v5 payload where PUUID plays CHAMPIONS[index] with kills=index+1, deaths=2, assists=3."""
+    participants = [{
+        'puuid': PUUID if p == 0 else f'P{p}',
+        'teamId': 100 if p < 5 else 200,
+        'championName': CHAMPIONS[(index + p) % len(CHAMPIONS)],
+        'individualPosition': ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY'][p % 5],
+        'kills': index + 1, 'deaths': 2, 'assists': 3,
+        'doubleKills': 1 if index % 2 == 0 else 0, 'tripleKills': 0, 'quadraKills': 0, 'pentaKills': 0,
+        'goldEarned': 10000, 'visionScore': 20, 'totalDamageDealtToChampions': 15000,
+        'totalDamageTaken': 20000, 'itemsPurchased': 15, 'win': p < 5,
+    } for p in range(10)]
+    return {'metadata': {'matchId': match_id},
+            'info': {'queueId': queue_id, 'gameDuration': 1800, 'participants': participants,
+                     'gameCreation': created if created is not None else 1700000000000 - index * 3600000}}
+
 
 class BaseTestCase(unittest.TestCase):
     """A base test case."""
@@ -16,6 +64,10 @@ class BaseTestCase(unittest.TestCase):
         app.config['DEBUG'] = False
         # Use an in-memory SQLite database for testing
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        # Keep data versions and other shared state out of instance/riot_local.db
+        self.tmpdir = tempfile.TemporaryDirectory()
+        app.config['RIOT_LOCAL_STORE'] = os.path.join(self.tmpdir.name, 'store.db')
+        versioned_responses.invalidate()
         self.app = app.test_client() # Creates a test client for making requests
 
         # -- Database Setup --
@@ -30,6 +82,7 @@ class BaseTestCase(unittest.TestCase):
         with app.app_context():
             db.session.remove() # Clear the session
             db.drop_all() # Drop all database tables
+        self.tmpdir.cleanup()
 
     def create_test_users(self):
         # Helper method to create some test users
@@ -299,5 +352,970 @@ class ShareAPITests(BaseTestCase):
         self.logout_user()
 
 
+class ApiKeyProviderTests(unittest.TestCase):
+    """Test the cached Riot API key provider."""
+
+    def setUp(self):
+        self.provider = ApiKeyProvider(ttl=60, refresh_margin=0, remote_url='https://example.invalid/key')
+
+    def test_env_key_takes_precedence(self):
+        with mock.patch.dict(os.environ, {'RIOT_API_KEY': 'RGAPI-env'}), \
+                mock.patch('routes.api_key.requests.get') as remote:
+            self.assertEqual(self.provider.get(), 'RGAPI-env')
+            self.assertEqual(self.provider.source, 'env')
+            remote.assert_not_called()
+
+    def test_remote_key_is_cached_until_invalidated(self):
+        remote_response = mock.Mock(status_code=200, text='RGAPI-remote\n')
+        with mock.patch.dict(os.environ, {'RIOT_API_KEY': ''}), \
+                mock.patch('routes.api_key.requests.get', return_value=remote_response) as remote:
+            self.assertEqual(self.provider.get(), 'RGAPI-remote')
+            self.assertEqual(self.provider.get(), 'RGAPI-remote')
+            self.assertEqual(remote.call_count, 1)
+
+            # Invalidating a stale key must not drop the current one
+            self.provider.invalidate('RGAPI-old')
+            self.provider.get()
+            self.assertEqual(remote.call_count, 1)
+
+            self.provider.invalidate('RGAPI-remote')
+            self.provider.get()
+            self.assertEqual(remote.call_count, 2)
+
+
+class RateLimiterTests(unittest.TestCase):
+    """Test the shared Riot rate limiter."""
+
+    MATCH_URL = 'https://sea.api.riotgames.com/lol/match/v5/matches/OC1_1'
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        store = LocalStore(os.path.join(self.tmpdir.name, 'store.db'))
+        self.limiter = RiotRateLimiter(store=store, app_rate_limit='2:10')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_rate_limit_header(self):
+        self.assertEqual(parse_rate_limit_header('20:1,100:120'), [(20, 1.0), (100, 120.0)])
+        self.assertEqual(parse_rate_limit_header(None), [])
+
+    def test_blocks_when_window_is_full(self):
+        self.assertEqual(self.limiter.try_acquire(self.MATCH_URL), 0)
+        self.assertEqual(self.limiter.try_acquire(self.MATCH_URL), 0)
+        self.assertGreater(self.limiter.try_acquire(self.MATCH_URL), 9)
+        # Other routing hosts have their own bucket
+        self.assertEqual(self.limiter.try_acquire('https://oc1.api.riotgames.com/lol/league/v4/entries/by-puuid/x'), 0)
+
+    def test_learns_limits_and_honors_retry_after(self):
+        response = mock.Mock(status_code=429, headers={
+            'X-App-Rate-Limit': '100:1', 'X-Method-Rate-Limit': '1:10',
+            'X-Rate-Limit-Type': 'method', 'Retry-After': '5'})
+        self.limiter.observe(self.MATCH_URL, response)
+        wait = self.limiter.try_acquire(self.MATCH_URL)
+        self.assertTrue(4 < wait <= 5)
+
+
+class MatchStoreTests(unittest.TestCase):
+    """Test the on-disk match-v5 payload store."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = MatchStore(root=self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        match = {'metadata': {'matchId': 'OC1_1'}, 'info': {'queueId': 420}}
+        self.assertIsNone(self.store.get('OC1_1'))
+        self.store.put('OC1_1', match)
+        self.assertEqual(self.store.get('OC1_1'), match)
+
+    def test_corrupted_file_is_discarded(self):
+        self.store.put('OC1_1', {'info': {}})
+        with open(self.store._path('OC1_1'), 'wb') as f:
+            f.write(b'not gzip')
+        self.assertIsNone(self.store.get('OC1_1'))
+        self.assertFalse(os.path.exists(self.store._path('OC1_1')))
+
+    def test_evicts_least_recently_used(self):
+        self.store.put('OC1_1', {'info': {'pad': 'x' * 100}})
+        os.utime(self.store._path('OC1_1'), (1, 1))
+        self.store.max_bytes = int(os.path.getsize(self.store._path('OC1_1')) * 1.5)
+        self.store.put('OC1_2', {'info': {'pad': 'y' * 100}})
+        self.assertIsNone(self.store.get('OC1_1'))
+        self.assertIsNotNone(self.store.get('OC1_2'))
+
+
+class MatchFetcherTests(unittest.TestCase):
+    """Test the concurrent match-v5 detail fetcher."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['MATCH_STORE_DIR'] = self.tmpdir.name
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def response(status, body):
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response.url = 'https://sea.api.riotgames.com/lol/match/v5/matches/x'
+        return response
+
+    def test_one_bad_match_does_not_stop_the_others(self):
+        responses = {
+            'OC1_1': self.response(200, b'{"info": {"queueId": 420}}'),
+            'OC1_2': self.response(200, b'not json'),
+            'OC1_3': self.response(401, b'{}'),
+        }
+
+        def riot_get(url, api_key):
+            return responses[url.rsplit('/', 1)[1]]
+
+        with mock.patch('routes.match_fetcher.riot_get', side_effect=riot_get), \
+                mock.patch('routes.match_fetcher.invalidate_api_key') as invalidate:
+            results = {match_id: (data, error)
+                       for match_id, data, error in iter_match_details(list(responses), 'sea', 'key')}
+        self.assertEqual(results['OC1_1'], ({'info': {'queueId': 420}}, None))
+        self.assertIsInstance(results['OC1_2'][1], ValueError)
+        self.assertIsInstance(results['OC1_3'][1], requests.exceptions.HTTPError)
+        invalidate.assert_called_once_with('key')
+
+    def test_in_flight_requests_are_bounded(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def riot_get(url, api_key):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return self.response(200, b'{"info": {}}')
+
+        ids = [f'OC1_{i}' for i in range(6)]
+        with mock.patch('routes.match_fetcher.riot_get', side_effect=riot_get):
+            fetched = [match_id for match_id, _, error in iter_match_details(ids, 'sea', 'key', max_in_flight=2)]
+        self.assertCountEqual(fetched, ids)
+        self.assertEqual(active[1], 2)
+
+    def test_stored_matches_skip_the_network(self):
+        match_store.configure(self.app)
+        match_store.put('OC1_9', {'info': {}})
+        with mock.patch('routes.match_fetcher.riot_get') as riot_get:
+            self.assertEqual(list(iter_match_details(['OC1_9'], 'sea', 'key')), [('OC1_9', {'info': {}}, None)])
+        riot_get.assert_not_called()
+
+
+class RiotHttpClientTests(unittest.TestCase):
+    """Test the pooled keep-alive client behind every Riot GET."""
+
+    def test_one_pool_per_host_is_reused(self):
+        client = RiotHttpClient(pool_maxsize=4)
+        with mock.patch.object(requests.Session, 'get', return_value='ok') as get:
+            client.get('https://sea.api.riotgames.com/lol/a')
+            client.get('https://sea.api.riotgames.com/lol/b')
+            client.get('https://kr.api.riotgames.com/lol/c')
+        self.assertEqual(client._hosts, {'sea.api.riotgames.com', 'kr.api.riotgames.com'})
+        sea = client._session.get_adapter('https://sea.api.riotgames.com/lol/x')
+        self.assertIs(sea, client._session.get_adapter('https://sea.api.riotgames.com/lol/y'))
+        self.assertIsNot(sea, client._session.get_adapter('https://kr.api.riotgames.com/lol/x'))
+        self.assertEqual(sea._pool_maxsize, 4)
+        self.assertEqual(get.call_args.kwargs['timeout'], client.timeout)
+
+    def test_riot_get_uses_shared_client_and_counts_requests(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        test_app = Flask(__name__)
+        test_app.config['RIOT_LOCAL_STORE'] = os.path.join(tmpdir.name, 'store.db')
+        response = requests.Response()
+        response.status_code = 200
+        with test_app.app_context(), \
+                mock.patch.object(riot_http, 'get', return_value=response) as get, \
+                count_requests() as counter:
+            self.assertIs(riot_get('https://sea.api.riotgames.com/lol/status', 'key').status_code, 200)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(get.call_args.kwargs['headers']['X-Riot-Token'], 'key')
+
+
+class MatchDataTestCase(unittest.TestCase):
+    """In-memory database with one user (PUUID) and a fake Riot match-v5 API."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_app = Flask(__name__)
+        self.test_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.test_app.config['MATCH_STORE_DIR'] = os.path.join(self.tmpdir.name, 'matches')
+        self.test_app.config['RIOT_LOCAL_STORE'] = os.path.join(self.tmpdir.name, 'store.db')
+        db.init_app(self.test_app)
+        self.ctx = self.test_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='me', email='me@example.com', password='x', region='oceania', puuid=PUUID)
+        db.session.add(self.user)
+        db.session.commit()
+
+        # Newest first, one hour apart, like the match-v5 ids endpoint
+        self.match_ids = [f'OC1_{100 - i}' for i in range(5)]
+        self.matches = {match_id: make_match_payload(match_id, i) for i, match_id in enumerate(self.match_ids)}
+        self.failing = set()
+        self.requests = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def add_new_match(self, match_id, created_offset):
+        newest = self.matches[self.match_ids[0]]['info']['gameCreation']
+        self.matches[match_id] = make_match_payload(match_id, 7, created=newest + created_offset)
+        self.match_ids.insert(0, match_id)
+
+    def fake_riot_get(self, url, api_key, params=None):
+        params = params or {}
+        self.requests.append((url, params))
+        response = requests.Response()
+        response.url = url
+        if url.endswith('/ids'):
+            ids = self.match_ids
+            if 'startTime' in params:
+                ids = [m for m in ids if self.matches[m]['info']['gameCreation'] >= params['startTime'] * 1000]
+            body = ids[params['start']:params['start'] + params['count']]
+        else:
+            match_id = url.rsplit('/', 1)[1]
+            if match_id in self.failing:
+                response.status_code = 500
+                return response
+            body = self.matches[match_id]
+        response.status_code = 200
+        response._content = json.dumps(body).encode()
+        return response
+
+    def riot(self):
+        """Patch the Riot GETs made by the match-ID sync and the match detail fetcher."""
+        patchers = [mock.patch.multiple('routes.algorithm', riot_get=self.fake_riot_get, get_api_key=lambda: 'key'),
+                    mock.patch('routes.match_fetcher.riot_get', self.fake_riot_get)]
+        stack = contextlib.ExitStack()
+        for patcher in patchers:
+            stack.enter_context(patcher)
+        return stack
+
+    def detail_requests(self):
+        return [url.rsplit('/', 1)[1] for url, _ in self.requests if not url.endswith('/ids')]
+
+    def ingest(self, *match_ids):
+        for match_id in match_ids:
+            ingest_match(match_id, self.matches[match_id])
+        db.session.commit()
+
+
+class AnalysisAggregateTests(MatchDataTestCase):
+    """Test the shared match tables, SQL aggregates and incremental totals."""
+
+    def test_ingest_is_shared_and_idempotent(self):
+        self.ingest(self.match_ids[0])
+        ingest_match(self.match_ids[0], self.matches[self.match_ids[0]])
+        db.session.commit()
+        self.assertEqual(Match.query.count(), 1)
+        self.assertEqual(Participant.query.count(), 10)
+
+    def test_ingest_keeps_bot_participants_apart(self):
+        payload = make_match_payload('OC1_BOT', 0, queue_id=890)
+        for participant in payload['info']['participants'][5:]:
+            participant['puuid'] = 'BOT'
+        ingest_match('OC1_BOT', payload)
+        db.session.commit()
+        bots = Participant.query.filter(Participant.puuid.like('BOT%')).count()
+        self.assertEqual(bots, 5)
+
+    def test_sql_aggregate_over_participants(self):
+        self.matches[self.match_ids[2]] = make_match_payload(self.match_ids[2], 2, queue_id=1700)
+        self.ingest(*self.match_ids[:3])
+        analysis = aggregate_analysis(PUUID, self.match_ids[:3])
+        self.assertEqual(analysis['favorite_champions'], {'Ashe': 1, 'Garen': 1, 'Lux': 1})
+        self.assertEqual(analysis['multikill_stats']['doubles'], 2)
+        self.assertEqual(analysis['fun_stats']['total_kills'], 6)
+        self.assertEqual(analysis['fun_stats']['avg_kda'], round((6 + 9) / 6, 2))
+        self.assertEqual(analysis['fun_stats']['total_time_played'], 3 * 1800)
+        # Ally/enemy counts only cover SR and ARAM; the queue 1700 match is left out
+        self.assertEqual(sum(analysis['ally_champions'].values()), 2 * 4)
+        self.assertEqual(sum(analysis['enemy_champions'].values()), 2 * 5)
+        self.assertIsNone(aggregate_analysis(PUUID, []))
+
+    def test_incremental_totals_match_full_aggregate(self):
+        self.ingest(*self.match_ids)
+        for window in (self.match_ids[:2], self.match_ids[1:4], self.match_ids[3:], self.match_ids):
+            totals = update_analysis_totals(self.user, window)
+            db.session.commit()
+            derived = derive_analysis(totals)
+            expected = aggregate_analysis(PUUID, window)
+            self.assertEqual(derived, expected)
+            self.assertEqual(list(derived['favorite_champions']), list(expected['favorite_champions']))
+            self.assertEqual(derive_mode_stats(totals)[2], len(window))
+
+
+class MatchHistorySyncTests(MatchDataTestCase):
+    """Test the watermark match-ID sync and the batched match history."""
+
+    def history(self):
+        with self.riot():
+            return fetch_match_history(self.user.id, on_match=lambda match_id, match: None, save_stats=False)
+
+    def test_first_sync_pages_through_latest_matches(self):
+        with self.riot(), mock.patch('routes.algorithm.MATCH_ID_PAGE_SIZE', 2):
+            self.assertEqual(fetch_new_match_ids(self.user, 'sea', 'key', limit=3), self.match_ids[:3])
+        self.assertEqual([params['start'] for _, params in self.requests], [0, 2])
+        self.assertTrue(all('startTime' not in params for _, params in self.requests))
+
+    def test_watermark_sync_stops_at_known_match(self):
+        known = self.match_ids[3]
+        self.user.match_sync_puuid = PUUID
+        self.user.match_sync_id = known
+        self.user.match_sync_time = self.matches[known]['info']['gameCreation']
+        with self.riot(), mock.patch('routes.algorithm.MATCH_ID_PAGE_SIZE', 2):
+            self.assertEqual(fetch_new_match_ids(self.user, 'sea', 'key'), self.match_ids[:3])
+        self.assertEqual(len(self.requests), 2)
+        self.assertTrue(all(params['startTime'] == self.user.match_sync_time // 1000 for _, params in self.requests))
+
+    def test_history_downloads_each_match_once_and_records_in_bulk(self):
+        self.assertEqual(self.history()['data']['total_matches'], 5)
+        self.assertEqual(self.user.match_sync_id, self.match_ids[0])
+        self.add_new_match('OC1_200', 3600000)
+        self.requests.clear()
+        result = self.history()
+        self.assertEqual(result['data']['total_matches'], 6)
+        self.assertEqual(self.detail_requests(), ['OC1_200'])
+        self.assertEqual(MatchRecord.query.count(), 6)
+        self.assertEqual(self.user.match_sync_id, 'OC1_200')
+
+    def test_failed_match_holds_back_watermark(self):
+        self.failing.add(self.match_ids[1])
+        self.assertEqual(self.history()['data']['total_matches'], 4)
+        self.assertEqual(self.user.match_sync_id, self.match_ids[2])
+        self.failing.clear()
+        self.requests.clear()
+        self.assertEqual(self.history()['data']['total_matches'], 5)
+        self.assertEqual(self.detail_requests(), [self.match_ids[1]])
+
+    def test_history_is_committed_with_the_analysis(self):
+        self.history()
+        db.session.rollback()
+        self.assertEqual(MatchRecord.query.count(), 0)
+        self.assertIsNone(db.session.get(User, self.user.id).match_sync_id)
+
+    def test_insert_or_ignore_skips_existing_rows(self):
+        row = {'match_id': 'OC1_1', 'user_id': self.user.id, 'queue_id': 420, 'game_mode': 'Ranked Solo',
+               'game_category': 'SR_5v5', 'game_date': datetime(2024, 1, 1)}
+        insert_or_ignore(MatchRecord, [row], ['user_id', 'match_id'])
+        insert_or_ignore(MatchRecord, [row, dict(row, match_id='OC1_2')], ['user_id', 'match_id'])
+        db.session.commit()
+        self.assertEqual(sorted(r.match_id for r in MatchRecord.query.all()), ['OC1_1', 'OC1_2'])
+
+
+class AnalysisJobQueueTests(unittest.TestCase):
+    """Test the background analysis job queue."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['RIOT_LOCAL_STORE'] = os.path.join(self.tmpdir.name, 'store.db')
+        self.queue = self.make_queue()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_queue(self):
+        queue = AnalysisJobQueue(store=LocalStore())
+        queue.configure(self.app)
+        return queue
+
+    def wait(self, job):
+        for _ in range(200):
+            if job.finished:
+                return
+            time.sleep(0.01)
+        self.fail('job did not finish')
+
+    def test_runs_job_and_reports_progress(self):
+        def target(user_id, on_progress):
+            on_progress({'processed': 1, 'failed': 0, 'total': 2})
+            return {'status': 'success', 'data': {'user_id': user_id}}
+
+        job = self.queue.submit(7, target)
+        self.wait(job)
+        status = self.queue.get(job.id).to_dict(include_result=True)
+        self.assertEqual(status['state'], 'success')
+        self.assertEqual((status['processed'], status['total']), (1, 2))
+        self.assertEqual(status['result']['data']['user_id'], 7)
+
+    def test_event_stream_ends_with_done(self):
+        def target(user_id, on_progress):
+            on_progress({'processed': 1, 'failed': 0, 'total': 1, 'mode_counts': {'SR_5v5': 1, 'ARAM': 1}})
+            return {'status': 'success'}
+
+        job = self.queue.submit(7, target)
+        events = [(name, data) for index, name, data in job.iter_events(heartbeat=0.05) if index is not None]
+        self.assertEqual([name for name, _ in events], ['progress', 'done'])
+        self.assertEqual(events[0][1]['mode_percentages'], {'SR_5v5': 50.0, 'ARAM': 50.0})
+
+    def test_pending_job_is_reused_for_same_user(self):
+        release = threading.Event()
+
+        def target(user_id, on_progress):
+            release.wait(5)
+            return {'status': 'success'}
+
+        first = self.queue.submit(7, target)
+        self.assertIs(self.queue.submit(7, target), first)
+        self.assertIsNot(self.queue.submit(8, target), first)
+        release.set()
+        self.wait(first)
+
+    def test_other_process_attaches_to_running_job(self):
+        release = threading.Event()
+
+        def target(user_id, on_progress):
+            release.wait(5)
+            return {'status': 'success', 'data': {'user_id': user_id}}
+
+        job = self.queue.submit(7, target)
+        # A second queue sharing the local store stands in for another worker process
+        other = self.make_queue()
+        other.owner = 'other-worker'
+        attached = other.submit(7, target)
+        self.assertEqual(attached.id, job.id)
+        self.assertFalse(attached.finished)
+        release.set()
+        self.wait(job)
+        status = other.get(job.id).to_dict(include_result=True)
+        self.assertEqual(status['state'], 'success')
+        self.assertEqual(status['result']['data']['user_id'], 7)
+
+    def test_lease_without_live_snapshot_is_taken_over(self):
+        self.app.config['ANALYSIS_JOB_TTL'] = 60
+        self.queue = self.make_queue()
+        old_status = {'job_id': 'finished-job', 'state': 'success'}
+        with self.queue.store.transaction() as conn:
+            # A holder that crashed before writing its snapshot, and a finished holder past the job TTL
+            conn.execute("INSERT INTO analysis_leases VALUES (7, 'crashed-job', 'other-worker', ?)", (time.time() + 60,))
+            conn.execute("INSERT INTO analysis_leases VALUES (8, 'finished-job', 'other-worker', ?)", (time.time() + 60,))
+            conn.execute("INSERT INTO analysis_job_status VALUES ('finished-job', 8, ?, ?)",
+                         (json.dumps({'user_id': 8, 'status': old_status, 'event_index': 0, 'event': None}),
+                          time.time() - 120))
+
+        for user_id in (7, 8):
+            job = self.queue.submit(user_id, lambda user_id, on_progress: {'status': 'success'})
+            self.assertIsInstance(job, AnalysisJob)
+            self.wait(job)
+            self.assertEqual(self.queue.get(job.id).to_dict()['state'], 'success')
+
+    def test_queued_job_keeps_its_lease(self):
+        self.app.config['ANALYSIS_LEASE_TTL'] = 0.3
+        self.app.config['ANALYSIS_MAX_WORKERS'] = 1
+        self.queue = self.make_queue()
+        release = threading.Event()
+
+        def target(user_id, on_progress):
+            release.wait(5)
+            return {'status': 'success'}
+
+        self.queue.submit(7, target)
+        queued = self.queue.submit(8, target)
+        # Longer than the lease, with no progress events: the queued job must still hold its lease
+        time.sleep(0.6)
+        other = self.make_queue()
+        other.owner = 'other-worker'
+        attached = other.submit(8, target)
+        self.assertEqual(attached.id, queued.id)
+        self.assertEqual(attached.to_dict()['state'], 'queued')
+        release.set()
+        self.wait(queued)
+
+
+class SingleFlightTests(unittest.TestCase):
+    """Test coalescing of identical in-flight calls."""
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'id': 'OC1_1'}
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', fetch)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('k', fetch))) for _ in range(3)]
+        for t in followers:
+            t.start()
+        while flight.stats()['hits'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual((flight.hits, flight.misses), (3, 1))
+
+    def test_errors_are_not_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('k', mock.Mock(side_effect=ValueError))
+        self.assertEqual(flight.do('k', lambda: 'ok'), 'ok')
+
+
+class ResponseCacheTests(unittest.TestCase):
+    """Test the per-endpoint Riot response cache."""
+
+    def setUp(self):
+        self.cache = ResponseCache(ttls={'league': 60})
+
+    def test_read_through_and_invalidate(self):
+        loader = mock.Mock(return_value=[{'tier': 'GOLD'}])
+        self.assertEqual(self.cache.get_or_load('league', 'p1', loader), [{'tier': 'GOLD'}])
+        self.cache.get_or_load('league', 'p1', loader)
+        self.assertEqual(loader.call_count, 1)
+        self.cache.invalidate('league', 'p1')
+        self.cache.get_or_load('league', 'p1', loader)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_errors_are_not_cached(self):
+        loader = mock.Mock(return_value={'error': 'timeout'})
+        self.cache.get_or_load('league', 'p1', loader)
+        self.cache.get_or_load('league', 'p1', loader)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_evicts_least_recently_used_over_memory_cap(self):
+        self.cache.max_bytes = 50
+        self.cache.put('league', 'p1', 'x' * 20)
+        self.cache.put('league', 'p2', 'y' * 20)
+        self.cache.get_or_load('league', 'p1', mock.Mock())
+        self.cache.put('league', 'p3', 'z' * 20)
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        loader = mock.Mock(return_value='reloaded')
+        self.assertEqual(self.cache.get_or_load('league', 'p1', loader), 'x' * 20)
+        self.assertEqual(self.cache.get_or_load('league', 'p2', loader), 'reloaded')
+
+
+class RoutingTests(unittest.TestCase):
+    """Test the region to Riot host routing table."""
+
+    def test_profile_regions_map_to_platform_and_regional_hosts(self):
+        self.assertEqual(routing.platform_host('oceania'), 'oc1.api.riotgames.com')
+        self.assertEqual(routing.regional_host('oceania'), 'sea.api.riotgames.com')
+        self.assertEqual(routing.platform_host('Europe'), 'euw1.api.riotgames.com')
+        self.assertEqual(routing.regional_host('america'), 'americas.api.riotgames.com')
+
+    def test_account_requests_never_use_sea(self):
+        self.assertEqual(routing.account_host('oceania'), 'asia.api.riotgames.com')
+        self.assertEqual(routing.account_host('euw'), 'europe.api.riotgames.com')
+
+    def test_unknown_region_uses_default_platform(self):
+        self.assertEqual(routing.platform_for(None), routing.DEFAULT_PLATFORM)
+        self.assertEqual(routing.platform_for('atlantis'), routing.DEFAULT_PLATFORM)
+        self.assertEqual(routing.platform_for('kr'), 'kr')
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    """Test the per-host circuit breaker used for Riot calls."""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('sea.api.riotgames.com', failure_threshold=2, reset_timeout=0.05)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.snapshot()['state'], 'open')
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_half_open_allows_a_single_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(0.06)
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.snapshot()['state'], 'closed')
+        self.breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(0.06)
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.available())
+
+
+class FriendListTests(unittest.TestCase):
+    """Test the joined, cursor-paginated friend listing."""
+
+    def setUp(self):
+        self.test_app = Flask(__name__)
+        self.test_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.test_app)
+        self.ctx = self.test_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        users = [User(username=f'user{i}', email=f'user{i}@example.com', password='x') for i in range(4)]
+        db.session.add_all(users)
+        db.session.flush()
+        self.me = users[0]
+        db.session.add_all([Friend(user_id=self.me.id, friend_id=user.id) for user in users[1:]])
+        db.session.add(GameModeStats(user_id=users[1].id, aram_percentage=60, sr_5v5_percentage=40, total_matches=10))
+        db.session.add(DetailedAnalysis(user_id=users[1].id, favorite_champions={'Lux': 2, 'Ahri': 5}))
+        db.session.commit()
+        self.me_id = self.me.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_pages_follow_cursor(self):
+        first, cursor = list_friends(self.me_id, limit=2)
+        self.assertEqual([f['username'] for f in first], ['user1', 'user2'])
+        rest, next_cursor = list_friends(self.me_id, limit=2, cursor=cursor)
+        self.assertEqual([f['username'] for f in rest], ['user3'])
+        self.assertIsNone(next_cursor)
+
+    def test_summary_embedded_in_one_query(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        from sqlalchemy import event
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            friends, _ = list_friends(self.me_id, with_summary=True)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(friends[0]['summary'], {'top_champion': 'Ahri', 'favorite_game_mode': 'ARAM'})
+        self.assertEqual(friends[1]['summary'], {'top_champion': None, 'favorite_game_mode': None})
+
+
+class UserSearchTests(unittest.TestCase):
+    """Test the FTS5 trigram user search index."""
+
+    def setUp(self):
+        self.test_app = Flask(__name__)
+        self.test_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.test_app)
+        self.ctx = self.test_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(username='existing_player', email='e@example.com', password='x'))
+        db.session.commit()
+        ensure_search_index()
+        db.session.add_all([
+            User(username='playerone', email='p1@example.com', password='x'),
+            User(username='theplayer', email='p2@example.com', password='x', riot_id='Faker', tagline='KR1'),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_ranks_prefix_matches_first_and_backfills(self):
+        names = [user.username for user in search_users('player')]
+        self.assertEqual(names[0], 'playerone')
+        self.assertCountEqual(names, ['playerone', 'theplayer', 'existing_player'])
+
+    def test_matches_riot_id_and_follows_updates(self):
+        self.assertEqual([user.username for user in search_users('faker#kr')], ['theplayer'])
+        user = User.query.filter_by(username='theplayer').first()
+        user.riot_id = 'Caps'
+        db.session.commit()
+        self.assertEqual(search_users('faker'), [])
+        self.assertEqual([user.username for user in search_users('caps#')], ['theplayer'])
+
+    def test_short_terms_match_substrings_case_insensitively(self):
+        self.assertEqual([user.username for user in search_users('PL')], ['playerone', 'theplayer', 'existing_player'])
+        self.assertEqual([user.username for user in search_users('kr')], ['theplayer'])
+
+    def test_exact_match_beyond_substring_candidates(self):
+        with mock.patch('routes.user_search.MAX_CANDIDATES', 20):
+            db.session.add_all([User(username=f'xbobx{i:03}', email=f'x{i}@example.com', password='x')
+                                for i in range(40)])
+            db.session.add(User(username='Bob', email='bob@example.com', password='x'))
+            db.session.commit()
+            self.assertEqual(search_users('bob')[0].username, 'Bob')
+
+    def test_index_is_recreated_with_users_table(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(username='fresh_player', email='f@example.com', password='x'))
+        db.session.commit()
+        self.assertEqual([user.username for user in search_users('fresh')], ['fresh_player'])
+
+    def test_startup_rebuild_reconciles_stale_rows(self):
+        db.session.execute(db.text("INSERT INTO user_search (rowid, username, riot_tag) VALUES (999, 'ghost', '#')"))
+        db.session.execute(db.text("DROP TRIGGER user_search_ai"))
+        db.session.commit()
+        db.session.add(User(username='unindexed_player', email='u@example.com', password='x'))
+        db.session.commit()
+        ensure_search_index()
+        self.assertEqual(search_users('ghost'), [])
+        self.assertEqual([user.username for user in search_users('unindexed')], ['unindexed_player'])
+
+
+class VersionedResponseCacheTests(unittest.TestCase):
+    """Test the data-versioned response cache with ETag/304."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['RIOT_LOCAL_STORE'] = os.path.join(self.tmpdir.name, 'store.db')
+        self.versions = DataVersions(store=LocalStore())
+        self.cache = VersionedResponseCache(self.versions)
+        self.cache.configure(self.app)
+        self.build = mock.Mock(return_value=({'status': 'success', 'data': 1}, 200, None))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def respond(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        with self.app.test_request_context(headers=headers):
+            return self.cache.respond(('stats', 1), ['analysis:1'], self.build)
+
+    def test_conditional_request_gets_304_without_rebuilding(self):
+        first = self.respond()
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertEqual(self.respond(etag).status_code, 304)
+        self.assertEqual(self.build.call_count, 1)
+
+    def test_raw_json_is_embedded_verbatim(self):
+        self.build.return_value = ({'status': 'success', 'data': RawJSON('{"b":1,"a":[2]}')}, 200, None)
+        self.assertEqual(self.respond().get_data(), b'{"data":{"b":1,"a":[2]},"status":"success"}\n')
+
+    def test_version_bump_rebuilds(self):
+        etag = self.respond().headers['ETag']
+        self.build.return_value = ({'status': 'success', 'data': 2}, 200, None)
+        self.versions.bump('analysis:1')
+        response = self.respond(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['data'], 2)
+        self.assertEqual(self.build.call_count, 2)
+
+
+class AnalysisDocumentTests(unittest.TestCase):
+    """Test the materialized per-user analysis documents."""
+
+    def setUp(self):
+        self.test_app = Flask(__name__)
+        self.test_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.test_app)
+        self.ctx = self.test_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        user = User(username='doc_user', email='doc@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        self.user_id = user.id
+        db.session.add(GameModeStats(user_id=user.id, aram_percentage=70, sr_5v5_percentage=30, total_matches=10))
+        db.session.add(DetailedAnalysis(user_id=user.id, favorite_champions={'Lux': 2, 'Ahri': 5}, double_kills=3))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_load_materializes_missing_document(self):
+        stats_json, summary_json, _ = load_analysis_document(self.user_id)
+        stats = json.loads(stats_json)
+        self.assertEqual(stats['aram_percentage'], 70)
+        self.assertEqual(stats['detailed_analysis']['favorite_champions'], {'Lux': 2, 'Ahri': 5})
+        summary = json.loads(summary_json)
+        self.assertEqual(summary['favorite_champions'], ['Ahri', 'Lux'])
+        self.assertEqual(summary['favorite_game_mode'], 'ARAM')
+        self.assertEqual(AnalysisDocument.query.count(), 1)
+
+    def test_old_schema_version_is_rematerialized(self):
+        document = materialize_analysis(self.user_id)
+        document.schema_version = 0
+        document.stats_json = '{}'
+        db.session.commit()
+        stats_json, _, _ = load_analysis_document(self.user_id)
+        self.assertEqual(json.loads(stats_json)['total_matches'], 10)
+
+
+class AnalysisCommitTests(BaseTestCase):
+    """Test that an analysis run saves its results in one transaction."""
+
+    def setUp(self):
+        # Start from empty tables even if an earlier test's setUp failed before its tearDown ran.
+        with app.app_context():
+            db.drop_all()
+        super().setUp()
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='testuser1').first().id
+        self.percentages = {'SR_5v5': 0.0, 'ARAM': 100.0, 'Fun_Modes': 0.0, 'Bot_Games': 0.0, 'Custom': 0.0, 'Unknown': 0.0}
+
+    def analyze(self, user_id, on_progress=None):
+        save_game_mode_stats(user_id, self.percentages, 4, commit=False)
+        detailed = empty_analysis()
+        detailed['favorite_champions'] = {'Lux': 4}
+        detailed['multikill_stats']['doubles'] = 2
+        return {'status': 'success', 'data': {'detailed_analysis': detailed}}
+
+    def test_stats_analysis_and_document_commit_together(self):
+        with app.app_context(), \
+                mock.patch('routes.algorithm.analyze_game_modes', self.analyze), \
+                mock.patch.object(data_versions, 'bump', wraps=data_versions.bump) as bump:
+            run_analysis(self.user_id)
+            bump.assert_called_once_with(analysis_scope(self.user_id))
+            db.session.remove()
+            stats_json, summary_json, stats_updated = load_analysis_document(self.user_id)
+        self.assertEqual(json.loads(stats_json)['aram_percentage'], 100.0)
+        self.assertEqual(json.loads(summary_json)['favorite_champions'], ['Lux'])
+        self.assertLess(abs((datetime.utcnow() - stats_updated).total_seconds()), 60)
+
+    def test_uncommitted_stats_are_rolled_back_on_failure(self):
+        def analyze(user_id, on_progress=None):
+            save_game_mode_stats(user_id, self.percentages, 4, commit=False)
+            return {'status': 'error', 'message': 'failed'}
+
+        with app.app_context(), mock.patch('routes.algorithm.analyze_game_modes', analyze):
+            run_analysis(self.user_id)
+            db.session.remove()
+            self.assertIsNone(GameModeStats.query.filter_by(user_id=self.user_id).first())
+
+
+class GameProfileAPITests(BaseTestCase):
+    """Test /api/game_profile: stored PUUID reuse and partial results."""
+
+    def setUp(self):
+        # Start from empty tables even if an earlier test's setUp failed before its tearDown ran.
+        with app.app_context():
+            db.drop_all()
+        super().setUp()
+        with app.app_context():
+            user = User.query.filter_by(username='testuser1').first()
+            user.riot_id, user.tagline, user.region = 'Faker', 'KR1', 'asia'
+            user.puuid, user.account_game_name, user.account_tag_line = 'PUUID-stored', 'Faker', 'KR1'
+            user.puuid_resolved_for = 'Faker#KR1'
+            db.session.commit()
+            self.user_id = user.id
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        patcher = mock.patch.multiple('app', get_api_key=lambda: 'key', fetch_puuid=mock.DEFAULT,
+                                      fetch_rank_info=mock.DEFAULT, fetch_match_list=mock.DEFAULT)
+        self.riot = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.riot['fetch_rank_info'].return_value = [{'tier': 'GOLD'}]
+        self.riot['fetch_match_list'].return_value = ['KR_1']
+
+    def test_stored_puuid_skips_account_lookup(self):
+        data = self.app.get('/api/game_profile').get_json()['data']
+        self.riot['fetch_puuid'].assert_not_called()
+        self.assertEqual(data['account']['puuid'], 'PUUID-stored')
+        self.assertEqual((data['rank'], data['matches'], data['partial']), ([{'tier': 'GOLD'}], ['KR_1'], False))
+        self.assertEqual(self.riot['fetch_rank_info'].call_args.args[0], 'PUUID-stored')
+
+    def test_rejected_stored_puuid_is_resolved_again(self):
+        self.riot['fetch_rank_info'].side_effect = [{'error': 'not found', 'status_code': 404}, [{'tier': 'GOLD'}]]
+        self.riot['fetch_puuid'].return_value = {'puuid': 'PUUID-new', 'gameName': 'Faker', 'tagLine': 'KR1'}
+        data = self.app.get('/api/game_profile').get_json()['data']
+        self.riot['fetch_puuid'].assert_called_once()
+        self.assertEqual(data['account']['puuid'], 'PUUID-new')
+        self.assertEqual(data['rank'], [{'tier': 'GOLD'}])
+        with app.app_context():
+            self.assertEqual(db.session.get(User, self.user_id).puuid, 'PUUID-new')
+
+    def test_failed_call_returns_partial_result(self):
+        self.riot['fetch_rank_info'].return_value = {'error': 'league unavailable'}
+        data = self.app.get('/api/game_profile').get_json()['data']
+        self.assertEqual((data['rank'], data['matches'], data['partial']), (None, ['KR_1'], True))
+
+    def test_slow_call_times_out_into_partial_result(self):
+        app.config['RIOT_FANOUT_TIMEOUT'] = 0.1
+        self.addCleanup(app.config.pop, 'RIOT_FANOUT_TIMEOUT')
+        self.riot['fetch_match_list'].side_effect = lambda *args: time.sleep(0.5) or ['KR_1']
+        data = self.app.get('/api/game_profile').get_json()['data']
+        self.assertEqual((data['rank'], data['matches'], data['partial']), ([{'tier': 'GOLD'}], [], True))
+
+
+class DashboardAPITests(BaseTestCase):
+    """Test the one-request dashboard bootstrap endpoint."""
+
+    def setUp(self):
+        # Start from empty tables even if an earlier test's setUp failed before its tearDown ran.
+        with app.app_context():
+            db.drop_all()
+        super().setUp()
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='testuser1').first().id
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+    def test_dashboard_without_analysis(self):
+        response = self.app.get('/api/dashboard')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()['data']
+        self.assertEqual(data['profile']['username'], 'testuser1')
+        self.assertIsNone(data['profile']['account'])
+        self.assertTrue(data['profile']['needsUpdate'])
+        self.assertTrue(data['gameModeStats']['needsAnalysis'])
+        self.assertTrue(data['analyze']['canAnalyze'])
+        self.assertEqual(data['recentMatches'], [])
+
+    def test_dashboard_embeds_game_mode_stats(self):
+        with app.app_context():
+            db.session.add(GameModeStats(user_id=self.user_id, aram_percentage=100.0, total_matches=3))
+            db.session.commit()
+        data = self.app.get('/api/dashboard').get_json()['data']
+        self.assertEqual(data['gameModeStats'], self.app.get('/api/game_modes_stats').get_json())
+        self.assertEqual(data['gameModeStats']['data']['total_matches'], 3)
+
+    def test_unresolved_account_is_left_to_the_client(self):
+        with app.app_context():
+            user = db.session.get(User, self.user_id)
+            user.riot_id, user.tagline = 'Faker', 'KR1'
+            db.session.commit()
+        with mock.patch('app.fetch_puuid') as fetch_puuid:
+            profile = self.app.get('/api/dashboard').get_json()['data']['profile']
+        fetch_puuid.assert_not_called()
+        self.assertIsNone(profile['account'])
+        self.assertTrue(profile['needsResolve'])
+
+    def test_conditional_request_gets_304_until_profile_changes(self):
+        etag = self.app.get('/api/dashboard').headers['ETag']
+        self.assertEqual(self.app.get('/api/dashboard', headers={'If-None-Match': etag}).status_code, 304)
+        with app.app_context():
+            db.session.get(User, self.user_id).riot_id = 'Faker'
+            db.session.commit()
+            data_versions.configure(app)
+            data_versions.bump(profile_scope(self.user_id))
+        response = self.app.get('/api/dashboard', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['data']['profile']['riot_id'], 'Faker')
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file